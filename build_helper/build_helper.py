@@ -46,7 +46,21 @@ def build(tfm_dir,
           build_threads=3,
           build_install=True,
           image_sizes=False,
-          relative_paths=False):
+          relative_paths=False,
+          duration_history=None,
+          adaptive=False,
+          build_cache=None,
+          build_cache_size=10240,
+          share_spe=False,
+          incremental=False,
+          compiler_cache=None,
+          compiler_cache_size=5120,
+          log_tail=None,
+          log_timestamps=False,
+          compress_logs=False,
+          fail_fast=None,
+          canaries=None,
+          smoke_first=False):
     """ Instantiate a build manager class and build all configurations """
 
     start_time = time.time()
@@ -60,7 +74,21 @@ def build(tfm_dir,
                            build_threads=build_threads,
                            install=build_install,
                            img_sizes=image_sizes,
-                           relative_paths=relative_paths)
+                           relative_paths=relative_paths,
+                           duration_history=duration_history,
+                           adaptive=adaptive,
+                           build_cache=build_cache,
+                           build_cache_size=build_cache_size,
+                           share_spe=share_spe,
+                           incremental=incremental,
+                           compiler_cache=compiler_cache,
+                           compiler_cache_size=compiler_cache_size,
+                           log_tail=log_tail,
+                           log_timestamps=log_timestamps,
+                           compress_logs=compress_logs,
+                           fail_fast=fail_fast,
+                           canaries=canaries,
+                           smoke_first=smoke_first)
     bm.start()
     bm.join()
     build_report = bm.get_report()
@@ -102,7 +130,24 @@ def main(user_args):
                                        user_args.thread_no,
                                        user_args.install,
                                        user_args.image_sizes,
-                                       user_args.relative_paths)
+                                       user_args.relative_paths,
+                                       user_args.duration_history,
+                                       user_args.adaptive,
+                                       user_args.build_cache,
+                                       user_args.build_cache_size,
+                                       user_args.share_spe,
+                                       user_args.incremental,
+                                       # Every group shares its own cache
+                                       os.path.join(user_args.compiler_cache,
+                                                    user_args.config.lower())
+                                       if user_args.compiler_cache else None,
+                                       user_args.compiler_cache_size,
+                                       user_args.log_tail,
+                                       user_args.log_timestamps,
+                                       user_args.compress_logs,
+                                       user_args.fail_fast,
+                                       user_args.canaries,
+                                       user_args.smoke_first)
 
     if not build_report:
         print("Build Report Empty, check build status")
@@ -169,6 +214,90 @@ if __name__ == "__main__":
                         help="When set paths stored in report will be stored"
                              "in a relative path to the execution directory."
                              "Recommended for Jenkins Builds.")
+    parser.add_argument("-d", "--duration-history",
+                        dest="duration_history",
+                        action="store",
+                        help="JSON file storing the build durations of "
+                             "previous runs, used to start the longest "
+                             "builds first. Defaults to the build directory")
+    parser.add_argument("-a", "--adaptive",
+                        dest="adaptive",
+                        action="store_true",
+                        help="Pick the number of parallel builds and the "
+                             "threads of each build from the available "
+                             "cores, memory and load average of the host")
+    parser.add_argument("--build-cache",
+                        dest="build_cache",
+                        action="store",
+                        help="Directory of a local cache of spe/nspe build "
+                             "outputs, keyed on the rendered build commands, "
+                             "toolchain version and source trees")
+    parser.add_argument("--build-cache-size",
+                        type=int,
+                        dest="build_cache_size",
+                        action="store",
+                        default=10240,
+                        help="Size limit of the build cache in MB. Least "
+                             "recently used entries are evicted first.")
+    parser.add_argument("--share-spe",
+                        dest="share_spe",
+                        action="store_true",
+                        help="Build the spe image once for configs rendering "
+                             "identical spe commands, and build the nspe "
+                             "image of the others against its export")
+    parser.add_argument("--incremental",
+                        dest="incremental",
+                        action="store_true",
+                        help="Keep the build tree of every config between "
+                             "runs and only rebuild what changed. Configs "
+                             "whose configure commands changed are built "
+                             "from scratch")
+    parser.add_argument("--compiler-cache",
+                        dest="compiler_cache",
+                        action="store",
+                        help="Compile through ccache, with a cache shared by "
+                             "the builds of a group in a subdirectory of "
+                             "this directory")
+    parser.add_argument("--compiler-cache-size",
+                        type=int,
+                        dest="compiler_cache_size",
+                        action="store",
+                        default=5120,
+                        help="Size limit of the compiler cache of a group "
+                             "in MB.")
+    parser.add_argument("--log-tail",
+                        type=int,
+                        dest="log_tail",
+                        action="store",
+                        help="Only print the last lines of the logs of the "
+                             "failed builds not printing live output")
+    parser.add_argument("--log-timestamps",
+                        dest="log_timestamps",
+                        action="store_true",
+                        help="Prefix every line of the build logs with the "
+                             "seconds elapsed since its command started")
+    parser.add_argument("--compress-logs",
+                        dest="compress_logs",
+                        action="store_true",
+                        help="Write the build logs gzip compressed")
+    parser.add_argument("--fail-fast",
+                        type=int,
+                        dest="fail_fast",
+                        action="store",
+                        help="Stop the run once this number of builds "
+                             "failed, cancelling the running builds")
+    parser.add_argument("--canary",
+                        dest="canaries",
+                        action="append",
+                        help="Config built first, whose failure stops the "
+                             "run. Can be given several times")
+    parser.add_argument("--smoke-first",
+                        dest="smoke_first",
+                        action="store_true",
+                        help="Build first a small subset of the configs "
+                             "covering every platform, compiler and "
+                             "isolation level, and the others only if it "
+                             "passes")
     parser.add_argument("-p", "--parallel-builds",
                         type=int,
                         dest="parallel_builds",
@@ -82,7 +82,9 @@ _common_tfm_builder_cfg = {
     # tfm_build_manager will replace %(_tbm_build_dir_)s,  %(_tbm_code_dir_)s,
     # _tbm_target_platform_ with the  paths set when building
 
-    "artifact_capture_rex": (r'%(ci_build_root_dir)s/nspe'
+    # Anchored to the build directory of the config, which is the only
+    # directory scanned for artefacts
+    "artifact_capture_rex": (r'^%(ci_build_root_dir)s/nspe'
                              r'/(\w+\.(?:axf|bin|hex))$'),
 
     # Keys will append extra commands when matching target_platform
@@ -165,6 +167,11 @@ _common_tfm_builder_cfg = {
                                        "popd")
                    },
 
+    # (Optional) Artefacts expected post build, "all" and platform keys as
+    # in required_artefacts. If set the artefacts matching
+    # artifact_capture_rex are taken from it instead of a directory scan
+    # "artefact_manifest": {"all": []},
+
     # (Optional) If set will fail if those artefacts are missing post build
     "required_artefacts": {"all": [
                            "%(ci_build_root_dir)s/spe/bin/"
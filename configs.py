@@ -6,61 +6,83 @@ variables to build a specific build configuration using run-build.sh
 """
 
 import argparse
-import os
+import json
+import shlex
 import sys
 
-from tfm_ci_pylib.tfm_build_manager import TFM_Build_Manager
-from build_helper.build_helper_configs import _builtin_configs
+from tfm_ci_pylib.config_catalogue import TFM_Config_Catalogue, \
+    build_command_types
 
 
 __copyright__ = """
 /*
- * Copyright (c) 2020-2022, Arm Limited. All rights reserved.
+ * Copyright (c) 2020-2023, Arm Limited. All rights reserved.
  *
  * SPDX-License-Identifier: BSD-3-Clause
  *
  */
  """
 
-
-def get_build_manager(group=None):
-    """Get a TFM_Build_Manager instance, silencing stdout"""
-    if not group:
-        print("No config group selected!")
-        return
-    config = _builtin_configs[group]
-    _dir = os.getcwd()
-    # Block default stdout from __init__
-    sys.stdout = open(os.devnull, "w")
-    build_manager = TFM_Build_Manager(_dir, _dir, config)
-    # Allow stdout again
-    sys.stdout = sys.__stdout__
-    return build_manager
+# The configs are looked up in the precompiled catalogue, which is rebuilt
+# when the config sources change. It is loaded in main, as the parser takes
+# its groups.
+catalogue = None
 
 
 def list_configs(group):
     """Lists available configurations"""
-    build_manager = get_build_manager(group)
-    return build_manager.get_config()
+    return catalogue.get_config(group)
 
 
 def print_build_configs(config, group=None, silence_stderr=False):
     """Prints particular configuration environment variables"""
-    build_manager = get_build_manager(group)
-    params = build_manager.get_build_configs(config, silence_stderr=silence_stderr)
+    try:
+        params = catalogue.get_build_configs(config, group)
+    except KeyError:
+        if not silence_stderr:
+            print("Error: no such config {}".format(config), file=sys.stderr)
+        raise
     for name in params:
         print("{}={}".format(name, params[name]))
 
 
 def print_build_commands(config, cmd_type, group=None, jobs=None):
     """Prints particular commands to be run"""
-    build_manager = get_build_manager(group)
-    cmd = build_manager.get_build_commands(config, silence_stderr=True, jobs=jobs)
-    print(cmd[cmd_type])
+    cmd = catalogue.get_build_commands(config, group, jobs=jobs)
+    if cmd_type != "all":
+        print(cmd[cmd_type])
+        return
+    # Shell assignments of every command, to be evaluated in one go
+    for cmd_type in build_command_types:
+        print("{}_cmd={}".format(cmd_type,
+                                 shlex.quote(cmd[cmd_type].rstrip("\n"))))
+
+
+def print_batch(groups, configs=None, jobs=None):
+    """Prints params and build commands of configs as one json document"""
+    try:
+        batch = catalogue.get_batch(groups, names=configs, jobs=jobs)
+    except KeyError as e:
+        print("Could not find configuration {} in groups {}".format(
+            e.args[0], groups), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(batch, indent=2))
 
 
 if __name__ == "__main__":
-    PARSER = argparse.ArgumentParser(description="Extract build configurations.")
+    CATALOGUE_PARSER = argparse.ArgumentParser(add_help=False)
+    CATALOGUE_PARSER.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Parse the config groups with this many processes when the "
+        "config catalogue is rebuilt."
+    )
+    catalogue = TFM_Config_Catalogue(
+        processes=CATALOGUE_PARSER.parse_known_args()[0].processes)
+
+    PARSER = argparse.ArgumentParser(description="Extract build configurations.",
+                                     parents=[CATALOGUE_PARSER])
     PARSER.add_argument(
         "config",
         default=None,
@@ -73,8 +95,9 @@ if __name__ == "__main__":
         "-b",
         "--build_commands",
         default=None,
-        choices=['set_compiler', 'spe_cmake_config', 'nspe_cmake_config', 'spe_cmake_build', 'nspe_cmake_build', 'post_build'],
-        help="Print selected type of build commands to be run for current configuration."
+        choices=build_command_types + ['all'],
+        help="Print selected type of build commands to be run for current configuration. "
+        "'all' prints shell assignments of every type of command."
     )
     PARSER.add_argument(
         "--config_params",
@@ -82,6 +105,15 @@ if __name__ == "__main__":
         action='store_true',
         help="List config parameters of current configuration."
     )
+    PARSER.add_argument(
+        "--batch",
+        default=None,
+        nargs="*",
+        metavar="CONFIG",
+        help="Print config parameters and every type of build commands of "
+        "the listed configurations, or of all configurations of the selected "
+        "groups if none is listed, as one json document by group."
+    )
     PARSER.add_argument(
         "-g",
         "--group",
@@ -90,7 +122,7 @@ if __name__ == "__main__":
         help="Only list configurations under a certain group. "
         "'all' will look through all configurations. "
         "Leaving blank will just look at config 'all'.",
-        choices=list(_builtin_configs.keys())+['all'],
+        choices=catalogue.get_groups()+['all'],
     )
     PARSER.add_argument(
         "-j",
@@ -98,29 +130,37 @@ if __name__ == "__main__":
         help="Pass -j option down to the build system (# of parallel jobs)."
     )
     ARGS = PARSER.parse_args()
-    if not ARGS.group or ARGS.group == ['all']:
-        ARGS.group = list(_builtin_configs.keys())
-
-    all_configs = set()
-    for group in ARGS.group:
-        # By default print available configs
-        if not ARGS.config:
-            all_configs.update(list_configs(group))
+    search_all = not ARGS.group or ARGS.group == ['all']
+    if search_all:
+        ARGS.group = catalogue.get_groups()
+
+    if ARGS.batch is not None:
+        print_batch(ARGS.group, ARGS.batch or None, jobs=ARGS.jobs)
+    # By default print available configs
+    elif not ARGS.config:
+        if search_all:
+            all_configs = catalogue.get_all_configs()
+        else:
+            all_configs = set()
+            for group in ARGS.group:
+                all_configs.update(list_configs(group))
+        for config in all_configs:
+            print(config)
+    elif ARGS.config_params or ARGS.build_commands:
+        # Configs are found in the index of the catalogue, the first of the
+        # selected groups holding it is used
+        group = catalogue.find_group(ARGS.config,
+                                     None if search_all else ARGS.group)
+        if group is None:
+            msg = "Could not find configuration {} in groups {}".format(
+                ARGS.config, ARGS.group
+            )
+            # Do not hand the message to a shell evaluating the output
+            if ARGS.build_commands == "all":
+                print(msg, file=sys.stderr)
+                sys.exit(1)
+            print(msg)
+        elif ARGS.config_params:
+            print_build_configs(ARGS.config, group=group, silence_stderr=True)
         else:
-            try:
-                if ARGS.config_params:
-                    print_build_configs(ARGS.config, group=group, silence_stderr=True)
-                    break
-                if ARGS.build_commands:
-                    print_build_commands(ARGS.config, ARGS.build_commands, group=group, jobs=ARGS.jobs)
-                    break
-            except (SystemExit, KeyError):
-                if group == ARGS.group[-1] or ARGS.group == []:
-                    print(
-                        "Could not find configuration {} in groups {}".format(
-                            ARGS.config, ARGS.group
-                        )
-                    )
-
-    for config in all_configs:
-        print(config)
+            print_build_commands(ARGS.config, ARGS.build_commands, group=group, jobs=ARGS.jobs)
@@ -17,17 +17,19 @@ Script for waiting for LAVA jobs and parsing the results
 
 import os
 import time
-import yaml
 import argparse
 import shutil
 import logging
 import json
 from xmlrpc.client import ProtocolError
-from jinja2 import Environment, FileSystemLoader
 from lava_helper import test_lava_dispatch_credentials
 from lava_submit_jobs import submit_lava_jobs
+from tfm_ci_pylib.lazy_import import lazy_import
 import codecov_helper
 
+yaml = lazy_import("yaml")
+jinja2 = lazy_import("jinja2")
+
 
 _log = logging.getLogger("lavaci")
 
@@ -52,7 +54,8 @@ def process_finished_jobs(finished_jobs, user_args):
 
 def get_finished_jobs(job_list, user_args, lava):
     _log.info("Waiting for %d LAVA jobs", len(job_list))
-    finished_jobs = lava.block_wait_for_jobs(job_list, user_args.dispatch_timeout, 5)
+    finished_jobs = lava.block_wait_for_jobs(job_list, user_args.dispatch_timeout, 5,
+                                             user_args.lava_connections)
     unfinished_jobs = [item for item in job_list if item not in finished_jobs]
     for job in unfinished_jobs:
         _log.info("Cancelling unfinished job %d because of timeout.", job)
@@ -191,8 +194,8 @@ def test_report(jobs, user_args):
 
 def render_jinja(data):
     work_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), "jinja2_templates")
-    template_loader = FileSystemLoader(searchpath=work_dir)
-    template_env = Environment(loader=template_loader)
+    template_loader = jinja2.FileSystemLoader(searchpath=work_dir)
+    template_env = jinja2.Environment(loader=template_loader)
     html = template_env.get_template("test_summary.jinja2").render(data)
     csv = template_env.get_template("test_summary_csv.jinja2").render(data)
     with open('test_summary.html', "w") as F:
@@ -256,6 +259,9 @@ def get_cmd_args():
     cmdargs.add_argument(
         "--lava-timeout", dest="dispatch_timeout", action="store", type=int, default=3600, help="Time in seconds to wait for all jobs"
     )
+    cmdargs.add_argument(
+        "--lava-connections", dest="lava_connections", action="store", type=int, default=4, help="Number of connections polling LAVA jobs concurrently"
+    )
     cmdargs.add_argument(
         "--artifacts-path", dest="artifacts_path", action="store", help="Download LAVA artifacts to this directory"
     )
@@ -14,8 +14,12 @@ import os
 import json
 import logging
 import re
-import requests
 from tfm_ci_pylib import utils
+from tfm_ci_pylib.lazy_import import lazy_import
+from tfm_ci_pylib.image_sizes import TFM_Image_Sizes
+from tfm_ci_pylib import footprint
+
+requests = lazy_import("requests")
 
 mem_configs = {
     'AN521_ARMCLANG_1_Minsizerel_BL2':              'MEMORY-AN521-ARMCC-Default-Minsizerel',
@@ -42,16 +46,26 @@ def get_git_commit_hash(repo='trusted-firmware-m'):
 
 def get_file_size(filename):
     '''
-    This function uses fromelf of ARMCLANG to get the sizes of a file in the build binary directory of TF-M
+    This function uses fromelf of ARMCLANG to get the Code, RO, RW and ZI sizes of a file in the build binary directory of TF-M
     '''
-    f_path = os.path.join(os.getenv('WORKSPACE'), 'ci_build', 'spe', 'bin', filename)
-    if os.path.exists(f_path) :
-        data_fromelf = utils.fromelf(f_path)
-        print(data_fromelf[1])  # Output of fromelf
-        return data_fromelf[0]  # Data parsed from output of fromelf
-    else :
-        print(f_path + 'Not found')
-        return -1
+    return get_file_sizes([filename])[filename]
+
+def get_file_sizes(filenames):
+    '''
+    Get the sizes of files in the build binary directory of TF-M with fromelf. Without ARMCLANG, the sizes of ELF images are read in Python
+    '''
+    bin_dir = os.path.join(os.getenv('WORKSPACE'), 'ci_build', 'spe', 'bin')
+    f_paths = {f: os.path.join(bin_dir, f) for f in filenames}
+    sizes = {f: -1 for f in filenames}
+    found = [p for p in f_paths.values() if os.path.exists(p)]
+    img_sizes = TFM_Image_Sizes().get_sizes(found, tool='fromelf')
+    for f, f_path in f_paths.items():
+        if f_path in img_sizes:
+            print(f + ': ' + json.dumps(img_sizes[f_path]))
+            sizes[f] = img_sizes[f_path]
+        else :
+            print(f_path + 'Not found')
+    return sizes
 
 def save_mem_to_json(config_name, bl2_sizes, tfm_s_sizes):
     '''
@@ -78,6 +92,36 @@ def save_mem_to_json(config_name, bl2_sizes, tfm_s_sizes):
         F.write(metrics)
     return 0
 
+def save_footprint_to_json(config_name):
+    '''
+    This function indexes the section, symbol and object sizes of all the images built in the binary directories of
+    TF-M to a json file in share folder, for footprint diffs between builds. Object sizes are read from the linker map
+    files written next to the images.
+    '''
+    images = []
+    for image in ['spe', 'nspe']:
+        bin_dir = os.path.join(os.getenv('WORKSPACE'), 'ci_build', image, 'bin')
+        if os.path.isdir(bin_dir):
+            images += sorted(os.path.join(bin_dir, f) for f in os.listdir(bin_dir) if f.endswith('.axf'))
+    try:
+        index = footprint.footprint_index(images)
+    except (ValueError, OSError) as e:
+        print('Footprint index failed: {}'.format(e))
+        return -1
+
+    footprint.save_footprint(os.path.join(os.getenv('SHARE_FOLDER'),
+                                          'Memory_footprint',
+                                          '{}_footprint.json'.format(config_name)), index)
+    return 0
+
+def diff_footprint(old_f, new_f, top):
+    '''
+    Print the section, symbol and object sizes which differ between two builds, ranked by growth. Builds are given as
+    footprint json files, or as ELF images with their linker map files next to them.
+    '''
+    diff = footprint.diff_footprint(footprint.load_footprint(old_f), footprint.load_footprint(new_f))
+    footprint.print_footprint_diff(diff, top)
+
 def get_prof_psa_client_api_data(f_log_path):
     '''
     Get PSA Client API profiling data report from target log.
@@ -143,20 +187,25 @@ def send_squad(user_args, job_dir, config_name):
 
 def main(user_args):
     if user_args.generate_memory:
-        # Export ARMClang v6.13 to ENV PATH
-        os.environ['PATH'] += os.pathsep + os.getenv('ARMCLANG_6_21_PATH')
+        # Sizes are read in Python only when fromelf of ARMClang is not available
+        if os.getenv('ARMCLANG_6_21_PATH'):
+            os.environ['PATH'] += os.pathsep + os.getenv('ARMCLANG_6_21_PATH')
         if os.getenv('CONFIG_NAME') in mem_configs.keys():
             print('Configuration ' + os.getenv('CONFIG_NAME') + ' is a reference')
 
-            print('---------- BL2 Memory Footprint ----------')
-            bl2_sizes = get_file_size('bl2.axf')
-
-            print('------ TF-M Secure Memory Footprint ------')
-            tfm_s_sizes = get_file_size('tfm_s.axf')
+            print('----- BL2 and TF-M Secure Memory Footprint -----')
+            sizes = get_file_sizes(['bl2.axf', 'tfm_s.axf'])
+            bl2_sizes, tfm_s_sizes = sizes['bl2.axf'], sizes['tfm_s.axf']
 
             if save_mem_to_json(os.getenv('CONFIG_NAME'), bl2_sizes, tfm_s_sizes) == -1:
                 print('Memory footprint generate failed.')
 
+            if save_footprint_to_json(os.getenv('CONFIG_NAME')) == -1:
+                print('Memory footprint index generate failed.')
+
+    if user_args.footprint_diff:
+        diff_footprint(user_args.footprint_diff[0], user_args.footprint_diff[1], user_args.top)
+
     if user_args.send_squad:
         with open(os.path.join(os.getenv('SHARE_FOLDER'), 'performance_config.txt'), 'r') as f:
             for line in f:
@@ -171,6 +220,12 @@ def get_cmd_args():
     cmdargs.add_argument(
         '--generate-memory', dest='generate_memory', action='store_true', default=False, help='Generate memory footprint data'
     )
+    cmdargs.add_argument(
+        '--footprint-diff', dest='footprint_diff', nargs=2, metavar=('OLD', 'NEW'), help='Diff the section, symbol and object sizes of two builds'
+    )
+    cmdargs.add_argument(
+        '--top', dest='top', type=int, default=None, help='Number of largest growths and reductions shown by --footprint-diff'
+    )
     cmdargs.add_argument(
         '--send-squad', dest='send_squad', action='store_true', default=False, help='Send data to SQUAD'
     )
@@ -31,7 +31,6 @@ import re
 import sys
 import json
 import argparse
-import xmltodict
 from pprint import pprint
 
 try:
@@ -45,6 +44,9 @@ except ImportError:
     from tfm_ci_pylib.utils import load_json, get_local_git_info, \
         save_json, list_subdirs, get_remote_git_info, \
         convert_git_ref_path
+from tfm_ci_pylib.lazy_import import lazy_import
+
+xmltodict = lazy_import("xmltodict")
 
 
 def xml_read(file):
@@ -38,6 +38,17 @@ function check_dependency_version() {
     done
 }
 
+# Apply patches to a repository unless a previous run already applied them,
+# which is the case when the workspace is kept for incremental builds.
+function apply_patches() {
+    cd $1
+    shift
+    if ! git apply --reverse --check "$@" 2> /dev/null ; then
+        git apply "$@"
+    fi
+    cd -
+}
+
 set -ex
 
 if [ -z "$CONFIG_NAME" ] ; then
@@ -45,12 +56,10 @@ if [ -z "$CONFIG_NAME" ] ; then
     exit 1
 fi
 
-set_compiler_cmd=$(python3 tf-m-ci-scripts/configs.py -b set_compiler $CONFIG_NAME)
-spe_cmake_config_cmd=$(python3 tf-m-ci-scripts/configs.py -b spe_cmake_config $CONFIG_NAME)
-spe_cmake_build_cmd=$(python3 tf-m-ci-scripts/configs.py -b spe_cmake_build -j ${BUILD_JOBS:-2} $CONFIG_NAME)
-nspe_cmake_config_cmd=$(python3 tf-m-ci-scripts/configs.py -b nspe_cmake_config $CONFIG_NAME)
-nspe_cmake_build_cmd=$(python3 tf-m-ci-scripts/configs.py -b nspe_cmake_build -j ${BUILD_JOBS:-2} $CONFIG_NAME)
-post_build_cmd=$(python3 tf-m-ci-scripts/configs.py -b post_build $CONFIG_NAME)
+# Sets set_compiler_cmd, spe_cmake_config_cmd, spe_cmake_build_cmd,
+# nspe_cmake_config_cmd, nspe_cmake_build_cmd and post_build_cmd
+build_cmds=$(python3 tf-m-ci-scripts/configs.py -b all -j ${BUILD_JOBS:-2} $CONFIG_NAME)
+eval "$build_cmds"
 
 set +e
 echo "output current build environment"
@@ -88,40 +97,54 @@ fi
 
 cnt=$(ls trusted-firmware-m/lib/ext/mbedcrypto/*.patch 2> /dev/null | wc -l)
 if [ "$cnt" != "0" ] ; then
-    cd mbedtls
-    git apply ../trusted-firmware-m/lib/ext/mbedcrypto/*.patch
-    cd -
+    apply_patches mbedtls ../trusted-firmware-m/lib/ext/mbedcrypto/*.patch
 fi
 
 cnt=$(ls tf-m-tests/tests_psa_arch/fetch_repo/*.patch 2> /dev/null | wc -l)
 if [ "$cnt" != "0" ] ; then
-    cd psa-arch-tests
-    git apply ../tf-m-tests/tests_psa_arch/fetch_repo/*.patch
-    cd -
+    apply_patches psa-arch-tests ../tf-m-tests/tests_psa_arch/fetch_repo/*.patch
 fi
 
-cd trusted-firmware-m
-git apply ../tf-m-ci-scripts/build_helper/platform_settings/*.patch
-cd -
-
-rm -rf ci_build
-mkdir ci_build
-cd ci_build
-
-set +e
-eval $spe_cmake_config_cmd
-declare -i cmake_cfg_error=$?
-set -e
+apply_patches trusted-firmware-m ../tf-m-ci-scripts/build_helper/platform_settings/*.patch
+
+# With INCREMENTAL_BUILD set, the build tree of the previous run is kept if it
+# was configured for the same config with the same commands. The build steps
+# then only rebuild what changed.
+configure_stamp=$(echo "$CONFIG_NAME $set_compiler_cmd $spe_cmake_config_cmd $nspe_cmake_config_cmd" | sha256sum | cut -d ' ' -f 1)
+if [ -n "$INCREMENTAL_BUILD" ] && [ "$(cat ci_build/.configure_stamp 2> /dev/null)" = "$configure_stamp" ] ; then
+    echo "Incremental build: reusing ci_build"
+    incremental_build=1
+    rm ci_build/.configure_stamp
+    cd ci_build
+    check_dependency_version
+else
+    echo "Cold build"
+    incremental_build=0
+    rm -rf ci_build
+    mkdir ci_build
+    cd ci_build
+
+    set +e
+    eval $spe_cmake_config_cmd
+    declare -i cmake_cfg_error=$?
+    set -e
 
-check_dependency_version
+    check_dependency_version
 
-if [ $cmake_cfg_error != 0 ] ; then
-    rm -rf ./*
-    eval $spe_cmake_config_cmd
+    if [ $cmake_cfg_error != 0 ] ; then
+        rm -rf ./*
+        eval $spe_cmake_config_cmd
+    fi
 fi
 eval $spe_cmake_build_cmd
 
-eval $nspe_cmake_config_cmd
+if [ $incremental_build = 0 ] ; then
+    eval $nspe_cmake_config_cmd
+fi
 eval $nspe_cmake_build_cmd
 
 eval $post_build_cmd
+
+if [ -n "$INCREMENTAL_BUILD" ] ; then
+    echo "$configure_stamp" > .configure_stamp
+fi
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2023, Arm Limited. All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+
+"""
+Benchmark the expansion of the seed, valid and invalid configs of a group.
+The constraint engine is compared to a reference expansion which generates
+every rejected config and subtracts them by name, on a synthetic seed matrix
+and on the built-in groups. Both must produce the same configs.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", ".."))
+
+from build_helper.build_helper_configs import _builtin_configs, \
+    _common_tfm_builder_cfg, _common_tfm_invalid_configs
+from build_helper.build_helper_config_maps import mapPlatform, \
+    mapTestPsaApi, mapProfile, mapExtraParams
+from tfm_ci_pylib.tfm_build_manager import TFM_Build_Manager
+from tfm_ci_pylib.config_constraints import TFM_Config_Constraints
+
+
+def reference_expansion(seed, invalid):
+    """ Expand every invalid pattern into configs and subtract them by name
+    from the seed configs """
+
+    tags = [n for n in _common_tfm_builder_cfg["sort_order"] if n in seed]
+    configs = {TFM_Build_Manager.generate_config_name(c): c for c in
+               itertools.product(*[seed[t] for t in tags])}
+    rejected = set()
+    for pattern in invalid:
+        pattern = list(pattern) + ["*"] * (len(tags) - len(pattern))
+        values = [seed[t] if v == "*" else [v] for t, v in zip(tags, pattern)]
+        rejected.update(TFM_Build_Manager.generate_config_name(c)
+                        for c in itertools.product(*values))
+    return {k: v for k, v in configs.items() if k not in rejected}
+
+
+def engine_expansion(seed, invalid):
+    """ Expand the seed configs skipping the ones matching invalid patterns """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        tags = [n for n in _common_tfm_builder_cfg["sort_order"]
+                if n in seed]
+        rejection = TFM_Config_Constraints(tags, seed, invalid)
+        return TFM_Build_Manager.generate_config_list(seed,
+                                                      _common_tfm_builder_cfg,
+                                                      rejection)
+
+
+def synthetic_group(platforms, patterns, rnd):
+    """ Return a seed matrix over the first platforms, and the common invalid
+    configs plus random invalid patterns fixing three or four dimensions """
+
+    seed = {"tfm_platform":     list(mapPlatform)[:platforms],
+            "compiler":         ["GCC_10_3", "ARMCLANG_6_21"],
+            "isolation_level":  ["1", "2", "3"],
+            "test_regression":  ["OFF", "RegBL2, RegS, RegNS", "RegS",
+                                 "RegNS"],
+            "test_psa_api":     ["OFF"] + list(mapTestPsaApi),
+            "cmake_build_type": ["Debug", "Release", "Minsizerel",
+                                 "Relwithdebinfo"],
+            "with_bl2":         [True, False],
+            "profile":          [""] + list(mapProfile),
+            "extra_params":     list(mapExtraParams)[:2]}
+    tags = _common_tfm_builder_cfg["sort_order"]
+    invalid = list(_common_tfm_invalid_configs)
+    for _ in range(patterns):
+        pattern = ["*"] * len(tags)
+        for n in rnd.sample(range(len(tags)), rnd.choice([3, 4])):
+            pattern[n] = rnd.choice(seed[tags[n]])
+        invalid.append(tuple(pattern))
+    return seed, invalid
+
+
+def timed(func, *args, repeat=3):
+    """ Return the result and the best time in ms of repeat calls """
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ret = func(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return ret, best
+
+
+def main(user_args):
+    rnd = random.Random(user_args.seed)
+    seed, invalid = synthetic_group(user_args.platforms,
+                                    user_args.patterns,
+                                    rnd)
+    combinations = 1
+    for values in seed.values():
+        combinations *= len(values)
+    print("Synthetic group: %d combinations, %d invalid patterns" %
+          (combinations, len(invalid)))
+
+    ref, ref_ms = timed(reference_expansion, seed, invalid)
+    new, new_ms = timed(engine_expansion, seed, invalid)
+    print("%-24s %10s %10s %10s" % ("", "configs", "ms", "speedup"))
+    print("%-24s %10d %10.1f" % ("reference", len(ref), ref_ms))
+    print("%-24s %10d %10.1f %9.1fx" % ("constraint engine", len(new), new_ms,
+                                        ref_ms / new_ms))
+    if set(ref) != set(new):
+        print("ERROR: expansions differ")
+        return 1
+
+    print("\nBuilt-in groups:")
+    total_ms = 0
+    for group in sorted(_builtin_configs):
+        def parse():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return TFM_Build_Manager(os.getcwd(), os.getcwd(),
+                                         _builtin_configs[group])
+        bm, ms = timed(parse)
+        total_ms += ms
+        print("%-24s %10d %10.1f" % (group, len(bm.get_config()), ms))
+    print("%-24s %10s %10.1f" % ("total", "", total_ms))
+    return 0
+
+
+def get_cmd_args():
+    """ Parse command line arguments """
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--platforms",
+                        type=int,
+                        default=6,
+                        help="Number of platforms of the synthetic group")
+    parser.add_argument("--patterns",
+                        type=int,
+                        default=200,
+                        help="Number of random invalid patterns")
+    parser.add_argument("--seed",
+                        type=int,
+                        default=0,
+                        help="Seed of the random invalid patterns")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(get_cmd_args()))
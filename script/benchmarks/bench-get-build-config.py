@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2023, Arm Limited. All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+
+"""
+Benchmark the rendering of the build configs of every config of the built-in
+groups. TFM_Build_Manager.get_build_config is compared to a reference which
+deep copies the common config for every render, as it used to, and timed
+again once its renders are memoized. Memory is measured with tracemalloc, as
+the mean peak allocation of a render and as the memory held by the
+rendered configs of a group. Both must render the same build configs.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", ".."))
+
+from build_helper.build_helper_configs import _builtin_configs
+from build_helper.build_helper_config_maps import mapRegTest, mapExtraParams
+from tfm_ci_pylib.tfm_build_manager import TFM_Build_Manager
+
+
+def reference_get_build_config(bm, i, codebase_dir, jobs):
+    """ Render a build config deep copying the common config """
+
+    build_cfg = deepcopy(bm.tbm_common_cfg)
+    build_cfg["codebase_root_dir"] = codebase_dir
+    try:
+        build_cfg["required_artefacts"] = \
+            deepcopy(bm.tbm_common_cfg["required_artefacts"]["all"])
+    except KeyError:
+        build_cfg["required_artefacts"] = []
+    build_cfg["post_build"] = ""
+    for key in ["post_build", "required_artefacts"]:
+        try:
+            if i.tfm_platform in bm.tbm_common_cfg[key].keys():
+                build_cfg[key] += deepcopy(bm.tbm_common_cfg[key]
+                                           [i.tfm_platform])
+        except Exception:
+            pass
+
+    thread_no = " -j {} ".format(jobs)
+    build_cfg["spe_cmake_build"] += thread_no
+    build_cfg["nspe_cmake_build"] += thread_no
+
+    build_cfg["set_compiler_path"] %= {"compiler": i.compiler}
+    build_cfg["set_compiler_path"] += " ;\n{} --version".format(
+        bm.get_compiler_name(i.compiler))
+
+    def map_params(params, maps):
+        build_configs = ""
+        for param in params.split(", "):
+            build_configs += maps[param]
+        return build_configs
+
+    code_dir = build_cfg["codebase_root_dir"]
+    overwrite_params = {
+        "codebase_root_dir": code_dir,
+        "spe_root_dir": code_dir + "/../tf-m-tests/tests_reg/spe",
+        "nspe_root_dir": code_dir + "/../tf-m-tests/tests_reg",
+        "ci_build_root_dir": code_dir + "/../ci_build",
+        "tfm_platform": i.tfm_platform,
+        "s_compiler": bm.choose_toolchain(i.compiler, s_build=True),
+        "ns_compiler": bm.choose_toolchain(i.compiler, s_build=False),
+        "isolation_level": i.isolation_level,
+        "test_regression": map_params(i.test_regression, mapRegTest),
+        "test_psa_api": i.test_psa_api,
+        "cmake_build_type": i.cmake_build_type,
+        "with_bl2": i.with_bl2,
+        "profile": "" if i.profile == "N.A" else i.profile}
+    overwrite_params["extra_params"] = \
+        map_params(i.extra_params, mapExtraParams) % overwrite_params
+    if i.isolation_level == "3":
+        overwrite_params["extra_params"] += " -DCMAKE_VERBOSE_MAKEFILE=ON"
+    if i.test_psa_api == "IPC":
+        overwrite_params["test_psa_api"] += " -DINCLUDE_PANIC_TESTS=1"
+    if i.test_psa_api == "CRYPTO" and "musca" in i.tfm_platform:
+        overwrite_params["test_psa_api"] += \
+            " -DCC312_LEGACY_DRIVER_API_ENABLED=OFF"
+    if i.tfm_platform == "arm/musca_b1":
+        overwrite_params["test_psa_api"] += \
+            " -DOTP_NV_COUNTERS_RAM_EMULATION=ON"
+    if i.test_psa_api != "OFF":
+        overwrite_params["spe_root_dir"] = \
+            code_dir + "/../tf-m-tests/tests_psa_arch/spe"
+        overwrite_params["nspe_root_dir"] = \
+            code_dir + "/../tf-m-tests/tests_psa_arch"
+    elif "PROF" in i.extra_params:
+        overwrite_params["spe_root_dir"] = code_dir
+        overwrite_params["nspe_root_dir"] = code_dir + \
+            "/../tf-m-tools/profiling/profiling_cases/tfm_profiling"
+
+    build_cfg["spe_config_template"] %= overwrite_params
+    build_cfg["nspe_config_template"] %= overwrite_params
+    build_cfg["spe_cmake_build"] %= overwrite_params
+    build_cfg["nspe_cmake_build"] %= overwrite_params
+    build_cfg["post_build"] %= overwrite_params
+    build_cfg["required_artefacts"] = [n % overwrite_params for n in
+                                       build_cfg["required_artefacts"]]
+    build_cfg["artifact_capture_rex"] %= dict(
+        overwrite_params,
+        ci_build_root_dir=re.escape(overwrite_params["ci_build_root_dir"]))
+    build_cfg["ci_build_root_dir"] = overwrite_params["ci_build_root_dir"]
+    if "NSOFF" in i.extra_params:
+        build_cfg["nspe_config_template"] = ""
+        build_cfg["nspe_cmake_build"] = ""
+    return build_cfg
+
+
+def render_time(render, configs):
+    """ Render every config of a group, returning the rendered configs and
+    the time in ms """
+
+    start = time.perf_counter()
+    rendered = [render(name, i) for name, i in configs.items()]
+    return rendered, (time.perf_counter() - start) * 1000
+
+
+def render_memory(render, configs):
+    """ Render every config of a group, returning the mean peak allocation
+    of a render and the memory held by the rendered configs, in KiB """
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    peak = 0
+    rendered = []
+    for name, i in configs.items():
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        rendered.append(render(name, i))
+        peak += tracemalloc.get_traced_memory()[1] - current
+    held = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return peak / len(configs) / 1024, held / 1024
+
+
+def group_manager(group):
+    """ Return a build manager of a built-in group """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return TFM_Build_Manager(os.getcwd(), os.getcwd(),
+                                 _builtin_configs[group])
+
+
+def main(user_args):
+    codebase_dir = os.path.join(os.getcwd(), "trusted-firmware-m")
+
+    def reference(bm):
+        return lambda n, i: reference_get_build_config(bm, i, codebase_dir,
+                                                       user_args.jobs)
+
+    def memoized(bm):
+        return lambda n, i: bm.get_build_config(i, n,
+                                                codebase_dir=codebase_dir,
+                                                jobs=user_args.jobs)
+
+    totals = [0] * 7
+    print("%-28s %7s %25s %25s %9s" % ("", "", "reference",
+                                       "get_build_config", "memoized"))
+    print("%-28s %7s %8s %8s %8s %8s %8s %8s %9s" %
+          ("group", "configs", "ms", "peak KiB", "held KiB",
+           "ms", "peak KiB", "held KiB", "ms"))
+    for group in sorted(_builtin_configs):
+        # Memoized renders are measured on managers of their own
+        bm = group_manager(group)
+        configs = bm._tbm_build_cfg
+        ref, ref_ms = render_time(reference(bm), configs)
+        new, new_ms = render_time(memoized(bm), configs)
+        memo, memo_ms = render_time(memoized(bm), configs)
+        if ref != new or new != memo:
+            print("ERROR: rendered configs of %s differ" % group)
+            return 1
+        ref_peak, ref_held = render_memory(reference(bm), configs)
+        new_peak, new_held = render_memory(memoized(group_manager(group)),
+                                           configs)
+        row = [ref_ms, ref_peak, ref_held, new_ms, new_peak, new_held, memo_ms]
+        totals = [max(a, b) if n in (1, 4) else a + b
+                  for n, (a, b) in enumerate(zip(totals, row))]
+        print("%-28s %7d %8.2f %8.1f %8.1f %8.2f %8.1f %8.1f %9.2f" %
+              tuple([group, len(configs)] + row))
+
+    print("%-28s %7s %8.2f %8.1f %8.1f %8.2f %8.1f %8.1f %9.2f" %
+          tuple(["total", ""] + totals))
+    print("\nHeld memory reduced %.1fx, render time %.1fx, memoized %.1fx" %
+          (totals[2] / totals[5], totals[0] / totals[3],
+           totals[0] / totals[6]))
+    return 0
+
+
+def get_cmd_args():
+    """ Parse command line arguments """
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-j", "--jobs",
+                        default="2",
+                        help="Jobs of the rendered build commands")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(get_cmd_args()))
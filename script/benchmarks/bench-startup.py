@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2023, Arm Limited. All rights reserved.
+#
+# SPDX-License-Identifier: BSD-3-Clause
+#
+
+"""
+Benchmark the cold start of the Python entry points of the CI jobs. Every
+entry point is started with --help, which runs its module level imports, and
+the start up latency and import time are reported over those of a bare
+interpreter, with the heavy third party modules it loads. The baselines
+hold these differences, which depend less on the host than absolute times.
+
+With --check, the results are compared to the stored baselines and the
+benchmark fails when an entry point starts loading a heavy module it did not
+load before, or gets slower than the baseline beyond the tolerance.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+_scripts_dir = os.path.abspath(os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", ".."))
+
+_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "bench-startup-baseline.json")
+
+# Entry point, command line and environment of the job starting it
+entry_points = {
+    "configs":          (["configs.py", "--help"], {}),
+    "lava_create_jobs": (["lava_helper/lava_create_jobs.py", "--help"],
+                         {"TEST_REGRESSION": "OFF",
+                          "TEST_PSA_API": "OFF",
+                          "EXTRA_PARAMS": ""}),
+    "lava_wait_jobs":   (["lava_helper/lava_wait_jobs.py", "--help"], {}),
+    "performance":      (["performance.py", "--help"], {}),
+    "report_parser":    (["report_parser/report_parser.py", "--help"], {}),
+}
+
+heavy_modules = ["requests", "yaml", "jinja2", "xmltodict"]
+
+
+def run(args, env):
+    """ Run the interpreter and return the wall time in ms and its stderr """
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + args,
+                          cwd=_scripts_dir,
+                          env=dict(os.environ, **env),
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if proc.returncode:
+        raise Exception("%s failed:\n%s" % (" ".join(args), proc.stderr))
+    return elapsed, proc.stderr
+
+
+def import_profile(args, env):
+    """ Return the total import time in ms of the command, and the top level
+    modules it imports """
+
+    _, importtime = run(["-X", "importtime"] + args, env)
+    total = 0
+    modules = set()
+    for line in importtime.splitlines():
+        m = re.match(r"import time:\s+(\d+)\s+\|\s+\d+\s+\|\s+(\S+)", line)
+        if m:
+            total += int(m.group(1))
+            modules.add(m.group(2).split(".")[0])
+    return total / 1000, modules
+
+
+def measure(args, env, runs):
+    """ Return the best start up time and import time in ms of the command
+    over those of a bare interpreter, and the heavy modules it imports. Bare
+    runs are interleaved with the timed runs, so that both see the same load
+    of the machine """
+
+    # Warm up the page cache, and the config catalogue for configs.py
+    run(args, env)
+    bare = []
+    startup = []
+    for _ in range(runs):
+        bare.append(run(["-c", "pass"], {})[0])
+        startup.append(run(args, env)[0])
+
+    bare_imports, _ = import_profile(["-c", "pass"], {})
+    imports, modules = import_profile(args, env)
+    return min(startup) - min(bare), imports - bare_imports, \
+        sorted(modules.intersection(heavy_modules))
+
+
+def main(user_args):
+    results = {}
+    print("%-18s %12s %12s  %s" % ("entry point", "startup ms", "imports ms",
+                                   "heavy modules"))
+    for name, (args, env) in entry_points.items():
+        startup, imports, modules = measure(args, env, user_args.runs)
+        results[name] = {"startup_ms": round(startup, 1),
+                         "imports_ms": round(imports, 1),
+                         "heavy_modules": modules}
+        print("%-18s %12.1f %12.1f  %s" % (name,
+                                          results[name]["startup_ms"],
+                                          results[name]["imports_ms"],
+                                          ", ".join(modules) or "-"))
+
+    if user_args.update_baseline:
+        with open(_baseline_file, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print("\nBaseline saved to %s" % _baseline_file)
+        return 0
+
+    if not user_args.check:
+        return 0
+
+    with open(_baseline_file, "r") as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        loaded = set(result["heavy_modules"]) - set(base["heavy_modules"])
+        if loaded:
+            regressions.append("%s now imports %s" %
+                               (name, ", ".join(sorted(loaded))))
+        limit = base["startup_ms"] * (1 + user_args.tolerance) + \
+            user_args.slack_ms
+        if result["startup_ms"] > limit:
+            regressions.append("%s starts in %.1f ms, over the %.1f ms "
+                               "limit" % (name, result["startup_ms"], limit))
+    for regression in regressions:
+        print("ERROR: %s" % regression)
+    if not regressions:
+        print("\nNo regressions against %s" % _baseline_file)
+    return 1 if regressions else 0
+
+
+def get_cmd_args():
+    """ Parse command line arguments """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs",
+                        type=int,
+                        default=10,
+                        help="Number of timed runs of every entry point")
+    parser.add_argument("--check",
+                        action="store_true",
+                        help="Fail on regressions against the baselines")
+    parser.add_argument("--update-baseline",
+                        action="store_true",
+                        help="Store the results as the new baselines")
+    parser.add_argument("--tolerance",
+                        type=float,
+                        default=0.5,
+                        help="Allowed relative start up time over baseline")
+    parser.add_argument("--slack-ms",
+                        type=float,
+                        default=20,
+                        help="Allowed absolute start up time over baseline, "
+                             "absorbing the noise on fast entry points")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(get_cmd_args()))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+""" elf_writer.py:
+
+    Writer of small little endian ELF32 Arm images with the given sections
+    and symbols, used to test the readers of built images without a
+    toolchain. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import struct
+
+# Section types
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_NOBITS = 8
+
+# Section flags
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+# Symbol types and bindings
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+STB_LOCAL = 0
+STB_GLOBAL = 1
+
+_header = struct.Struct("<16sHHIIIIIHHHHHH")
+_section_header = struct.Struct("<IIIIIIIIII")
+_symbol = struct.Struct("<IIIBBH")
+
+
+def _string_table(names):
+    """ Return a string table holding the names, and their offsets """
+
+    table = b"\0"
+    offsets = {"": 0}
+    for name in names:
+        if name not in offsets:
+            offsets[name] = len(table)
+            table += name.encode("utf-8") + b"\0"
+    return table, offsets
+
+
+def write_elf(filename, sections, symbols=()):
+    """ Write an executable image. sections are (name, type, flags,
+    address, content), where the content of SHT_NOBITS sections is their
+    size. symbols are (name, section name, value, size, type, binding),
+    local symbols first """
+
+    sec_index = {s[0]: n + 1 for n, s in enumerate(sections)}
+    strtab, str_offsets = _string_table(s[0] for s in symbols)
+    symtab = _symbol.pack(0, 0, 0, 0, 0, 0)
+    for name, section, value, size, sym_type, bind in symbols:
+        symtab += _symbol.pack(str_offsets[name], value, size,
+                               bind << 4 | sym_type, 0, sec_index[section])
+    locals_count = 1 + sum(1 for s in symbols if s[5] == STB_LOCAL)
+
+    symtab_index = len(sections) + 1
+    sections = list(sections) + [
+        (".symtab", SHT_SYMTAB, 0, 0, symtab),
+        (".strtab", SHT_STRTAB, 0, 0, strtab),
+        (".shstrtab", SHT_STRTAB, 0, 0, None)]
+    shstrtab, name_offsets = _string_table(s[0] for s in sections)
+
+    body = bytearray(_header.size)
+    headers = [_section_header.pack(*[0] * 10)]
+    for name, sh_type, flags, addr, content in sections:
+        if name == ".shstrtab":
+            content = shstrtab
+        link, info, entsize = 0, 0, 0
+        if sh_type == SHT_SYMTAB:
+            link, info, entsize = symtab_index + 1, locals_count, _symbol.size
+        if sh_type == SHT_NOBITS:
+            offset, size = len(body), content
+        else:
+            offset, size = len(body), len(content)
+            body += content
+        headers.append(_section_header.pack(name_offsets[name], sh_type,
+                                            flags, addr, offset, size, link,
+                                            info, 4, entsize))
+    body += b"\0" * (-len(body) % 4)
+    shoff = len(body)
+    body += b"".join(headers)
+
+    ident = b"\x7fELF" + bytes([1, 1, 1]) + b"\0" * 9
+    body[:_header.size] = _header.pack(ident, 2, 40, 1, 0, 0, shoff,
+                                       0x05000000, _header.size, 32, 0,
+                                       _section_header.size, len(headers),
+                                       len(headers) - 1)
+    with open(filename, "wb") as F:
+        F.write(body)
+
+
+def write_test_image(filename, rw_size=8):
+    """ Write an image with code holding a literal pool, read only, read
+    write and zero initialised data, and debug info. rw_size sets the size
+    of the read write data and of its only symbol """
+
+    sections = [(".text", SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR,
+                 0x1000, b"\0" * 0x40),
+                (".rodata", SHT_PROGBITS, SHF_ALLOC, 0x1040, b"\1" * 0x10),
+                (".data", SHT_PROGBITS, SHF_ALLOC | SHF_WRITE,
+                 0x20000000, b"\2" * rw_size),
+                (".bss", SHT_NOBITS, SHF_ALLOC | SHF_WRITE,
+                 0x20000000 + rw_size, 0x100),
+                (".debug_info", SHT_PROGBITS, 0, 0, b"\3" * 0x20),
+                (".comment", SHT_PROGBITS, 0, 0, b"test\0")]
+    symbols = [("$t", ".text", 0x1000, 0, STT_NOTYPE, STB_LOCAL),
+               # Literal pool of 12 bytes after the code of main
+               ("$d", ".text", 0x1024, 0, STT_NOTYPE, STB_LOCAL),
+               ("$t", ".text", 0x1030, 0, STT_NOTYPE, STB_LOCAL),
+               ("helper", ".text", 0x1030, 0x10, STT_FUNC, STB_LOCAL),
+               ("main", ".text", 0x1000, 0x30, STT_FUNC, STB_GLOBAL),
+               ("table", ".rodata", 0x1040, 0x10, STT_OBJECT, STB_GLOBAL),
+               ("state", ".data", 0x20000000, rw_size, STT_OBJECT,
+                STB_GLOBAL),
+               ("buffer", ".bss", 0x20000000 + rw_size, 0x100, STT_OBJECT,
+                STB_GLOBAL)]
+    write_elf(filename, sections, symbols)
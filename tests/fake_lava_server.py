@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+""" fake_lava_server.py:
+
+    Local XML-RPC server answering the LAVA scheduler and results calls used
+    to wait for jobs. Jobs follow a fixed timeline from the start of the
+    server, and the calls made to it are counted. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import time
+import random
+import datetime
+import threading
+import xmlrpc.client
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+
+class _Threading_XMLRPC_Server(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class _Request_Handler(SimpleXMLRPCRequestHandler):
+    """ Answers a share of the requests with "502 Proxy Error", as the
+    proxy in front of a busy LAVA server does """
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        fake = self.server.fake
+        if fake.fail_request():
+            self.rfile.read(int(self.headers["content-length"]))
+            self.send_error(502, "Proxy Error")
+            return
+        return super(_Request_Handler, self).do_POST()
+
+
+class Fake_LAVA_Server(object):
+    """ Jobs are given as {job_id: (queued time, run time, health)}, in
+    seconds from the start, with an optional time spent canceling after the
+    run. Jobs with a negative queued time finished before the start.
+    Without bulk, scheduler.jobs.list is not provided. Jobs are shown after
+    delay seconds """
+
+    def __init__(self, jobs, bulk=True, error_rate=0.0, seed=1, delay=0):
+        self.jobs = jobs
+        self.bulk = bulk
+        self.error_rate = error_rate
+        self.delay = delay
+        self.pending = 0
+        self.calls = {}
+        self.list_args = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self._server.server_address[1]
+
+    def start(self):
+        self._start = time.time()
+        server = _Threading_XMLRPC_Server(("127.0.0.1", 0),
+                                          requestHandler=_Request_Handler,
+                                          allow_none=True,
+                                          logRequests=False)
+        server.fake = self
+        server.register_introspection_functions()
+        server.register_function(self.show, "scheduler.jobs.show")
+        if self.bulk:
+            server.register_function(self.list, "scheduler.jobs.list")
+        server.register_function(self.results,
+                                 "results.get_testsuite_results_yaml")
+        self._server = server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_request(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def end_time(self, job_id):
+        queued, run = self.jobs[job_id][:2]
+        return self._start + queued + run + self.canceling_time(job_id)
+
+    def canceling_time(self, job_id):
+        return self.jobs[job_id][3] if len(self.jobs[job_id]) > 3 else 0
+
+    def state(self, job_id):
+        """ Return the state, start and end time of a job """
+
+        queued, run = self.jobs[job_id][:2]
+        now = time.time() - self._start
+        if now < queued:
+            return "Submitted", None, None
+        if now < queued + run:
+            return "Running", self._start + queued, None
+        if now < queued + run + self.canceling_time(job_id):
+            return "Canceling", self._start + queued, None
+        return "Finished", self._start + queued, self.end_time(job_id)
+
+    @staticmethod
+    def date(t):
+        if t is None:
+            return None
+        return xmlrpc.client.DateTime(datetime.datetime.utcfromtimestamp(t))
+
+    def show(self, job_id):
+        """ Show a job, counting the calls still being answered """
+
+        self.count("show")
+        with self._lock:
+            self.pending += 1
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self._lock:
+                self.pending -= 1
+        state, start, end = self.state(job_id)
+        return {"id": job_id,
+                "description": "job %d" % job_id,
+                "device_type": "fvp",
+                "state": state,
+                "health": self.jobs[job_id][2] if end else "Unknown",
+                "start_time": self.date(start),
+                "end_time": self.date(end),
+                "submitter": "ci"}
+
+    def list(self, state=None, health=None, start=0, limit=25, since=0,
+             verbose=False):
+        """ Jobs of a state, newest first, which ended in the last since
+        minutes """
+
+        self.count("list")
+        with self._lock:
+            self.list_args.append((state, start, since))
+        jobs = []
+        for job_id in sorted(self.jobs, reverse=True):
+            job_state, _, end = self.state(job_id)
+            if state and job_state != state:
+                continue
+            if since and (end is None or end < time.time() - since * 60):
+                continue
+            jobs.append({"id": job_id, "state": job_state})
+        return jobs[start:start + limit]
+
+    def results(self, job_id, suite):
+        self.count("results")
+        return "- name: job\n  metadata: {error_type: Infrastructure}\n"
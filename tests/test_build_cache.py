@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+""" test_build_cache.py:
+
+    Tests of the content addressed cache of build outputs. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import shutil
+import tempfile
+import unittest
+from tfm_ci_pylib.build_cache import TFM_Build_Cache
+
+
+class TFM_Build_Cache_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.cache = TFM_Build_Cache(os.path.join(self.work_dir, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def write(self, path, data):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as F:
+            F.write(data)
+
+    def read(self, path):
+        with open(path, "rb") as F:
+            return F.read()
+
+    def build_tree(self, root):
+        """ Write a spe build tree in the build root root """
+
+        spe = os.path.join(root, "spe")
+        self.write(os.path.join(spe, "CMakeCache.txt"), root.encode())
+        self.write(os.path.join(spe, ".ninja_deps"), b"\0" + root.encode())
+        self.write(os.path.join(spe, "bin", "tfm_s.bin"), b"\0image")
+        self.write(os.path.join(spe, "tfm_s.axf"), b"\0elf " + root.encode())
+        self.write(os.path.join(spe, "api_ns", "cmake", "spe_export.cmake"),
+                   ("set(SPE_PATH %s/spe/api_ns)" % root).encode())
+        os.symlink(os.path.join(spe, "api_ns"), os.path.join(spe, "export"))
+        return spe
+
+    def test_restores_outputs_into_the_build_root(self):
+        root_a = os.path.join(self.work_dir, "config_a")
+        root_b = os.path.join(self.work_dir, "config_b")
+        self.cache.store("key", self.build_tree(root_a), root_a,
+                         ["bin", "api_ns", "export", "*.axf"])
+        spe = os.path.join(root_b, "spe")
+        self.assertTrue(self.cache.restore("key", spe, root_b))
+
+        # The build system state is not stored
+        self.assertEqual(sorted(os.listdir(spe)),
+                         ["api_ns", "bin", "export", "tfm_s.axf"])
+        self.assertEqual(self.read(os.path.join(spe, "bin", "tfm_s.bin")),
+                         b"\0image")
+        self.assertEqual(self.read(os.path.join(spe, "api_ns", "cmake",
+                                                "spe_export.cmake")),
+                         ("set(SPE_PATH %s/spe/api_ns)" % root_b).encode())
+        self.assertEqual(os.readlink(os.path.join(spe, "export")),
+                         os.path.join(spe, "api_ns"))
+
+    def test_misses_unknown_keys(self):
+        spe = os.path.join(self.work_dir, "spe")
+        self.assertFalse(self.cache.restore("key", spe))
+        self.assertFalse(os.path.exists(spe))
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = TFM_Build_Cache(os.path.join(self.work_dir, "small"), 1)
+        for n, key in enumerate(["old", "new"]):
+            tree = os.path.join(self.work_dir, key)
+            self.write(os.path.join(tree, "bin", "image"), b"\0" * 700000)
+            cache.store(key, tree)
+            os.utime(os.path.join(cache._entry_dir(key), "entry.json"),
+                     (n, n))
+        cache.evict()
+        self.assertFalse(cache.restore("old", os.path.join(self.work_dir,
+                                                           "out")))
+        self.assertTrue(cache.restore("new", os.path.join(self.work_dir,
+                                                          "out")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+""" test_config_constraints.py:
+
+    Tests of the expansion of the seed, valid and invalid configs of a
+    group, against the expansion generating every invalid config and
+    subtracting them by name which it replaces. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import io
+import shutil
+import tempfile
+import unittest
+import itertools
+import contextlib
+from copy import deepcopy
+from build_helper.build_helper_configs import _builtin_configs, \
+    _common_tfm_builder_cfg
+from tfm_ci_pylib.tfm_build_manager import TFM_Build_Manager
+from tfm_ci_pylib.config_constraints import TFM_Config_Constraints
+
+# Groups with valid configs, the largest seed matrices, and extra invalid
+# configs
+_groups = ["pp_test",
+           "mem_footprint",
+           "misra",
+           "profiling",
+           "release_test",
+           "nightly_psa_api",
+           "nightly_profile_m",
+           "nightly_stm32l562e_dk",
+           "rss",
+           "an521"]
+
+
+def baseline_patterns(seed, tags, patterns):
+    """ Expand patterns into configs by name, each wildcard standing for the
+    seed values of its dimension """
+
+    configs = {}
+    for pattern in patterns:
+        pattern = list(pattern) + ["*"] * (len(tags) - len(pattern))
+        values = [seed[t] if v == "*" else [v] for t, v in zip(tags, pattern)]
+        for config in itertools.product(*values):
+            configs[TFM_Build_Manager.generate_config_name(config)] = config
+    return configs
+
+
+def baseline_expansion(group):
+    """ Return the configs of a group as they were built before the
+    constraint engine: the seed product and the valid configs, less every
+    invalid config generated """
+
+    seed = group["seed_params"]
+    tags = [n for n in group["common_params"]["sort_order"] if n in seed]
+    configs = baseline_patterns(seed, tags, [["*"] * len(tags)])
+    configs.update(baseline_patterns(seed, tags, group.get("valid", [])))
+    rejected = baseline_patterns(seed, tags, group.get("invalid", []))
+    return [(k, v) for k, v in configs.items() if k not in rejected]
+
+
+class TFM_Config_Constraints_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def expansion(self, group):
+        """ Return the configs of a group parsed by the build manager """
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            bm = TFM_Build_Manager(self.work_dir, self.work_dir,
+                                   deepcopy(group))
+        return [(k, tuple(v)) for k, v in bm._tbm_build_cfg.items()]
+
+    def test_expands_groups_as_the_baseline(self):
+        for name in _groups:
+            with self.subTest(group=name):
+                group = _builtin_configs[name]
+                self.assertEqual(self.expansion(group),
+                                 baseline_expansion(group))
+
+    def test_generates_lists_as_the_baseline(self):
+        seed = _builtin_configs["release_test"]["seed_params"]
+        tags = [n for n in _common_tfm_builder_cfg["sort_order"]
+                if n in seed]
+        valid = [("arm/mps2/an521", "GCC_10_3", "1", "OFF", "OFF", "Debug",
+                  True, "", "CRYPTO_OFF"),
+                 ("arm/mps2/an519", "*", "2")]
+        with contextlib.redirect_stdout(io.StringIO()):
+            configs = TFM_Build_Manager.generate_config_list(
+                seed, _common_tfm_builder_cfg)
+            optional = TFM_Build_Manager.generate_optional_list(
+                seed, _common_tfm_builder_cfg, valid)
+        self.assertEqual(list(configs.items()),
+                         list(baseline_patterns(seed, tags,
+                                                [["*"] * len(tags)]).items()))
+        self.assertEqual(list(optional.items()),
+                         list(baseline_patterns(seed, tags, valid).items()))
+
+    def test_rejects_configs_outside_of_the_seed(self):
+        group = deepcopy(_builtin_configs["nightly_profile_m"])
+        tags = [n for n in group["common_params"]["sort_order"]
+                if n in group["seed_params"]]
+        # Valid configs with values which are not seed values, some of them
+        # matching short invalid patterns. Wildcards only stand for seed
+        # values, CRYPTO_OFF is not rejected
+        group["valid"] = [("arm/mps2/an521", "GCC_10_3", "1", "OFF", "OFF",
+                           "Debug", True, "", "CRYPTO_OFF"),
+                          ("arm/mps2/an521", "*", "3", "OFF", "OFF",
+                           "Release"),
+                          ("arm/mps2/an519", "*", "1", "OFF", "OFF",
+                           "Release")]
+        group["invalid"] = list(group["invalid"]) + [
+            ("arm/mps2/an521", "*", "3"),
+            ("*", "GCC_10_3", "1")]
+        expansion = self.expansion(group)
+        self.assertEqual(expansion, baseline_expansion(group))
+        self.assertEqual([k for k, v in expansion if v[2] != "2"],
+                         ["AN521_GCC_1_Debug_BL2_CRYPTO_OFF",
+                          "AN519_ARMCLANG_1_Release_BL2_MEDIUM",
+                          "AN519_ARMCLANG_1_Release_BL2_MEDIUM_PSOFF"])
+        rejection = TFM_Config_Constraints(tags, group["seed_params"],
+                                           group["invalid"])
+        self.assertFalse(any(rejection.matches(v) for _, v in expansion))
+
+
+if __name__ == "__main__":
+    unittest.main()
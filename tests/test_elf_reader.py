@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+""" test_elf_reader.py:
+
+    Tests of the sizes and symbols read from generated ELF images, checked
+    against GNU size when it is installed. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import shutil
+import tempfile
+import unittest
+from subprocess import check_output
+from tfm_ci_pylib import elf_reader
+from tfm_ci_pylib.image_sizes import _size_info_rex
+from .elf_writer import write_test_image
+
+
+class TFM_ELF_Reader_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.image = os.path.join(self.work_dir, "tfm_s.axf")
+        write_test_image(self.image)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_reads_sections(self):
+        with elf_reader.TFM_ELF_Reader(self.image) as elf:
+            sections = {s.name: s for s in elf.get_sections()}
+        self.assertEqual([(n, sections[n].size, sections[n].addr) for n in
+                          [".text", ".rodata", ".data", ".bss"]],
+                         [(".text", 0x40, 0x1000),
+                          (".rodata", 0x10, 0x1040),
+                          (".data", 0x8, 0x20000000),
+                          (".bss", 0x100, 0x20000008)])
+        self.assertEqual(sections[".bss"].type, elf_reader.SHT_NOBITS)
+        self.assertFalse(sections[".debug_info"].flags & elf_reader.SHF_ALLOC)
+
+    def test_reads_berkeley_sizes(self):
+        self.assertEqual(elf_reader.elf_berkeley_sizes(self.image),
+                         {"text": "80", "data": "8", "bss": "256",
+                          "dec": "344", "hex": "158"})
+
+    def test_matches_gnu_size(self):
+        tool = shutil.which("arm-none-eabi-size") or shutil.which("size")
+        if not tool:
+            self.skipTest("GNU size is not installed")
+        for rw_size in [8, 0x24]:
+            write_test_image(self.image, rw_size)
+            out = check_output([tool, self.image]).decode("utf-8")
+            m = _size_info_rex.search(out)
+            self.assertEqual(elf_reader.elf_berkeley_sizes(self.image),
+                             {k: m.group(k) for k in
+                              ["text", "data", "bss", "dec", "hex"]})
+
+    def test_reads_fromelf_sizes(self):
+        # Code holds a literal pool of 12 bytes, and .comment is not debug
+        # info
+        self.assertEqual(elf_reader.elf_fromelf_sizes(self.image),
+                         {"Code": "64", "Inline Data": "12", "RO Data": "16",
+                          "RW Data": "8", "ZI Data": "256", "Debug": "32"})
+
+    def test_reads_symbol_sizes(self):
+        with elf_reader.TFM_ELF_Reader(self.image) as elf:
+            self.assertEqual(elf.symbol_sizes(),
+                             {(".text", "helper"): 0x10,
+                              (".text", "main"): 0x30,
+                              (".rodata", "table"): 0x10,
+                              (".data", "state"): 0x8,
+                              (".bss", "buffer"): 0x100})
+
+    def test_rejects_other_files(self):
+        empty = os.path.join(self.work_dir, "empty")
+        text = os.path.join(self.work_dir, "tfm_s.map")
+        open(empty, "w").close()
+        with open(text, "w") as F:
+            F.write("Linker script and memory map\n")
+        for filename in [empty, text]:
+            with self.assertRaises(ValueError):
+                elf_reader.elf_berkeley_sizes(filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
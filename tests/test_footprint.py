@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+""" test_footprint.py:
+
+    Tests of the footprint index of built images and of its diff, on
+    generated images and map files. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import shutil
+import tempfile
+import unittest
+from tfm_ci_pylib import footprint
+from .elf_writer import write_test_image
+
+# Memory map of GNU ld, with a wrapped input section name, fill, sections
+# which are not loaded, and the memory map of discarded sections before it
+_ld_map = """
+Discarded input sections
+
+ .text          0x00000000        0x0 CMakeFiles/tfm_s.dir/main.o
+
+Memory Configuration
+
+Linker script and memory map
+
+LOAD CMakeFiles/tfm_s.dir/main.o
+.text           0x00001000       0x40
+ *(.text*)
+ .text.main     0x00001000       0x30 CMakeFiles/tfm_s.dir/main.o
+                0x00001000                main
+ .text.helper_with_a_name_too_long_for_its_column
+                0x00001030        0x8 /opt/build/lib/libhelper.a(helper.o)
+ *fill*         0x00001038        0x8
+.rodata         0x00001040       0x10
+ .rodata.table  0x00001040       0x10 CMakeFiles/tfm_s.dir/main.o
+.data           0x20000000        0x8 load address 0x00001050
+ .data.state    0x20000000        0x8 /opt/build/lib/libhelper.a(helper.o)
+.bss            0x20000008      0x100
+ COMMON         0x20000008      0x100 CMakeFiles/tfm_s.dir/main.o
+.debug_info     0x00000000       0x20
+ .debug_info    0x00000000       0x20 CMakeFiles/tfm_s.dir/main.o
+OUTPUT(tfm_s.axf elf32-littlearm)
+"""
+
+# Image component sizes of an armlink map, with the library totals
+_armlink_map = """
+==============================================================================
+
+Image component sizes
+
+
+      Code (inc. data)   RO Data    RW Data    ZI Data      Debug   Object Name
+
+        48         12         16          0        256        100   main.o
+    ----------------------------------------------------------------------
+        48         12         16          0        256        100   Object Totals
+         0          0          0          0          0          0   (incl. Generated)
+
+    ----------------------------------------------------------------------
+
+      Code (inc. data)   RO Data    RW Data    ZI Data      Debug   Library Member Name
+
+         8          0          0          8          0         40   helper.o
+    ----------------------------------------------------------------------
+         8          0          0          8          0         40   Library Totals
+
+    ----------------------------------------------------------------------
+
+      Code (inc. data)   RO Data    RW Data    ZI Data      Debug   Library Name
+
+         8          0          0          8          0         40   libhelper.a
+    ----------------------------------------------------------------------
+"""
+
+
+class Footprint_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def write_build(self, name, map_text, rw_size=8):
+        """ Write an image and its map file, and return the image path """
+
+        image = os.path.join(self.work_dir, name, "tfm_s.axf")
+        os.makedirs(os.path.dirname(image))
+        write_test_image(image, rw_size)
+        if map_text is not None:
+            with open(os.path.join(self.work_dir, name, "tfm_s.map"),
+                      "w") as F:
+                F.write(map_text.replace("0x20000000        0x8",
+                                         "0x20000000 %#10x" % rw_size))
+        return image
+
+    def test_reads_objects_of_ld_maps(self):
+        self.assertEqual(footprint.ld_map_objects(_ld_map.splitlines(True)),
+                         {(".text", "CMakeFiles/tfm_s.dir/main.o"): 0x30,
+                          (".text", "libhelper.a(helper.o)"): 0x8,
+                          (".rodata", "CMakeFiles/tfm_s.dir/main.o"): 0x10,
+                          (".data", "libhelper.a(helper.o)"): 0x8,
+                          (".bss", "CMakeFiles/tfm_s.dir/main.o"): 0x100,
+                          (".debug_info",
+                           "CMakeFiles/tfm_s.dir/main.o"): 0x20})
+
+    def test_reads_objects_of_armlink_maps(self):
+        self.assertEqual(
+            footprint.armlink_map_objects(_armlink_map.splitlines(True)),
+            {("Code", "main.o"): 48,
+             ("RO Data", "main.o"): 16,
+             ("ZI Data", "main.o"): 256,
+             ("Code", "helper.o"): 8,
+             ("RW Data", "helper.o"): 8})
+
+    def test_indexes_images_with_their_map_files(self):
+        image = self.write_build("build", _ld_map)
+        index = footprint.footprint_index([image])
+        fp = index["images"]["tfm_s.axf"]
+        self.assertEqual(fp["sections"], {"name": [".text", ".rodata",
+                                                   ".data", ".bss"],
+                                          "size": [0x40, 0x10, 0x8, 0x100]})
+        self.assertEqual(fp["symbols"], {"section": [3, 2, 1, 0, 0],
+                                         "name": ["buffer", "state", "table",
+                                                  "helper", "main"],
+                                         "size": [0x100, 0x8, 0x10, 0x10,
+                                                  0x30]})
+        # Debug info is not loaded
+        self.assertEqual(fp["objects"]["sections"],
+                         [".bss", ".data", ".rodata", ".text"])
+        self.assertEqual(len(fp["objects"]["name"]), 5)
+        self.assertNotIn("objects", footprint.footprint_index(
+            [self.write_build("no_map", None)])["images"]["tfm_s.axf"])
+
+    def test_loads_images_and_indexes(self):
+        image = self.write_build("build", _ld_map)
+        index_f = os.path.join(self.work_dir, "index.json")
+        footprint.save_footprint(index_f, footprint.footprint_index([image]))
+        self.assertEqual(footprint.load_footprint(index_f),
+                         footprint.load_footprint(image))
+        not_json = os.path.join(self.work_dir, "build", "tfm_s.map")
+        with self.assertRaises(ValueError):
+            footprint.load_footprint(not_json)
+
+    def test_diffs_builds_by_growth(self):
+        old = footprint.load_footprint(self.write_build("old", _ld_map))
+        new = footprint.load_footprint(self.write_build("new", _ld_map,
+                                                        rw_size=0x20))
+        diff = footprint.diff_footprint(old, new)
+        self.assertEqual(diff, [
+            ("tfm_s.axf", "object", ".data", "libhelper.a(helper.o)",
+             0x8, 0x20, 0x18),
+            ("tfm_s.axf", "section", ".data", "", 0x8, 0x20, 0x18),
+            ("tfm_s.axf", "symbol", ".data", "state", 0x8, 0x20, 0x18)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+""" test_image_sizes.py:
+
+    Tests of the caching of image sizes by content, with the size tools
+    replaced by counted measures. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from tfm_ci_pylib import image_sizes
+from tfm_ci_pylib.image_sizes import TFM_Image_Sizes
+from .elf_writer import write_test_image
+
+
+class Counted_Image_Sizes(TFM_Image_Sizes):
+    """ Image sizes recording the files measured by each run, and leaving
+    out the files no tool can read """
+
+    def __init__(self, *args, **kwargs):
+        self.measured = []
+        super(Counted_Image_Sizes, self).__init__(*args, **kwargs)
+
+    def measure_size(self, filenames):
+        self.measured.append(sorted(filenames))
+        return super(Counted_Image_Sizes, self).measure_size(filenames)
+
+    @staticmethod
+    def run_batch(filenames):
+        return {}
+
+
+class TFM_Image_Sizes_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.work_dir, "image_sizes.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def image(self, name, rw_size=8):
+        filename = os.path.join(self.work_dir, name)
+        write_test_image(filename, rw_size)
+        return filename
+
+    def test_measures_identical_images_once(self):
+        s, ns = self.image("tfm_s.axf"), self.image("copy.axf")
+        sizes = Counted_Image_Sizes(self.cache_file)
+        ret = sizes.get_sizes([s, ns])
+        self.assertEqual(len(sizes.measured), 1)
+        self.assertEqual(len(sizes.measured[0]), 1)
+        self.assertEqual(ret[s], ret[ns])
+        self.assertEqual(ret[s]["data"], "8")
+
+    def test_serves_cached_sizes(self):
+        s = self.image("tfm_s.axf")
+        Counted_Image_Sizes(self.cache_file).get_sizes([s])
+        # Another build reading the cache file
+        sizes = Counted_Image_Sizes(self.cache_file)
+        self.assertEqual(sizes.get_sizes([s])[s]["bss"], "256")
+        self.assertEqual(sizes.measured, [])
+        # The instance without a cache file
+        sizes = Counted_Image_Sizes()
+        for _ in range(2):
+            self.assertEqual(sizes.get_sizes([s])[s]["bss"], "256")
+        self.assertEqual(sizes.measured, [[s]])
+
+    def test_measures_changed_images(self):
+        s = self.image("tfm_s.axf")
+        sizes = Counted_Image_Sizes(self.cache_file)
+        self.assertEqual(sizes.get_sizes([s])[s]["data"], "8")
+        self.image("tfm_s.axf", rw_size=0x20)
+        self.assertEqual(sizes.get_sizes([s])[s]["data"], "32")
+        self.assertEqual(len(sizes.measured), 2)
+
+    def test_ignores_caches_of_other_versions(self):
+        s = self.image("tfm_s.axf")
+        Counted_Image_Sizes(self.cache_file).get_sizes([s])
+        with open(self.cache_file, "r") as f:
+            cache = json.load(f)
+        cache["version"] = image_sizes.IMAGE_SIZES_VERSION - 1
+        with open(self.cache_file, "w") as f:
+            json.dump(cache, f)
+        sizes = Counted_Image_Sizes(self.cache_file)
+        sizes.get_sizes([s])
+        self.assertEqual(sizes.measured, [[s]])
+
+    def test_merges_sizes_of_concurrent_builds(self):
+        s, ns = self.image("tfm_s.axf"), self.image("tfm_ns.axf", 0x10)
+        first = Counted_Image_Sizes(self.cache_file)
+        second = Counted_Image_Sizes(self.cache_file)
+        first.get_sizes([s])
+        second.get_sizes([ns])
+        sizes = Counted_Image_Sizes(self.cache_file)
+        self.assertEqual(sorted(sizes.get_sizes([s, ns])), sorted([s, ns]))
+        self.assertEqual(sizes.measured, [])
+
+    def test_leaves_out_unreadable_files(self):
+        s = self.image("tfm_s.axf")
+        text = os.path.join(self.work_dir, "tfm_s.map")
+        with open(text, "w") as F:
+            F.write("Linker script and memory map\n")
+        sizes = Counted_Image_Sizes(self.cache_file)
+        self.assertEqual(sorted(sizes.get_sizes([s, text])), [s])
+        # Not cached, the tools are run again
+        sizes.get_sizes([text])
+        self.assertEqual(sizes.measured, [sorted([s, text]), [text]])
+
+    def test_reads_fromelf_sizes_without_fromelf(self):
+        if shutil.which("fromelf"):
+            self.skipTest("fromelf is installed")
+        s = self.image("tfm_s.axf")
+        sizes = TFM_Image_Sizes(self.cache_file)
+        self.assertEqual(sizes.get_sizes([s], tool="fromelf")[s]["Code"],
+                         "64")
+        with open(self.cache_file, "r") as f:
+            cache = json.load(f)
+        # Not served once fromelf is installed
+        self.assertEqual(cache["fromelf"], {})
+        self.assertEqual(len(cache["elf_fromelf"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
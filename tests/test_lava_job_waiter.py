@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+""" test_lava_job_waiter.py:
+
+    Tests of the LAVA job waiter against a local fake XML-RPC server. Run
+    with python3 -m unittest discover -t . -s tests from the repository
+    root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import time
+import unittest
+from tfm_ci_pylib.lava_rpc_connector import LAVA_RPC_connector
+from tfm_ci_pylib.lava_job_waiter import TFM_LAVA_Job_Waiter
+from .fake_lava_server import Fake_LAVA_Server
+
+
+def job_timeline(count, health="Complete"):
+    """ Return jobs finishing one after the other within a second """
+
+    return {n: (0.1 * (n % 3), 0.2 + 0.05 * n, health)
+            for n in range(1, count + 1)}
+
+
+class TFM_LAVA_Job_Waiter_Tests(unittest.TestCase):
+
+    def wait(self, server, job_ids, timeout=30):
+        """ Wait for the jobs with short poll intervals, and return the
+        finished jobs and the ids in the order they were reported """
+
+        lava = LAVA_RPC_connector("user", "token", server.url)
+        reported = []
+        waiter = TFM_LAVA_Job_Waiter(lava.new_connection,
+                                     poll_freq=0.05,
+                                     max_poll_freq=0.2,
+                                     expected_runtime=0.5,
+                                     on_finish=lambda n, _:
+                                         reported.append(n))
+        return waiter.wait(job_ids, timeout), reported
+
+    def test_polls_jobs_one_by_one(self):
+        jobs = job_timeline(10)
+        jobs[4] = jobs[4][:2] + ("Incomplete",)
+        with Fake_LAVA_Server(jobs, bulk=False) as server:
+            finished, reported = self.wait(server, list(jobs))
+        self.assertEqual(sorted(finished), sorted(jobs))
+        self.assertEqual(sorted(reported), sorted(jobs))
+        self.assertEqual(finished[4]["health"], "Incomplete")
+        self.assertEqual(finished[4]["error_reason"], "Infrastructure")
+        self.assertEqual(finished[1]["error_reason"], "")
+        # Only the failed job has its error reason looked up
+        self.assertEqual(server.calls.get("results"), 1)
+        self.assertNotIn("list", server.calls)
+
+    def test_lists_finished_jobs_in_bulk(self):
+        jobs = job_timeline(20)
+        with Fake_LAVA_Server(jobs) as server:
+            finished, _ = self.wait(server, list(jobs))
+        self.assertEqual(sorted(finished), sorted(jobs))
+        # Every job is shown once at the start and once when listed
+        self.assertLessEqual(server.calls["show"], 2 * len(jobs))
+        for state, _, since in server.list_args:
+            self.assertEqual(state, "Finished")
+            self.assertEqual(since, 1)
+
+    def test_reports_jobs_finished_before_the_wait(self):
+        jobs = job_timeline(3)
+        jobs[9] = (-700, 1, "Complete")
+        with Fake_LAVA_Server(jobs) as server:
+            finished, _ = self.wait(server, list(jobs))
+        self.assertEqual(sorted(finished), sorted(jobs))
+
+    def test_busy_server_falls_back_to_polling(self):
+        jobs = job_timeline(2)
+        # Other jobs of the server which ended in the last minute
+        jobs.update({n: (-30, 1, "Complete") for n in range(100, 350)})
+        with Fake_LAVA_Server(jobs) as server:
+            finished, _ = self.wait(server, [1, 2])
+        self.assertEqual(sorted(finished), [1, 2])
+        # A single listing of three pages, then the two jobs are polled
+        self.assertEqual(server.calls["list"], 3)
+
+    def test_stops_listing_at_older_jobs(self):
+        jobs = {n + 500: timeline for n, timeline in job_timeline(4).items()}
+        # Older jobs of the server which ended in the last minute
+        jobs.update({n: (-30, 1, "Complete") for n in range(100, 350)})
+        with Fake_LAVA_Server(jobs) as server:
+            finished, _ = self.wait(server, list(range(501, 505)))
+        self.assertEqual(sorted(finished), list(range(501, 505)))
+        # The first page reaches the older jobs
+        self.assertEqual({start for _, start, _ in server.list_args}, {0})
+
+    def test_retries_proxy_errors(self):
+        jobs = job_timeline(10, health="Incomplete")
+        with Fake_LAVA_Server(jobs, bulk=False, error_rate=0.2) as server:
+            finished, _ = self.wait(server, list(jobs))
+        self.assertEqual(sorted(finished), sorted(jobs))
+
+    def test_returns_finished_jobs_on_timeout(self):
+        jobs = job_timeline(2)
+        jobs[3] = (0, 600, "Complete")
+        with Fake_LAVA_Server(jobs) as server:
+            start = time.time()
+            finished, _ = self.wait(server, list(jobs), timeout=2)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(sorted(finished), [1, 2])
+
+    def test_waits_for_calls_on_timeout(self):
+        jobs = {1: (0, 600, "Complete"), 2: (0, 600, "Complete")}
+        with Fake_LAVA_Server(jobs, bulk=False, delay=0.5) as server:
+            self.wait(server, list(jobs), timeout=1.2)
+            # No call of the waiter is left running against the server
+            self.assertEqual(server.pending, 0)
+            calls = dict(server.calls)
+            time.sleep(0.6)
+            self.assertEqual(server.calls, calls)
+
+    def test_polls_canceling_jobs_until_finished(self):
+        jobs = job_timeline(3)
+        # Cancelled while running, and canceling for a second
+        jobs[2] = (0, 0.2, "Canceled", 1)
+        for bulk in [True, False]:
+            with Fake_LAVA_Server(jobs, bulk=bulk) as server:
+                finished, reported = self.wait(server, list(jobs))
+            self.assertEqual(sorted(finished), sorted(jobs))
+            self.assertEqual(reported[-1], 2)
+            self.assertEqual(finished[2]["state"], "Finished")
+            self.assertEqual(finished[2]["health"], "Canceled")
+
+    def test_block_wait_for_jobs(self):
+        jobs = job_timeline(5)
+        with Fake_LAVA_Server(jobs) as server:
+            lava = LAVA_RPC_connector("user", "token", server.url)
+            finished = lava.block_wait_for_jobs(list(jobs), 30, poll_freq=0.1)
+        self.assertEqual(sorted(finished), sorted(jobs))
+        self.assertEqual(finished[1]["state"], "Finished")
+
+
+if __name__ == "__main__":
+    unittest.main()
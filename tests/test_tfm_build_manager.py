@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+""" test_tfm_build_manager.py:
+
+    Tests of the build scheduling policies of the build manager, with the
+    builds replaced by scripted results. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from copy import deepcopy
+from build_helper.build_helper_configs import config_pp_test
+from tfm_ci_pylib.tfm_build_manager import TFM_Build_Manager
+
+
+class Scripted_Build_Manager(TFM_Build_Manager):
+    """ Build manager whose builds end with the exit status and report
+    status given per config, Success with exit status 0 by default """
+
+    def __init__(self, results, *args, **kwargs):
+        self.results = results
+        self.scheduled = []
+        super(Scripted_Build_Manager, self).__init__(*args, **kwargs)
+
+    def schedule_builds(self, build_names, depends_on=None):
+        self.scheduled.append(list(build_names))
+        status_rep = {}
+        build_rep = {}
+        for name in build_names:
+            status, report_status = self.results.get(name, (0, "Success"))
+            status_rep[name] = status
+            build_rep[name] = {"status": report_status, "duration": 1.0}
+        return status_rep, build_rep, [0.0]
+
+
+class Fake_Build(object):
+    """ Build ending after a number of polls, with the exit status and
+    report status given. Stopped builds end at the next poll as cancelled,
+    unless they are already finishing """
+
+    def __init__(self, name, polls, status, report_status, finishing=False):
+        self.name = name
+        self.polls = polls
+        self.status = status
+        self.report_status = report_status
+        self.finishing = finishing
+        self.logged = False
+        # Always ready, the scheduler polls the builds on every wake up
+        self._rx, tx = multiprocessing.Pipe(duplex=False)
+        tx.send(None)
+
+    def start(self):
+        pass
+
+    def mute(self):
+        pass
+
+    def log(self, tail=None):
+        self.logged = True
+
+    def stop(self):
+        if not self.finishing:
+            self.polls = 0
+            self.status = 1
+            self.report_status = "Cancelled"
+
+    def is_alive(self):
+        self.polls -= 1
+        return self.polls > 0
+
+    def join(self, timeout=None):
+        self._rx.close()
+
+    def wait_handles(self):
+        return [self._rx]
+
+    def get_name(self):
+        return self.name
+
+    def get_status(self):
+        return self.status
+
+    def report(self):
+        rep = {"status": self.report_status}
+        if self.report_status == "Cancelled":
+            rep["cancelled"] = True
+        return rep
+
+
+class Fake_Build_Manager(TFM_Build_Manager):
+    """ Build manager running fake builds, which are given in the order the
+    builds start as (polls, exit status, report status, finishing). The
+    builds not given succeed """
+
+    def __init__(self, builds, *args, **kwargs):
+        self.builds = list(builds)
+        self.started = []
+        super(Fake_Build_Manager, self).__init__(*args, **kwargs)
+
+    def make_builder(self, name, shared_spe=None):
+        build = Fake_Build(name, *(self.builds.pop(0) if self.builds
+                                   else (1, 0, "Success")))
+        self.started.append(build)
+        return build
+
+
+class TFM_Build_Manager_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def run_manager(self, results, **kwargs):
+        """ Run the scripted builds of the per patch group, and return the
+        manager and the metadata of its report """
+
+        manager = Scripted_Build_Manager(results,
+                                         self.work_dir,
+                                         self.work_dir,
+                                         deepcopy(config_pp_test),
+                                         **kwargs)
+        manager.task_exec()
+        return manager, manager.unstash("Build Report")["_metadata_"]
+
+    def test_smoke_first_runs_the_rest_once_smoke_passed(self):
+        manager, metadata = self.run_manager({}, smoke_first=True)
+        smoke = metadata["smoke_first"]
+        self.assertTrue(smoke["passed"])
+        self.assertEqual(len(manager.scheduled), 2)
+        self.assertEqual(manager.scheduled[0], smoke["configs"])
+        self.assertEqual(sorted(sum(manager.scheduled, [])),
+                         sorted(manager.get_config()))
+
+    def test_smoke_first_gates_on_the_report_status(self):
+        manager, _ = self.run_manager({}, smoke_first=True)
+        failed = manager.select_smoke_configs(manager.order_build_configs())[0]
+        # The build commands succeeded but the artefact checks failed
+        manager, metadata = self.run_manager({failed: (0, "Failed")},
+                                             smoke_first=True)
+        smoke = metadata["smoke_first"]
+        self.assertFalse(smoke["passed"])
+        self.assertEqual(len(manager.scheduled), 1)
+        self.assertEqual(sorted(manager.scheduled[0] + smoke["not_started"]),
+                         sorted(manager.get_config()))
+
+    def test_fail_fast_lists_only_stopped_builds_as_cancelled(self):
+        builds = [(1, 1, "Failed", False),
+                  # Already past its build commands when the run aborts
+                  (3, 1, "Failed", True),
+                  (3, 0, "Success", False)]
+        manager = Fake_Build_Manager(builds,
+                                     self.work_dir,
+                                     self.work_dir,
+                                     deepcopy(config_pp_test),
+                                     parallel_builds=3,
+                                     fail_fast=1)
+        names = manager.order_build_configs()
+        manager.task_exec()
+        report = manager.unstash("Build Report")
+        abort = report["_metadata_"]["fail_fast"]
+        self.assertEqual(abort["failed"], [names[0]])
+        self.assertEqual(abort["cancelled"], [names[2]])
+        self.assertEqual(abort["not_started"], names[3:])
+        self.assertEqual(report["report"][names[1]]["status"], "Failed")
+        self.assertEqual(report["report"][names[2]]["status"], "Cancelled")
+
+    def test_prints_the_logs_of_failed_muted_builds(self):
+        builds = [(2, 1, "Failed"),
+                  (1, 0, "Success"),
+                  (2, 0, "Failed")]
+        manager = Fake_Build_Manager(builds,
+                                     self.work_dir,
+                                     self.work_dir,
+                                     deepcopy(config_pp_test),
+                                     parallel_builds=3)
+        manager.task_exec()
+        # The build of the first slot printed its output live
+        self.assertEqual([n for n, build in enumerate(manager.started)
+                          if build.logged], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
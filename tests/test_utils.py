@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+""" test_utils.py:
+
+    Tests of the logging of build commands. Run with
+    python3 -m unittest discover -t . -s tests from the repository root. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from tfm_ci_pylib.utils import subprocess_log, open_log, tail_log
+
+
+class Subprocess_Log_Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def stamped_lines(self, log_f):
+        """ Return the (seconds, text) of the lines of a timestamped log """
+
+        with open_log(log_f) as F:
+            return [(float(m.group(1)), m.group(2)) for m in
+                    (re.match(r"\[\s*([\d.]+)\] (.*)\n", n) for n in F)]
+
+    def test_stamps_lines_spanning_chunks_when_they_start(self):
+        log_f = os.path.join(self.work_dir, "build.log")
+        ret = subprocess_log("printf 'a'; sleep 0.5; printf 'b\\nc\\nd'; "
+                             "sleep 0.5; printf 'e\\n'; printf f",
+                             log_f, silent=True, timestamps=True)
+        self.assertEqual(ret, 0)
+        lines = self.stamped_lines(log_f)
+        self.assertEqual([n for _, n in lines], ["ab", "c", "de", "f"])
+        stamps = [t for t, _ in lines]
+        self.assertLess(stamps[0], 0.4)
+        self.assertGreaterEqual(stamps[1], 0.4)
+        self.assertLess(stamps[2], 0.9)
+        self.assertGreaterEqual(stamps[3], 0.9)
+
+    def test_writes_and_tails_compressed_logs(self):
+        log_f = os.path.join(self.work_dir, "build.log.gz")
+        subprocess_log("seq 1 1000", log_f, prefix="seq", silent=True)
+        subprocess_log("false", log_f, append=True, prefix="false",
+                       silent=True)
+        self.assertEqual(tail_log(log_f, 3), ["999\n", "1000\n", "false\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+""" build_cache.py:
+
+    Local content addressed cache of build outputs. Entries are keyed on a
+    hash of the rendered build commands, the toolchain version and the state
+    of the source trees, and evicted least recently used first when the cache
+    exceeds its size limit. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import time
+import shutil
+import fnmatch
+import hashlib
+from subprocess import Popen, PIPE, check_output, CalledProcessError
+from .utils import save_json, load_json
+
+# Repositories cloned next to trusted-firmware-m which the build depends on
+_dependency_repos = ["tf-m-tests",
+                     "mbedtls",
+                     "mcuboot",
+                     "qcbor",
+                     "psa-arch-tests",
+                     "tf-m-extras",
+                     "tf-m-tools"]
+
+# Source tree states are computed once per process
+_source_states = {}
+
+
+def source_tree_state(codebase_dir):
+    """ Return a string describing the HEAD and the local changes of the
+    codebase and of every dependency repository found next to it """
+
+    codebase_dir = os.path.abspath(codebase_dir)
+    if codebase_dir in _source_states:
+        return _source_states[codebase_dir]
+
+    parent_dir = os.path.dirname(codebase_dir)
+    repos = [codebase_dir] + [os.path.join(parent_dir, n)
+                              for n in _dependency_repos]
+    state = []
+    for repo in repos:
+        if not os.path.isdir(repo):
+            continue
+        head, _ = Popen("git rev-parse HEAD", shell=True, cwd=repo,
+                        stdout=PIPE, stderr=PIPE).communicate()
+        # Platform patches are applied on top of the checked out trees
+        diff, _ = Popen("git diff HEAD", shell=True, cwd=repo,
+                        stdout=PIPE, stderr=PIPE).communicate()
+        state.append("%s %s %s" % (os.path.basename(repo),
+                                   head.decode("utf-8").strip(),
+                                   hashlib.sha256(diff).hexdigest()))
+    _source_states[codebase_dir] = "\n".join(state)
+    return _source_states[codebase_dir]
+
+
+def toolchain_version(set_compiler_cmd):
+    """ Return the output of the command setting the compiler path, which
+    prints the compiler version """
+
+    try:
+        return check_output(set_compiler_cmd,
+                            shell=True,
+                            executable="/bin/bash",
+                            timeout=60).decode("utf-8").strip()
+    except (CalledProcessError, OSError) as E:
+        print("Could not get toolchain version:", E)
+        return ""
+
+
+def compiler_cache_stats(stats_log):
+    """ Count the ccache results recorded in a ccache stats log, which lists
+    the result of every compilation under a comment naming its input """
+
+    stats = {"hits": 0, "misses": 0, "uncacheable": 0}
+    try:
+        with open(stats_log, "r") as F:
+            for line in F:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line in ["direct_cache_hit", "preprocessed_cache_hit"]:
+                    stats["hits"] += 1
+                elif line == "cache_miss":
+                    stats["misses"] += 1
+                elif not line.endswith("_storage_hit") and \
+                        not line.endswith("_storage_miss"):
+                    stats["uncacheable"] += 1
+    except OSError:
+        pass
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / total, 3) if total else 0
+    return stats
+
+
+class TFM_Build_Cache(object):
+    """ Store and restore build outputs by content key. Entries remember the
+    build root they were built in, and paths to it are moved to the root of
+    the build restoring them """
+
+    # Replaces the build root in the commands a key is computed from
+    root_placeholder = "@BUILD_ROOT_DIR@"
+    # Files with a NUL byte in their first block are not rewritten
+    _binary_probe_size = 8192
+
+    def __init__(self, cache_dir, max_size_mb=10240):
+        self._cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self._max_size = max_size_mb * 1024 * 1024
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+    @staticmethod
+    def key(*parts):
+        """ Compute the cache key of an ordered list of strings """
+
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self._cache_dir, key[:2], key)
+
+    def restore(self, key, target_dir, root=None):
+        """ Replace target_dir with the cached outputs of key, moving the
+        paths to the build root of the entry to root. Returns True on a cache
+        hit """
+
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return False
+        try:
+            shutil.rmtree(target_dir, ignore_errors=True)
+            shutil.copytree(os.path.join(entry_dir, "tree"),
+                            target_dir,
+                            symlinks=True)
+            entry_f = os.path.join(entry_dir, "entry.json")
+            entry_root = (load_json(entry_f) or {}).get("root")
+            if root and entry_root and entry_root != root:
+                self.relocate(target_dir, entry_root, root)
+            # Mark the entry as recently used
+            os.utime(entry_f)
+        except (OSError, shutil.Error) as E:
+            # The entry may have been evicted by another build meanwhile
+            print("Build cache: could not restore %s: %s" % (key, E))
+            shutil.rmtree(target_dir, ignore_errors=True)
+            return False
+        return True
+
+    def store(self, key, source_dir, root=None, outputs=None):
+        """ Copy the outputs of source_dir, built in the build root root, into
+        the cache under key. outputs are patterns of the entries of
+        source_dir to store, directories being stored whole. Every entry is
+        stored if it is None """
+
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            return
+
+        def ignore(path, names):
+            if outputs is None or path != source_dir:
+                return []
+            return [n for n in names
+                    if not any(fnmatch.fnmatch(n, p) for p in outputs)]
+
+        tmp_dir = "%s.tmp.%d" % (entry_dir, os.getpid())
+        try:
+            shutil.copytree(source_dir,
+                            os.path.join(tmp_dir, "tree"),
+                            symlinks=True,
+                            ignore=ignore)
+            save_json(os.path.join(tmp_dir, "entry.json"),
+                      {"size": self._tree_size(tmp_dir),
+                       "created": time.time(),
+                       "root": root})
+            # Publishing the entry is atomic, concurrent builds storing the
+            # same key keep the first one
+            os.rename(tmp_dir, entry_dir)
+        except (OSError, shutil.Error) as E:
+            print("Build cache: could not store %s: %s" % (key, E))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        """ Return (last use time, size, path) of every complete entry """
+
+        ret = []
+        for prefix in os.listdir(self._cache_dir):
+            prefix_dir = os.path.join(self._cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_f = os.path.join(prefix_dir, key, "entry.json")
+                try:
+                    ret.append((os.path.getmtime(entry_f),
+                                load_json(entry_f)["size"],
+                                os.path.join(prefix_dir, key)))
+                except Exception:
+                    # Entry being written or removed
+                    continue
+        return ret
+
+    def size(self):
+        """ Return the total size in bytes of the cached entries """
+
+        return sum(n[1] for n in self.entries())
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits in
+        its size limit """
+
+        entries = sorted(self.entries())
+        total = sum(n[1] for n in entries)
+        while entries and total > self._max_size:
+            _, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    @classmethod
+    def relocate(cls, directory, old_root, new_root):
+        """ Replace old_root with new_root in the symbolic links and the text
+        files of directory, such as the exported CMake config files. Images
+        keep the paths of their debug info """
+
+        old = old_root.encode("utf-8")
+        new = new_root.encode("utf-8")
+        for path, dirs, files in os.walk(directory):
+            # Links to directories are listed with the directories
+            links = [os.path.join(path, n) for n in dirs + files
+                     if os.path.islink(os.path.join(path, n))]
+            for link in links:
+                target = os.readlink(link)
+                if target.startswith(old_root):
+                    os.remove(link)
+                    os.symlink(new_root + target[len(old_root):], link)
+            for fname in files:
+                f_path = os.path.join(path, fname)
+                if f_path in links:
+                    continue
+                with open(f_path, "rb") as F:
+                    if b"\0" in F.read(cls._binary_probe_size):
+                        continue
+                    F.seek(0)
+                    data = F.read()
+                if old in data:
+                    with open(f_path, "wb") as F:
+                        F.write(data.replace(old, new))
+
+    @staticmethod
+    def _tree_size(directory):
+        total = 0
+        for path, _, files in os.walk(directory):
+            for fname in files:
+                try:
+                    total += os.lstat(os.path.join(path, fname)).st_size
+                except OSError:
+                    pass
+        return total
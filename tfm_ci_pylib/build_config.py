@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+""" build_config.py:
+
+    Compact record of the seed param values of a build config. Records are
+    interned, so that a config generated by several groups, or by several
+    parses of a group, is a single object whose brief name and CMake
+    fragments are only computed once. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import sys
+from build_helper.build_helper_config_maps import mapPlatform, \
+    mapTestPsaApi, mapProfile, mapRegTest, mapExtraParams
+
+# Record types by fields
+_record_types = {}
+
+
+def map_params(params, maps):
+    """ Return the concatenated mappings of a ", " separated params list """
+
+    return "".join(maps[param] for param in params.split(", "))
+
+
+def brief_config_name(values):
+    """ Convert the values of a config in sort order to a brief name """
+
+    config_param = []
+    config_param.append(mapPlatform[values[0]])
+    config_param.append(values[1].split("_")[0])
+    config_param.append(values[2]) # ISOLATION_LEVEL
+    if values[3] != "OFF":  # TEST_REGRESSION
+        config_param.append(values[3].replace(", ", "_"))
+    if values[4] != "OFF":    #TEST_PSA_API
+        config_param.append(mapTestPsaApi[values[4]])
+    config_param.append(values[5]) # BUILD_TYPE
+    if values[6]:  # BL2
+        config_param.append("BL2")
+    if values[7]: # PROFILE
+        config_param.append(mapProfile[values[7]])
+    if values[8]: # EXTRA_PARAMS
+        config_param.append(values[8].replace(", ", "_"))
+    return "_".join(config_param)
+
+
+class TFM_Build_CFG(object):
+    """ Values of the seed params of a config, in the sort order of its
+    group. Records behave as the named tuples they replace: values are read
+    by attribute or index, iterated, listed in _fields, and compare and hash
+    as tuples. Use make_build_config() or the _make() of the record type
+    of the fields to create them """
+
+    __slots__ = ("_values", "_name", "_fragments")
+    _fields = ()
+    # Records of the type by their values
+    _interned = {}
+
+    def __init__(self, values):
+        self._values = values
+        self._name = None
+        self._fragments = None
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, TFM_Build_CFG):
+            return self._values == other._values
+        if isinstance(other, tuple):
+            return self._values == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self._values)
+
+    def __repr__(self):
+        return "TFM_Build_CFG(%s)" % ", ".join(
+            "%s=%r" % (f, v) for f, v in zip(self._fields, self._values))
+
+    def __reduce__(self):
+        return make_build_config, (self._fields, self._values)
+
+    @classmethod
+    def _make(cls, values):
+        """ Return the interned record of a tuple of values """
+
+        record = cls._interned.get(values)
+        if record is None:
+            record = cls._interned[values] = cls(values)
+        return record
+
+    def _asdict(self):
+        return dict(zip(self._fields, self._values))
+
+    def _brief_name(self):
+        """ Return the brief name of the config, computed once """
+
+        if self._name is None:
+            self._name = brief_config_name(self._values)
+        return self._name
+
+    def _cmake_fragments(self):
+        """ Return the CMake arguments mapped from the test_regression and
+        extra_params values, computed once """
+
+        if self._fragments is None:
+            self._fragments = (map_params(self.test_regression, mapRegTest),
+                               map_params(self.extra_params, mapExtraParams))
+        return self._fragments
+
+
+def build_config_type(fields):
+    """ Return the record type of configs with the fields, created once """
+
+    fields = tuple(fields)
+    if fields not in _record_types:
+        attrs = {"__slots__": (), "_fields": fields, "_interned": {}}
+        for n, field in enumerate(fields):
+            attrs[field] = property(lambda self, n=n: self._values[n])
+        _record_types[fields] = type("TFM_Build_CFG", (TFM_Build_CFG,), attrs)
+    return _record_types[fields]
+
+
+def make_build_config(fields, values):
+    """ Return the interned record of the config values for the fields """
+
+    return build_config_type(fields)._make(
+        tuple(intern_value(v) for v in values))
+
+
+def intern_value(value):
+    """ Return the interned value of a string, other values as they are """
+
+    return sys.intern(value) if type(value) is str else value
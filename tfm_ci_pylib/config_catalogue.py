@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+""" config_catalogue.py:
+
+    Precompiled catalogue of the built-in config groups, holding the config
+    names of every group with their environment params and rendered build
+    commands. The catalogue is stored as json and rebuilt when the config
+    sources change, so queries do not need to import the configs or to parse
+    the groups with a build manager. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import io
+import sys
+import json
+import hashlib
+import tempfile
+import contextlib
+import multiprocessing
+
+# Bump when the layout of the catalogue changes
+CATALOGUE_VERSION = 2
+
+_scripts_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Files the content of the catalogue is derived from
+_catalogue_sources = ["build_helper/build_helper_configs.py",
+                      "build_helper/build_helper_config_maps.py",
+                      "tfm_ci_pylib/tfm_build_manager.py",
+                      "tfm_ci_pylib/build_config.py",
+                      "tfm_ci_pylib/utils.py",
+                      "tfm_ci_pylib/config_constraints.py",
+                      "tfm_ci_pylib/config_catalogue.py"]
+
+# Commands are rendered with placeholders for the values known at query time
+_codebase_placeholder = "@CODEBASE_DIR@"
+_jobs_placeholder = "@BUILD_JOBS@"
+
+build_command_types = ["set_compiler",
+                       "spe_cmake_config",
+                       "nspe_cmake_config",
+                       "spe_cmake_build",
+                       "nspe_cmake_build",
+                       "post_build"]
+
+
+def default_build_jobs():
+    """ Return the number of parallel jobs of a build when none is given """
+
+    if os.cpu_count() >= 8:
+        # run in a server with scripts, parallel build will use CPU numbers
+        return 2
+    # run in a docker, usually docker with CPUs less than 8
+    return os.cpu_count()
+
+
+def parse_group(group):
+    """ Return the config names of a built-in group, with the config tuple
+    fields and the params and commands of each config """
+
+    from build_helper.build_helper_configs import _builtin_configs
+    from .tfm_build_manager import TFM_Build_Manager
+
+    # Block default stdout from __init__
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_manager = TFM_Build_Manager(_scripts_dir,
+                                          _scripts_dir,
+                                          _builtin_configs[group])
+    names = build_manager.get_config()
+    configs = {}
+    for name in names:
+        configs[name] = (build_manager._tbm_build_cfg[name]._asdict(),
+                         {"params": build_manager.get_build_configs(name),
+                          "commands": build_manager.get_build_commands(
+                              name,
+                              silence_stderr=True,
+                              jobs=_jobs_placeholder,
+                              codebase_dir=_codebase_placeholder)})
+    return names, configs
+
+
+class TFM_Config_Catalogue(object):
+    """ Lookup of the configs of the built-in groups, loaded from the
+    catalogue file and rebuilt in place when it is missing or stale. The
+    catalogue indexes every config name to the groups holding it, so that
+    configs are found without searching the groups """
+
+    def __init__(self, catalogue_file=None, processes=1):
+        self._tcc_file = catalogue_file or \
+            os.path.join(_scripts_dir, ".config_catalogue.json")
+        # Number of processes parsing the groups when rebuilding
+        self._tcc_processes = processes
+        self._tcc_data = self.load()
+
+    @staticmethod
+    def source_key():
+        """ Return a hash of the catalogue version and sources """
+
+        h = hashlib.sha256(str(CATALOGUE_VERSION).encode())
+        for source in _catalogue_sources:
+            with open(os.path.join(_scripts_dir, source), "rb") as f:
+                h.update(f.read())
+        return h.hexdigest()
+
+    def load(self):
+        """ Return the catalogue, rebuilding it if it is out of date """
+
+        key = self.source_key()
+        try:
+            with open(self._tcc_file, "r") as f:
+                data = json.load(f)
+            if data.get("key") == key:
+                return data
+        except (OSError, ValueError):
+            pass
+        data = self.build(key, self._tcc_processes)
+        self.save(data)
+        return data
+
+    def save(self, data):
+        """ Atomically write the catalogue, concurrent jobs may race on it """
+
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self._tcc_file),
+                                       prefix=".config_catalogue.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self._tcc_file)
+        except OSError as e:
+            # Read only checkouts still get the catalogue built in memory
+            print("Warning: could not save config catalogue: %s" % e,
+                  file=sys.stderr)
+
+    @staticmethod
+    def build(key, processes=1):
+        """ Parse every built-in group and render the params and commands of
+        its configs, in parallel across groups with several processes """
+
+        from build_helper.build_helper_configs import _builtin_configs
+
+        group_names = list(_builtin_configs.keys())
+        if processes > 1:
+            with multiprocessing.Pool(processes) as pool:
+                parsed = pool.map(parse_group, group_names)
+        else:
+            parsed = [parse_group(group) for group in group_names]
+
+        configs = {}
+        groups = {}
+        index = {}
+        for group, (names, group_parsed) in zip(group_names, parsed):
+            group_configs = {}
+            for name in names:
+                config, entry = group_parsed[name]
+                index.setdefault(name, {"groups": [], "config": config})
+                index[name]["groups"].append(group)
+                # Groups share most configs, keep a single copy of those
+                if configs.setdefault(name, entry) != entry:
+                    group_configs[name] = entry
+            groups[group] = {"names": names, "configs": group_configs}
+        return {"version": CATALOGUE_VERSION,
+                "key": key,
+                "groups": groups,
+                "index": index,
+                "configs": configs}
+
+    def get_groups(self):
+        """ Return the names of the built-in groups """
+
+        return list(self._tcc_data["groups"].keys())
+
+    def get_config(self, group):
+        """ Return the config names of a group """
+
+        return self._tcc_data["groups"][group]["names"]
+
+    def get_all_configs(self):
+        """ Return the config names of all groups """
+
+        return list(self._tcc_data["index"].keys())
+
+    def find_group(self, config, groups=None):
+        """ Return the first of the groups, all groups by default, which
+        holds the config, or None if none does """
+
+        try:
+            config_groups = self._tcc_data["index"][config]["groups"]
+        except KeyError:
+            return None
+        if groups is None:
+            return config_groups[0]
+        return next((g for g in groups if g in config_groups), None)
+
+    def lookup(self, config):
+        """ Return the first group holding the config and the config tuple,
+        raising KeyError for unknown configs """
+
+        from .build_config import make_build_config
+
+        entry = self._tcc_data["index"][config]
+        return entry["groups"][0], \
+            make_build_config(entry["config"].keys(),
+                              entry["config"].values())
+
+    def get_entry(self, config, group):
+        """ Return the catalogue entry of a config of a group, raising
+        KeyError if the group does not hold the config """
+
+        group_data = self._tcc_data["groups"][group]
+        if config in group_data["configs"]:
+            return group_data["configs"][config]
+        if group not in self._tcc_data["index"][config]["groups"]:
+            raise KeyError(config)
+        return self._tcc_data["configs"][config]
+
+    def get_build_configs(self, config, group):
+        """ Return build config variables needed by the input config """
+
+        return self.get_entry(config, group)["params"]
+
+    def get_batch(self, groups, names=None, jobs=None):
+        """ Return the params and build commands of the named configs, or of
+        every config of the groups, by group. Each config is taken from the
+        first of the groups holding it, and KeyError is raised for configs
+        which none of them holds """
+
+        batch = {}
+        if names is None:
+            for group in groups:
+                batch[group] = {}
+                for name in self.get_config(group):
+                    batch[group][name] = self.get_batch_entry(name, group,
+                                                              jobs)
+            return batch
+        for name in names:
+            group = self.find_group(name, groups)
+            if group is None:
+                raise KeyError(name)
+            batch.setdefault(group, {})[name] = \
+                self.get_batch_entry(name, group, jobs)
+        return batch
+
+    def get_batch_entry(self, config, group, jobs=None):
+        """ Return the params and build commands of a config """
+
+        return {"params": self.get_build_configs(config, group),
+                "commands": self.get_build_commands(config, group, jobs)}
+
+    def get_build_commands(self, config, group, jobs=None):
+        """ Return the commands to be run to build the input config, as
+        TFM_Build_Manager.get_build_commands() would from the working dir """
+
+        if jobs is None:
+            jobs = default_build_jobs()
+        codebase_dir = os.path.join(os.getcwd(), "trusted-firmware-m")
+        return {k: v.replace(_codebase_placeholder, codebase_dir)
+                    .replace(_jobs_placeholder, str(jobs))
+                for k, v in self.get_entry(config, group)["commands"].items()}
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+""" config_constraints.py:
+
+    Matching of build configs against wildcard patterns over the sort_order
+    dimensions of a config group, such as its invalid configs. Patterns are
+    evaluated as bit masks, so that rejected combinations are skipped without
+    being generated. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import itertools
+
+
+def pad_pattern(pattern, length):
+    """ Pad the omitted trailing values of a pattern with wildcards """
+
+    return list(pattern) + ["*"] * (length - len(pattern))
+
+
+class TFM_Config_Constraints(object):
+    """ Every pattern is given a bit. For each dimension, every value holds
+    the mask of the patterns it satisfies, and a config matches the patterns
+    whose bits are set in the masks of all its values. As in the expansion of
+    patterns into configs, a wildcard stands for the seed values of its
+    dimension """
+
+    def __init__(self, tags, seed_config, patterns):
+        self._tags = tags
+        self._seeds = [set(seed_config[t]) for t in tags]
+        self._masks = [{} for _ in tags]
+        # Patterns which are only wildcards from each dimension onwards
+        self._wild_from = [0] * (len(tags) + 1)
+
+        for bit, pattern in enumerate(patterns):
+            if len(pattern) > len(tags):
+                raise Exception("Pattern %s has more values than the %d "
+                                "dimensions %s" % (pattern, len(tags), tags))
+            pattern = pad_pattern(pattern, len(tags))
+            for n, value in enumerate(pattern):
+                values = seed_config[tags[n]] if value == "*" else [value]
+                for v in values:
+                    self._masks[n][v] = self._masks[n].get(v, 0) | 1 << bit
+            for n in range(len(tags), -1, -1):
+                if n < len(tags) and pattern[n] != "*":
+                    break
+                self._wild_from[n] |= 1 << bit
+        self._all = (1 << len(patterns)) - 1
+
+    def matches(self, values):
+        """ Return True if the config values match any pattern """
+
+        mask = self._all
+        for n, value in enumerate(values):
+            mask &= self._masks[n].get(value, 0)
+            if not mask:
+                return False
+        return True
+
+    def product(self, value_lists):
+        """ Yield the combinations of the value lists, in the order of
+        itertools.product, which do not match any pattern. Branches where
+        every combination matches are cut without being visited """
+
+        depth = len(value_lists)
+        # Branches can only be cut over dimensions holding seed values
+        seed_from = [True] * (depth + 1)
+        for n in range(depth - 1, -1, -1):
+            seed_from[n] = seed_from[n + 1] and \
+                set(value_lists[n]) <= self._seeds[n]
+
+        values = [None] * depth
+
+        def expand(n, mask):
+            if not mask:
+                # No pattern can match anymore, the rest is a plain product
+                prefix = tuple(values[:n])
+                for rest in itertools.product(*value_lists[n:]):
+                    yield prefix + rest
+                return
+            if n == depth or mask & self._wild_from[n] and seed_from[n]:
+                return
+            for value in value_lists[n]:
+                values[n] = value
+                yield from expand(n + 1, mask & self._masks[n].get(value, 0))
+
+        return expand(0, self._all)
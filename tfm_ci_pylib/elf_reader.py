@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+""" elf_reader.py:
+
+    Pure Python reader of the sections and symbols of ELF images. The image
+    is memory mapped and only its headers and symbol tables are decoded, so
+    sizes are read without running a toolchain process. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import mmap
+import struct
+from collections import namedtuple
+
+ELF_Section = namedtuple("ELF_Section", ["name", "type", "flags", "addr",
+                                         "offset", "size", "link", "info",
+                                         "entsize"])
+
+ELF_Symbol = namedtuple("ELF_Symbol", ["name", "value", "size", "type",
+                                       "bind", "section"])
+
+# Section types
+SHT_SYMTAB = 2
+SHT_NOBITS = 8
+
+# Section flags
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+# Section indexes of undefined symbols and of extended section numbering
+SHN_UNDEF = 0
+SHN_LORESERVE = 0xff00
+SHN_XINDEX = 0xffff
+
+# Symbol types
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+
+# Header fields from e_type, and section header layout, by ELF class
+_elf_header = {1: "HHIIIIIHHHHHH", 2: "HHIQQQIHHHHHH"}
+_section_header = {1: "IIIIIIIIII", 2: "IIQQQQIIQQ"}
+_symbol = {1: "IIIBBH", 2: "IBBHQQ"}
+
+# Prefix of the sections counted as Debug by fromelf
+_debug_sections = (".debug", ".line", ".stab", ".zdebug")
+
+
+class TFM_ELF_Reader(object):
+    """ Memory mapped ELF image. Raises ValueError for files which are not
+    ELF images. Use as a context manager, or close() it when done """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            try:
+                self._ter_map = mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("%s is empty" % filename)
+        try:
+            self._ter_sections = self.read_sections()
+        except (ValueError, struct.error, IndexError):
+            self.close()
+            raise ValueError("%s is not an ELF image" % filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._ter_map.close()
+
+    def read_sections(self):
+        """ Decode the ELF and section headers """
+
+        m = self._ter_map
+        if m[:4] != b"\x7fELF" or m[4] not in _elf_header or \
+                m[5] not in (1, 2):
+            raise ValueError()
+        self._ter_endian = "<" if m[5] == 1 else ">"
+        self._ter_class = m[4]
+        (_, _, _, _, _, shoff, _, _, _, _, shentsize, shnum, shstrndx) = \
+            struct.unpack_from(self._ter_endian + _elf_header[m[4]], m, 16)
+
+        sh_fmt = struct.Struct(self._ter_endian + _section_header[m[4]])
+        if not shoff:
+            return []
+        headers = []
+        # Counts which do not fit the ELF header are in the first section
+        first = sh_fmt.unpack_from(m, shoff)
+        if not shnum:
+            shnum = first[5]
+        if shstrndx == SHN_XINDEX:
+            shstrndx = first[6]
+        for n in range(shnum):
+            headers.append(sh_fmt.unpack_from(m, shoff + n * shentsize))
+
+        strtab = headers[shstrndx][4] if shstrndx else None
+        sections = []
+        for (name, sh_type, flags, addr, offset, size, link, info, _,
+             entsize) in headers:
+            sections.append(ELF_Section(self.read_string(strtab + name)
+                                        if strtab is not None else "",
+                                        sh_type, flags, addr, offset, size,
+                                        link, info, entsize))
+        return sections
+
+    def read_string(self, offset):
+        """ Return the NUL terminated string at the offset """
+
+        end = self._ter_map.find(b"\0", offset)
+        return self._ter_map[offset:end].decode("utf-8", "replace")
+
+    def get_sections(self):
+        return self._ter_sections
+
+    def berkeley_sizes(self):
+        """ Return the text, data and bss sizes of the allocated sections,
+        as the Berkeley format of arm-none-eabi-size reports them """
+
+        text = data = bss = 0
+        for s in self._ter_sections:
+            if not s.flags & SHF_ALLOC:
+                continue
+            if s.flags & SHF_EXECINSTR or not s.flags & SHF_WRITE:
+                text += s.size
+            elif s.type != SHT_NOBITS:
+                data += s.size
+            else:
+                bss += s.size
+        return {"text": text, "data": data, "bss": bss}
+
+    def get_symbols(self):
+        """ Yield the symbols of the symbol table, decoded one at a time
+        from the mapped image. Stripped images have none """
+
+        for symtab in self._ter_sections:
+            if symtab.type != SHT_SYMTAB:
+                continue
+            strtab = self._ter_sections[symtab.link].offset
+            sym_fmt = struct.Struct(self._ter_endian +
+                                    _symbol[self._ter_class])
+            entsize = symtab.entsize or sym_fmt.size
+            end = symtab.offset + symtab.size - sym_fmt.size
+            for offset in range(symtab.offset, end + 1, entsize):
+                fields = sym_fmt.unpack_from(self._ter_map, offset)
+                if self._ter_class == 1:
+                    name, value, size, info, _, shndx = fields
+                else:
+                    name, info, _, shndx, value, size = fields
+                section = self._ter_sections[shndx].name \
+                    if SHN_UNDEF < shndx < SHN_LORESERVE else None
+                yield ELF_Symbol(self.read_string(strtab + name), value,
+                                 size, info & 0xf, info >> 4, section)
+
+    def inline_data_size(self):
+        """ Return the size of the data in code sections, such as literal
+        pools, which the $d mapping symbols of Arm images delimit from the
+        $a and $t code """
+
+        mapping = {}
+        for sym in self.get_symbols():
+            if sym.section is not None and sym.type == STT_NOTYPE and \
+                    sym.name[:2] in ("$a", "$t", "$d") and \
+                    sym.name[2:3] in ("", "."):
+                mapping.setdefault(sym.section, []).append(
+                    (sym.value, sym.name[1]))
+
+        size = 0
+        for s in self._ter_sections:
+            if s.name not in mapping or not s.flags & SHF_EXECINSTR:
+                continue
+            # A region of a mapping symbol ends at the next one
+            bounds = sorted(mapping[s.name]) + [(s.addr + s.size, "")]
+            for (start, kind), (end, _) in zip(bounds, bounds[1:]):
+                if kind == "d":
+                    size += end - start
+        return size
+
+    def fromelf_sizes(self):
+        """ Return the Code, inline data, RO, RW, ZI and debug data sizes,
+        as fromelf -z reports them. Code includes its inline data """
+
+        sizes = {"Code": 0, "Inline Data": 0, "RO Data": 0, "RW Data": 0,
+                 "ZI Data": 0, "Debug": 0}
+        for s in self._ter_sections:
+            if not s.flags & SHF_ALLOC:
+                if s.name.startswith(_debug_sections):
+                    sizes["Debug"] += s.size
+            elif s.flags & SHF_EXECINSTR:
+                sizes["Code"] += s.size
+            elif not s.flags & SHF_WRITE:
+                sizes["RO Data"] += s.size
+            elif s.type != SHT_NOBITS:
+                sizes["RW Data"] += s.size
+            else:
+                sizes["ZI Data"] += s.size
+        sizes["Inline Data"] = self.inline_data_size()
+        return sizes
+
+    def symbol_sizes(self):
+        """ Return the sizes of the function and data symbols by section
+        and name. Symbols of the same name and section, such as static
+        functions of several objects, are summed """
+
+        sizes = {}
+        for sym in self.get_symbols():
+            if sym.size and sym.section is not None and \
+                    sym.type in (STT_OBJECT, STT_FUNC):
+                key = (sym.section, sym.name)
+                sizes[key] = sizes.get(key, 0) + sym.size
+        return sizes
+
+
+def elf_berkeley_sizes(filename):
+    """ Return the sizes of an ELF image in the format of the size data of
+    utils.arm_non_eabi_size() """
+
+    with TFM_ELF_Reader(filename) as elf:
+        sizes = elf.berkeley_sizes()
+    dec = sizes["text"] + sizes["data"] + sizes["bss"]
+    return {"text": str(sizes["text"]),
+            "data": str(sizes["data"]),
+            "bss": str(sizes["bss"]),
+            "dec": str(dec),
+            "hex": "%x" % dec}
+
+
+def elf_fromelf_sizes(filename):
+    """ Return the sizes of an ELF image in the format of the size data of
+    utils.fromelf() """
+
+    with TFM_ELF_Reader(filename) as elf:
+        return {k: str(v) for k, v in elf.fromelf_sizes().items()}
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+""" footprint.py:
+
+    Per section, per symbol and per object memory footprint of built images,
+    and the diff of the footprints of two builds. Objects are read from the
+    linker map file found next to an image, written by GNU ld or armlink.
+    The footprint of the images of a build is indexed by columns, one list
+    per field, which keeps the index small when stored as json. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import re
+import json
+import itertools
+from .elf_reader import TFM_ELF_Reader, SHF_ALLOC
+
+# Bump when the layout of the index changes
+FOOTPRINT_VERSION = 2
+
+# Input section of a GNU ld memory map, its name may be on the line before
+_ld_input_rex = re.compile(r'^ (\S+)?\s+0x[0-9a-fA-F]+\s+0x([0-9a-fA-F]+)'
+                           r'\s+(\S.*)$')
+# Object row of the image component sizes of an armlink map
+_armlink_object_rex = re.compile(r'^\s+(\d+)\s+\d+\s+(\d+)\s+(\d+)'
+                                 r'\s+(\d+)\s+\d+\s+(\S.*)$')
+_armlink_columns = ["Code", "RO Data", "RW Data", "ZI Data"]
+
+
+def object_name(path):
+    """ Return the name of an object of a map file. Absolute paths of
+    objects and libraries depend on the build root or the toolchain, only
+    their file name is kept """
+
+    archive, sep, member = path.strip().partition("(")
+    if os.path.isabs(archive):
+        archive = os.path.basename(archive)
+    return archive + sep + member
+
+
+def ld_map_objects(lines):
+    """ Return {(output section, object): size} from the memory map of a GNU
+    ld map file """
+
+    sizes = {}
+    output = None
+    name = None
+    for line in itertools.dropwhile(
+            lambda n: not n.startswith("Linker script and memory map"),
+            lines):
+        if line[:1] not in " \n":
+            # Output sections start at the first column
+            output = line.split()[0]
+            continue
+        match = _ld_input_rex.match(line)
+        if not match:
+            # Input section names too long for their column wrap
+            name = line.split()[0] if len(line.split()) == 1 else None
+            continue
+        name = match.group(1) or name
+        size = int(match.group(2), 16)
+        if name and not name.startswith("*") and size:
+            key = (output, object_name(match.group(3)))
+            sizes[key] = sizes.get(key, 0) + size
+        name = None
+    return sizes
+
+
+def armlink_map_objects(lines):
+    """ Return {(size column, object): size} from the image component sizes
+    of an armlink map file. The columns are the code, read only, read write
+    and zero initialised data of the objects """
+
+    sizes = {}
+    for line in itertools.dropwhile(
+            lambda n: "Image component sizes" not in n, lines):
+        # The libraries sum up their members, which are listed before
+        if "Library Name" in line:
+            break
+        match = _armlink_object_rex.match(line)
+        if not match or "Totals" in match.group(5) or \
+                match.group(5).startswith("("):
+            continue
+        for column, size in zip(_armlink_columns, match.groups()[:4]):
+            if int(size):
+                key = (column, object_name(match.group(5)))
+                sizes[key] = sizes.get(key, 0) + int(size)
+    return sizes
+
+
+def map_objects(map_f):
+    """ Return the object sizes of a GNU ld or armlink map file """
+
+    with open(map_f, "r", errors="replace") as F:
+        lines = F.readlines()
+    if any("Image component sizes" in n for n in lines):
+        return armlink_map_objects(lines)
+    return ld_map_objects(lines)
+
+
+def image_footprint(filename, map_f=None):
+    """ Return the columnar footprint of an ELF image. Sections are the
+    allocated sections, symbols refer to them by their index. Objects are
+    only indexed if the linker map file of the image is given, and refer to
+    the sections of the map by their index """
+
+    with TFM_ELF_Reader(filename) as elf:
+        sections = [s for s in elf.get_sections()
+                    if s.flags & SHF_ALLOC and s.size]
+        symbols = sorted(elf.symbol_sizes().items())
+
+    section_index = {s.name: n for n, s in enumerate(sections)}
+    symbols = [(k, v) for k, v in symbols if k[0] in section_index]
+    fp = {"sections": {"name": [s.name for s in sections],
+                       "size": [s.size for s in sections]},
+          "symbols": {"section": [section_index[s] for (s, _), _
+                                  in symbols],
+                      "name": [n for (_, n), _ in symbols],
+                      "size": [v for _, v in symbols]}}
+    if map_f:
+        # Sections which are not loaded, such as debug info, are left out
+        objects = sorted((k, v) for k, v in map_objects(map_f).items()
+                         if k[0] in section_index or
+                         k[0] in _armlink_columns)
+        map_sections = sorted(set(s for (s, _), _ in objects))
+        map_index = {s: n for n, s in enumerate(map_sections)}
+        fp["objects"] = {"sections": map_sections,
+                         "section": [map_index[s] for (s, _), _ in objects],
+                         "name": [n for (_, n), _ in objects],
+                         "size": [v for _, v in objects]}
+    return fp
+
+
+def image_map_file(filename):
+    """ Return the linker map file written next to an image, if any """
+
+    map_f = os.path.splitext(filename)[0] + ".map"
+    return map_f if os.path.isfile(map_f) else None
+
+
+def footprint_index(filenames):
+    """ Return the footprint of the images by their file name """
+
+    return {"version": FOOTPRINT_VERSION,
+            "images": {os.path.basename(n): image_footprint(
+                n, image_map_file(n)) for n in filenames}}
+
+
+def save_footprint(f_name, index):
+    with open(f_name, "w") as F:
+        json.dump(index, F, separators=(",", ":"))
+
+
+def load_footprint(f_name):
+    """ Load a footprint index, or index a single ELF image """
+
+    with open(f_name, "rb") as F:
+        if F.read(4) == b"\x7fELF":
+            return footprint_index([f_name])
+    with open(f_name, "r") as F:
+        index = json.load(F)
+    if index.get("version") != FOOTPRINT_VERSION:
+        raise ValueError("%s has footprint version %s, expected %s" %
+                         (f_name, index.get("version"), FOOTPRINT_VERSION))
+    return index
+
+
+def footprint_sizes(index):
+    """ Return the sizes of the index as {(image, kind, section, name):
+    size}, where kind is "section", "symbol" or "object" """
+
+    sizes = {}
+    for image, fp in index["images"].items():
+        sections = fp["sections"]["name"]
+        for name, size in zip(sections, fp["sections"]["size"]):
+            key = (image, "section", name, "")
+            sizes[key] = sizes.get(key, 0) + size
+        symbols = fp["symbols"]
+        for section, name, size in zip(symbols["section"], symbols["name"],
+                                       symbols["size"]):
+            sizes[(image, "symbol", sections[section], name)] = size
+        objects = fp.get("objects", {"sections": [], "section": [],
+                                     "name": [], "size": []})
+        for section, name, size in zip(objects["section"], objects["name"],
+                                       objects["size"]):
+            sizes[(image, "object", objects["sections"][section],
+                   name)] = size
+    return sizes
+
+
+def diff_footprint(old, new):
+    """ Return the entries of the indexes which changed size, as (image,
+    kind, section, name, old size, new size, growth) tuples ranked by
+    growth, largest first. Missing entries have a size of 0. Indexes of a
+    single image each are compared whatever the name of their images """
+
+    if len(old["images"]) == len(new["images"]) == 1:
+        new = dict(new, images={list(old["images"])[0]:
+                                list(new["images"].values())[0]})
+    old_sizes = footprint_sizes(old)
+    new_sizes = footprint_sizes(new)
+    diff = []
+    for key in old_sizes.keys() | new_sizes.keys():
+        old_size = old_sizes.get(key, 0)
+        new_size = new_sizes.get(key, 0)
+        if old_size != new_size:
+            diff.append(key + (old_size, new_size, new_size - old_size))
+    diff.sort(key=lambda d: (-d[6], d[:4]))
+    return diff
+
+
+def print_footprint_diff(diff, top=None):
+    """ Print the image totals of the sections, and the ranked entries.
+    With top, only the largest growths and reductions are printed """
+
+    totals = {}
+    for image, kind, _, _, old_size, new_size, growth in diff:
+        if kind == "section":
+            totals[image] = totals.get(image, 0) + growth
+    for image, growth in sorted(totals.items()):
+        print("%s: %+d bytes" % (image, growth))
+
+    if top is not None and len(diff) > 2 * top:
+        diff = diff[:top] + [None] + diff[len(diff) - top:]
+    print("%-12s %-8s %-20s %-40s %10s %10s %8s" %
+          ("image", "kind", "section", "name", "old", "new", "growth"))
+    for d in diff:
+        if d is None:
+            print("...")
+            continue
+        print("%-12s %-8s %-20s %-40s %10d %10d %+8d" % d)
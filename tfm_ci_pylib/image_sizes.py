@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+""" image_sizes.py:
+
+    Size analysis of built images. The images of a build are measured
+    together, ELF images are read in Python, and the size tools are only
+    run for the images which need them, in batches and in parallel. fromelf
+    is always run when available. Sizes are cached by the hash of the image
+    content, so identical images built by several configs are measured
+    once. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen, PIPE
+from .utils import fromelf
+from .elf_reader import elf_berkeley_sizes, elf_fromelf_sizes
+
+# Bump when the format of the cached sizes changes
+IMAGE_SIZES_VERSION = 3
+
+# Cached sizes by tool. "elf_fromelf" holds the fromelf sizes read in Python
+# without ARMCLANG, which are not served when fromelf is available
+_tools = ["size", "fromelf", "elf_fromelf"]
+
+_size_info_rex = re.compile(r'^\s*(?P<text>[0-9]+)\s+(?P<data>[0-9]+)\s+'
+                            r'(?P<bss>[0-9]+)\s+(?P<dec>[0-9]+)\s+'
+                            r'(?P<hex>[0-9a-f]+)\s+(?P<file>.+)$',
+                            re.MULTILINE)
+
+
+def content_hash(filename):
+    """ Return the sha256 of the content of a file """
+
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def arm_non_eabi_size_batch(filenames):
+    """ Run arm-none-eabi-size once over the files and return the size data
+    of each, as utils.arm_non_eabi_size() does for a single file. Files the
+    tool fails to read are left out """
+
+    proc = Popen(["arm-none-eabi-size"] + filenames, stdout=PIPE,
+                 stderr=PIPE)
+    out, err = proc.communicate(timeout=18 + len(filenames))
+    if err:
+        print(err.decode("UTF-8", "replace").rstrip())
+    sizes = {}
+    for m in _size_info_rex.finditer(out.decode("UTF-8", "replace")):
+        sizes[m.group("file")] = {k: m.group(k) for k in
+                                  ["text", "data", "bss", "dec", "hex"]}
+    return sizes
+
+
+class TFM_Image_Sizes(object):
+    """ Sizes of images by tool. "size" reports the text, data and bss of
+    arm-none-eabi-size, and "fromelf" the Code, RO, RW and ZI data of the
+    ARMCLANG fromelf -z. Without fromelf, those of ELF images are read in
+    Python. The cache file is optional, without it the sizes are only cached
+    by the instance """
+
+    # Files given to a single run of a size tool
+    batch_size = 16
+
+    def __init__(self, cache_file=None, jobs=None):
+        self._tis_cache_file = cache_file
+        self._tis_jobs = jobs or os.cpu_count()
+        self._tis_cache = self.load()
+
+    def load(self):
+        """ Return the cached sizes, empty if there are none """
+
+        empty = dict({n: {} for n in _tools}, version=IMAGE_SIZES_VERSION)
+        if not self._tis_cache_file:
+            return empty
+        try:
+            with open(self._tis_cache_file, "r") as f:
+                cache = json.load(f)
+            if cache.get("version") == IMAGE_SIZES_VERSION:
+                return cache
+        except (OSError, ValueError):
+            pass
+        return empty
+
+    def save(self):
+        """ Atomically write the cache, merged with the sizes other builds
+        sharing the cache file stored meanwhile """
+
+        if not self._tis_cache_file:
+            return
+        stored = self.load()
+        for tool in _tools:
+            stored[tool].update(self._tis_cache[tool])
+        self._tis_cache = stored
+        try:
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self._tis_cache_file)),
+                prefix=".image_sizes.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(stored, f, separators=(",", ":"))
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self._tis_cache_file)
+        except OSError as e:
+            print("Warning: could not save image sizes: %s" % e)
+
+    def get_sizes(self, filenames, tool="size"):
+        """ Return the sizes of the files by file name. Files which could
+        not be measured are left out """
+
+        if tool == "fromelf" and not shutil.which("fromelf"):
+            print("Warning: fromelf not found, reading the sizes of ELF "
+                  "images in Python")
+            tool = "elf_fromelf"
+        hashes = {n: content_hash(n) for n in filenames}
+        cache = self._tis_cache[tool]
+        # Files of identical content are measured once
+        pending = {}
+        for filename, key in hashes.items():
+            if key not in cache:
+                pending.setdefault(key, filename)
+
+        if pending:
+            measure = {"size": self.measure_size,
+                       "fromelf": self.measure_fromelf,
+                       "elf_fromelf": self.measure_elf_fromelf}[tool]
+            measured = measure(list(pending.values()))
+            for key, filename in pending.items():
+                if filename in measured:
+                    cache[key] = measured[filename]
+                else:
+                    print("ERROR: Could not read the %s of %s" %
+                          (tool, filename))
+            self.save()
+            cache = self._tis_cache[tool]
+
+        return {n: cache[key] for n, key in hashes.items() if key in cache}
+
+    def measure_size(self, filenames):
+        """ Read the sizes of ELF images in Python, and run
+        arm-none-eabi-size over the rest """
+
+        sizes = {}
+        rest = []
+        for filename in filenames:
+            try:
+                sizes[filename] = elf_berkeley_sizes(filename)
+            except (ValueError, OSError):
+                rest.append(filename)
+        batches = [rest[n:n + self.batch_size]
+                   for n in range(0, len(rest), self.batch_size)]
+        with ThreadPoolExecutor(self._tis_jobs) as pool:
+            for batch_sizes in pool.map(self.run_batch, batches):
+                sizes.update(batch_sizes)
+        return sizes
+
+    def measure_fromelf(self, filenames):
+        """ Run fromelf over the images in parallel. It reports a single
+        image per run """
+
+        def run(filename):
+            try:
+                return filename, fromelf(filename)[0]
+            except Exception as E:
+                print("fromelf failed on %s: %s" % (filename, E))
+                return filename, None
+
+        with ThreadPoolExecutor(self._tis_jobs) as pool:
+            return {n: s for n, s in pool.map(run, filenames) if s}
+
+    @staticmethod
+    def measure_elf_fromelf(filenames):
+        """ Read the fromelf sizes of ELF images in Python, other images are
+        left out """
+
+        sizes = {}
+        for filename in filenames:
+            try:
+                sizes[filename] = elf_fromelf_sizes(filename)
+            except (ValueError, OSError) as E:
+                print("Could not read %s: %s" % (filename, E))
+        return sizes
+
+    @staticmethod
+    def run_batch(filenames):
+        """ Run arm-none-eabi-size over a batch, failures leave it out """
+
+        try:
+            return arm_non_eabi_size_batch(filenames)
+        except Exception as E:
+            print("arm-none-eabi-size failed: %s" % E)
+            return {}
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+""" lava_job_waiter.py:
+
+    Asynchronous waiter of LAVA jobs. Outstanding jobs are polled
+    concurrently over a bounded pool of connections, using a single bulk
+    listing of the finished jobs per round when the server supports it.
+    Every job is otherwise polled on its own schedule, backing off while
+    it is queued and until its expected end while it runs. Jobs are
+    reported as soon as they are seen finished. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import time
+import asyncio
+import calendar
+import logging
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+
+_log = logging.getLogger("lavaci")
+
+# Errors after which a poll is retried, e.g. "502 Proxy Error" or a socket
+# timeout
+_transient_errors = (xmlrpc.client.ProtocolError, OSError)
+
+
+def lava_time(value):
+    """ Return the epoch time of a LAVA date, or None if it is not set """
+
+    if not value:
+        return None
+    if isinstance(value, xmlrpc.client.DateTime):
+        value = value.timetuple()
+    else:
+        value = value.utctimetuple()
+    return calendar.timegm(value)
+
+
+class TFM_LAVA_Job_Waiter(object):
+    """ Wait for LAVA jobs over connections made by connect(). XML-RPC
+    connections are not thread safe, each is only used by one call at a
+    time. on_finish(job_id, info) is called for every job when it is seen
+    finished, with the job info of scheduler.jobs.show """
+
+    finished_states = ["Finished"]
+    queued_states = ["Submitted", "Scheduling", "Scheduled"]
+    # Cancelled jobs are polled until they are finished
+    canceling_states = ["Canceling"]
+    # Cancelled jobs are listed once they leave the Canceling state
+    listed_state = "Finished"
+    # Jobs returned by a page of scheduler.jobs.list
+    list_limit = 100
+
+    def __init__(self,
+                 connect,
+                 connections=4,
+                 poll_freq=5,
+                 max_poll_freq=60,
+                 expected_runtime=600,
+                 on_finish=None):
+        self._tlw_connect = connect
+        self._tlw_connections = connections
+        # Shortest and longest times between two polls of a job
+        self._tlw_poll_freq = poll_freq
+        self._tlw_max_poll_freq = max(poll_freq, max_poll_freq)
+        # Run time of jobs of device types which did not finish a job yet
+        self._tlw_expected_runtime = expected_runtime
+        self._tlw_runtimes = {}
+        self._tlw_on_finish = on_finish
+
+    def wait(self, job_ids, timeout):
+        """ Wait for the jobs to finish, for timeout seconds at most, and
+        return the info of the finished jobs by job id """
+
+        return asyncio.run(self.wait_jobs(job_ids, timeout))
+
+    async def wait_jobs(self, job_ids, timeout):
+        self._tlw_start = time.time()
+        # Time of the last bulk listing, the next one lists the jobs which
+        # finished since
+        self._tlw_listed = self._tlw_start
+        self._tlw_finished = {}
+        self._tlw_pool = asyncio.Queue()
+        self._tlw_created = 0
+        self._tlw_executor = ThreadPoolExecutor(self._tlw_connections)
+        self._tlw_calls = set()
+        try:
+            await asyncio.wait_for(self.poll_jobs(job_ids), timeout)
+        except asyncio.TimeoutError:
+            print("Breaking because of timeout")
+        finally:
+            # Calls which did not start are dropped, the running ones
+            # complete before the waiter returns
+            for future in list(self._tlw_calls):
+                future.cancel()
+            self._tlw_executor.shutdown(wait=True)
+        return self._tlw_finished
+
+    async def call(self, method, *args):
+        """ Run a method of a connector in the thread pool, on a connection
+        of the pool """
+
+        if self._tlw_pool.empty() and \
+                self._tlw_created < self._tlw_connections:
+            self._tlw_created += 1
+            self._tlw_pool.put_nowait(self._tlw_connect())
+        connector = await self._tlw_pool.get()
+        future = self._tlw_executor.submit(method, connector, *args)
+        self._tlw_calls.add(future)
+        future.add_done_callback(self._tlw_calls.discard)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            self._tlw_pool.put_nowait(connector)
+
+    async def supports_bulk_listing(self):
+        try:
+            methods = await self.call(lambda c: c.system.listMethods())
+        except (xmlrpc.client.Fault,) + _transient_errors:
+            return False
+        return "scheduler.jobs.list" in methods
+
+    async def poll_jobs(self, job_ids):
+        """ Poll every job once, then poll the outstanding jobs on their
+        schedule, or list the jobs finished since the last round in bulk """
+
+        outstanding = {n: {"next_poll": 0,
+                           "interval": self._tlw_poll_freq,
+                           "polled": False,
+                           "state": None} for n in job_ids}
+        bulk, _ = await asyncio.gather(self.supports_bulk_listing(),
+                                       self.poll_due(outstanding))
+        while outstanding:
+            if bulk:
+                await asyncio.sleep(self._tlw_poll_freq)
+                try:
+                    finished, pages = await self.list_finished(
+                        min(outstanding))
+                except xmlrpc.client.Fault as e:
+                    _log.warning("wait_for_jobs: bulk listing failed with "
+                                 "%r, polling jobs one by one", e)
+                    bulk = False
+                    continue
+                except _transient_errors as e:
+                    _log.warning("wait_for_jobs: %r occurred, ignore and "
+                                 "continue", e)
+                    continue
+                # Jobs which finished long before the start are not listed,
+                # those are polled until they are seen once. Jobs being
+                # cancelled are polled on their schedule until they finish
+                now = time.time()
+                await asyncio.gather(*[self.poll_job(n, outstanding)
+                                       for n, s in list(outstanding.items())
+                                       if n in finished or not s["polled"] or
+                                       s["state"] in self.canceling_states and
+                                       s["next_poll"] <= now])
+                # On a busy server, listing costs more calls than polling
+                # the few jobs left
+                if pages > len(outstanding):
+                    _log.info("wait_for_jobs: %d pages listed for %d jobs, "
+                              "polling jobs one by one", pages,
+                              len(outstanding))
+                    bulk = False
+                    for schedule in outstanding.values():
+                        schedule["next_poll"] = 0
+            else:
+                next_poll = min(s["next_poll"] for s in outstanding.values())
+                await asyncio.sleep(max(0, next_poll - time.time()))
+                await self.poll_due(outstanding)
+
+    async def poll_due(self, outstanding):
+        now = time.time()
+        await asyncio.gather(*[self.poll_job(n, outstanding)
+                               for n, s in list(outstanding.items())
+                               if s["next_poll"] <= now])
+
+    async def list_finished(self, first_id):
+        """ Return the ids of the jobs which finished since the last listing,
+        and the number of pages it took. LAVA lists the newest jobs first,
+        pages after the one reaching ids below first_id are not needed """
+
+        # Jobs are filtered by their end time, in whole minutes back
+        now = time.time()
+        since = int((now - self._tlw_listed) / 60) + 1
+        finished = set()
+        start = 0
+        pages = 0
+        while True:
+            jobs = await self.call(
+                lambda c: c.scheduler.jobs.list(self.listed_state, "", start,
+                                                self.list_limit, since))
+            pages += 1
+            ids = [job["id"] for job in jobs]
+            finished.update(ids)
+            if len(jobs) < self.list_limit or \
+                    ids[0] > ids[-1] and ids[-1] < first_id:
+                break
+            start += self.list_limit
+        # Only moved on success, a failed listing is retried from the same
+        # point
+        self._tlw_listed = now
+        return finished, pages
+
+    async def poll_job(self, job_id, outstanding):
+        """ Poll a job, reporting it if it finished and scheduling its next
+        poll otherwise """
+
+        schedule = outstanding[job_id]
+        try:
+            info = await self.call(lambda c: c.get_job_info(job_id))
+        except _transient_errors as e:
+            _log.warning("wait_for_jobs: %r occurred, ignore and continue", e)
+            schedule["next_poll"] = time.time() + self._tlw_poll_freq
+            return
+        if job_id not in outstanding:
+            return
+
+        schedule["polled"] = True
+        schedule["state"] = info["state"]
+        if info["state"] not in self.finished_states:
+            schedule["interval"] = self.poll_interval(info,
+                                                      schedule["interval"])
+            schedule["next_poll"] = time.time() + schedule["interval"]
+            return
+
+        del outstanding[job_id]
+        # Only failed jobs have an error reason to look up
+        if info.get("health") == "Complete":
+            info["error_reason"] = ""
+        else:
+            try:
+                info["error_reason"] = await self.call(
+                    lambda c: c.get_error_reason(job_id))
+            except _transient_errors:
+                info["error_reason"] = "Unknown"
+        self.learn_runtime(info)
+        self._tlw_finished[job_id] = info
+        _log.info("Job %d finished in %ds with state: %s, health: %s. "
+                  "Remaining: %d", job_id, time.time() - self._tlw_start,
+                  info["state"], info["health"], len(outstanding))
+        if self._tlw_on_finish:
+            self._tlw_on_finish(job_id, info)
+
+    def poll_interval(self, info, interval):
+        """ Return the time to the next poll of an unfinished job. Queued
+        jobs back off exponentially, running jobs are polled at half of the
+        time left to their expected end, and jobs being cancelled as often
+        as possible """
+
+        if info["state"] in self.queued_states:
+            interval = interval * 2
+        elif info["state"] in self.canceling_states:
+            interval = self._tlw_poll_freq
+        else:
+            start = lava_time(info.get("start_time")) or time.time()
+            runtime = self._tlw_runtimes.get(info.get("device_type"),
+                                             self._tlw_expected_runtime)
+            interval = (start + runtime - time.time()) / 2
+        return min(max(interval, self._tlw_poll_freq),
+                   self._tlw_max_poll_freq)
+
+    def learn_runtime(self, info):
+        """ Average the run times of the finished jobs by device type,
+        weighting the latest jobs most """
+
+        start = lava_time(info.get("start_time"))
+        end = lava_time(info.get("end_time"))
+        device_type = info.get("device_type")
+        if start and end and device_type:
+            runtime = self._tlw_runtimes.get(device_type, end - start)
+            self._tlw_runtimes[device_type] = (runtime + end - start) / 2
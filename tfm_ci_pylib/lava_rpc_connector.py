@@ -22,13 +22,11 @@ __version__ = "1.4.0"
 
 import xmlrpc.client
 import time
-import yaml
-import requests
 import shutil
-import logging
+from .lazy_import import lazy_import
 
-
-_log = logging.getLogger("lavaci")
+yaml = lazy_import("yaml")
+requests = lazy_import("requests")
 
 
 class LAVA_RPC_connector(xmlrpc.client.ServerProxy, object):
@@ -232,48 +230,23 @@ class LAVA_RPC_connector(xmlrpc.client.ServerProxy, object):
                 break
         return self.scheduler.job_health(job_id)["job_health"]
 
-    def block_wait_for_jobs(self, job_ids, timeout, poll_freq=10):
-        """ Wait for multiple LAVA job ids to finish and return finished list """
+    def block_wait_for_jobs(self, job_ids, timeout, poll_freq=10,
+                            connections=4):
+        """ Wait for multiple LAVA job ids to finish and return finished list.
+        Jobs are polled concurrently over up to connections connections """
 
-        start_t = int(time.time())
-        finished_jobs = {}
-        while(True):
-            cur_t = int(time.time())
-            if cur_t - start_t >= timeout:
-                print("Breaking because of timeout")
-                break
-            for job_id in job_ids:
-                if job_id in finished_jobs:
-                    continue
-                # Check if the job is not running
-                try:
-                    cur_status = self.get_job_info(job_id)
-                except (xmlrpc.client.ProtocolError, OSError) as e:
-                    # There can be transient HTTP errors, e.g. "502 Proxy Error"
-                    # or socket timeout.
-                    # Just continue with the next job, the faulted one will be
-                    # re-checked on next iteration.
-                    _log.warning("block_wait_for_jobs: %r occurred, ignore and continue", e)
-                    time.sleep(2)
-                    continue
-                # If in queue or running wait
-                if cur_status['state'] in ["Canceling","Finished"]:
-                    cur_status['error_reason'] = self.get_error_reason(job_id)
-                    finished_jobs[job_id] = cur_status
-                    _log.info(
-                        "Job %d finished in %ds with state: %s, health: %s. Remaining: %d",
-                        job_id, time.time() - start_t,
-                        cur_status['state'],
-                        cur_status['health'],
-                        len(job_ids) - len(finished_jobs)
-                    )
-                if len(job_ids) == len(finished_jobs):
-                    break
-                else:
-                    time.sleep(poll_freq)
-            if len(job_ids) == len(finished_jobs):
-                break
-        return finished_jobs
+        from .lava_job_waiter import TFM_LAVA_Job_Waiter
+
+        waiter = TFM_LAVA_Job_Waiter(self.new_connection,
+                                     connections=connections,
+                                     poll_freq=poll_freq)
+        return waiter.wait(job_ids, timeout)
+
+    def new_connection(self):
+        """ Return a new connector to the server with the same credentials.
+        A connector can only run one call at a time """
+
+        return LAVA_RPC_connector(self.username, self.token, self.server_url)
 
     def test_credentials(self):
         """ Attempt to querry the back-end and verify that the user provided
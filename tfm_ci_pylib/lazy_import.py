@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+""" lazy_import.py:
+
+    Deferred import of the heavy third party modules used by the CI scripts,
+    so that they are only loaded by the functions which need them and not by
+    the startup of every entry point. """
+
+from __future__ import print_function
+
+__copyright__ = """
+/*
+ * Copyright (c) 2023, Arm Limited. All rights reserved.
+ *
+ * SPDX-License-Identifier: BSD-3-Clause
+ *
+ */
+ """
+
+__author__ = "tf-m@lists.trustedfirmware.org"
+__project__ = "Trusted Firmware-M Open CI"
+__version__ = "1.4.0"
+
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """ Return the module, which is executed on first attribute access. A
+    missing module still raises ImportError at the import site """
+
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError("No module named '%s'" % name, name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -23,6 +23,7 @@ __version__ = "1.4.0"
 import abc
 import time
 import multiprocessing
+import multiprocessing.connection
 
 
 class structuredTask(multiprocessing.Process):
@@ -32,20 +33,23 @@ class structuredTask(multiprocessing.Process):
 
     def __init__(self, name):
 
-        self._stopevent = multiprocessing.Event()
         self._exec_sleep_period = 1.0
         self._join_timeout = 1.0
         self._exec_timeout = 0.0
         self._task_name = name
 
-        # multiprocessing safe shared memory variables
-        self._mprc_manager = multiprocessing.Manager()
+        # Process resources are only allocated when the task is started
+        self._stopevent = None
+        self._result_rx = None
+        self._result_tx = None
 
-        # Dictionary used to store objects between stages
-        self._mprc_stash = self._mprc_manager.dict()
+        # Dictionary used to store objects between stages. The child process
+        # sends it back along with the status through a pipe when it ends.
+        self._stash = {}
 
-        # Integer variable that stores status of flow
-        self._mprc_status = multiprocessing.Value('i', False)
+        # Integer variable that stores status of flow. A task which ends
+        # without sending it back has failed
+        self._status = 1
         super(structuredTask, self).__init__(name=name)
 
         # Perform initialization
@@ -76,16 +80,64 @@ class structuredTask(multiprocessing.Process):
     def post_exec(self):
         """ Tasks that are run after main task """
 
+    def start(self):
+        """ Allocate the stop event and the result channel, and start the
+        process """
+
+        self._stopevent = multiprocessing.Event()
+        self._result_rx, self._result_tx = multiprocessing.Pipe(duplex=False)
+        super(structuredTask, self).start()
+        # Only the child process writes results
+        self._result_tx.close()
+
+    def _collect_results(self):
+        """ Receive the status and stash sent back by the child process, if
+        they are available """
+
+        if self._result_rx is None or self._result_rx.closed:
+            return
+        try:
+            if not self._result_rx.poll():
+                # A child which ended without reporting leaves no results
+                if self.exitcode is None or self.exitcode == 0:
+                    return
+                raise EOFError()
+            self._status, stash = self._result_rx.recv()
+            self._stash.update(stash)
+        except EOFError:
+            # Child terminated without reporting, e.g. killed by a signal
+            self.lost_results()
+        self._result_rx.close()
+
+    def lost_results(self):
+        """ Fail a task which ended without sending its results """
+
+        # The child closed the pipe on its way out, wait for its exit code
+        super(structuredTask, self).join(self._join_timeout)
+        print("%s ==> Ended with exit code %s without reporting" %
+              (self.get_name(), self.exitcode))
+        self._status = 1
+
+    def wait_handles(self):
+        """ Return the objects to pass to multiprocessing.connection.wait()
+        in order to wake up when the task sends its results or ends """
+
+        handles = [self.sentinel]
+        if self._result_rx is not None and not self._result_rx.closed:
+            handles.append(self._result_rx)
+        return handles
+
     def stash(self, key, data):
-        """ Store object in a shared memory interface """
+        """ Store object in the task's stash """
 
-        self._mprc_stash[key] = data
+        self._stash[key] = data
 
     def unstash(self, key):
-        """ Retrieve object from a shared memory interface """
+        """ Retrieve object from the task's stash """
 
+        self._collect_results()
         try:
-            return self._mprc_stash[key]
+            return self._stash[key]
         except KeyError:
             return None
 
@@ -95,15 +147,33 @@ class structuredTask(multiprocessing.Process):
 
     def get_status(self):
         """ Return the status of the execution flow """
-        with self._mprc_status.get_lock():
-            return self._mprc_status.value
+        self._collect_results()
+        return self._status
 
     def set_status(self, status):
         """ Return the status of the execution flow """
-        with self._mprc_status.get_lock():
-            self._mprc_status.value = status
+        self._status = status
+
+    def is_alive(self):
+        # A child blocked on sending a large result can only exit once the
+        # parent reads it
+        self._collect_results()
+        return super(structuredTask, self).is_alive()
+
+    def join(self, timeout=None):
+        """ Wait for the task to end, receiving its results on the way """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._result_rx is not None and not self._result_rx.closed:
+            multiprocessing.connection.wait(self.wait_handles(), timeout)
+            self._collect_results()
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        super(structuredTask, self).join(timeout)
 
     def run(self):
+        # The child only writes results
+        self._result_rx.close()
         try:
 
             # Run Core code
@@ -124,12 +194,16 @@ class structuredTask(multiprocessing.Process):
                   "with Exception: \"%s\"") % (self.get_name(), exc))
             self.set_status(1)
         # Always call post, and determine success failed by get_status
-        self.post_exec(self.post_eval())
+        try:
+            self.post_exec(self.post_eval())
+        finally:
+            self._result_tx.send((self._status, self._stash))
+            self._result_tx.close()
 
     def _t_stop(self):
         """ Internal class stop to be called through thread """
 
-        if(self.is_alive()):
+        if self._stopevent is not None and self.is_alive():
             print("%s =========> STOP" % self.get_name())
             self._stopevent.set()
             print("Thead is alive %s" % self.is_alive())
@@ -139,4 +213,5 @@ class structuredTask(multiprocessing.Process):
         """ External stop to be called by user code """
 
         self._t_stop()
-        super(structuredTask, self).join(self._join_timeout)
+        if self._stopevent is not None:
+            self.join(self._join_timeout)
@@ -21,12 +21,22 @@ __project__ = "Trusted Firmware-M Open CI"
 __version__ = "1.4.0"
 
 import os
+import re
 import sys
 from .utils import *
 from time import time
 from copy import deepcopy
+from collections import OrderedDict
+import itertools
+from itertools import zip_longest
+from multiprocessing.connection import wait
 from .structured_task import structuredTask
 from .tfm_builder import TFM_Builder
+from .build_cache import TFM_Build_Cache
+from .config_constraints import TFM_Config_Constraints, pad_pattern
+from .config_catalogue import default_build_jobs
+from .build_config import TFM_Build_CFG, build_config_type, \
+    intern_value, brief_config_name, map_params
 from build_helper.build_helper_config_maps import *
 
 class TFM_Build_Manager(structuredTask):
@@ -46,9 +56,46 @@ class TFM_Build_Manager(structuredTask):
                  build_threads=3,    # Number of threads used per build
                  install=False,      # Install libraries after build
                  img_sizes=False,    # Use arm-none-eabi-size for size info
-                 relative_paths=False):     # Store relative paths in report
+                 relative_paths=False,      # Store relative paths in report
+                 duration_history=None,     # JSON file of past build times
+                 adaptive=False,    # Size parallelism from host resources
+                 build_cache=None,  # Directory of the build output cache
+                 build_cache_size=10240,    # Cache size limit in MB
+                 share_spe=False,   # Build identical spe images once
+                 incremental=False,     # Reuse build trees of last run
+                 compiler_cache=None,   # Directory of the ccache cache
+                 compiler_cache_size=5120,      # ccache size limit in MB
+                 log_tail=None,     # Lines of failed build logs to print
+                 log_timestamps=False,  # Prefix log lines with the time
+                 compress_logs=False,   # Write gzip compressed build logs
+                 fail_fast=None,    # Abort the run after this many failures
+                 canaries=None,     # Configs whose failure aborts the run
+                 smoke_first=False):    # Build a diverse subset first
         self._tbm_build_threads = build_threads
         self._tbm_conc_builds = parallel_builds
+        self._tbm_adaptive = adaptive
+        self._tbm_build_cache = build_cache
+        self._tbm_build_cache_size = build_cache_size
+        self._tbm_share_spe = share_spe
+        self._tbm_incremental = incremental
+        self._tbm_compiler_cache = os.path.abspath(
+            os.path.expanduser(compiler_cache)) if compiler_cache else None
+        self._tbm_compiler_cache_size = compiler_cache_size
+        self._tbm_log_tail = log_tail
+        self._tbm_log_timestamps = log_timestamps
+        self._tbm_compress_logs = compress_logs
+        self._tbm_fail_fast = fail_fast
+        self._tbm_canaries = canaries or []
+        self._tbm_smoke_first = smoke_first
+        # Set by the scheduler when the run is aborted
+        self._tbm_abort = None
+        # Estimated memory use of a build, and minimum threads per build
+        # used when sizing parallelism in adaptive mode
+        self._tbm_build_mem_mb = 1024
+        self._tbm_min_build_threads = 2
+        self._tbm_parallelism = {"mode": "static",
+                                 "parallel_builds": parallel_builds,
+                                 "build_threads": build_threads}
         self._tbm_install = install
         self._tbm_img_sizes = img_sizes
         self._tbm_relative_paths = relative_paths
@@ -58,6 +105,14 @@ class TFM_Build_Manager(structuredTask):
 
         self._tbm_tfm_dir = os.path.abspath(os.path.expanduser(tfm_dir))
 
+        # Build durations of previous runs, used to start the longest builds
+        # first. Kept in the work directory unless a file is provided.
+        if not duration_history:
+            duration_history = os.path.join(self._tbm_work_dir,
+                                            "build_durations.json")
+        self._tbm_duration_history_f = duration_history
+        self._tbm_duration_samples = 5
+
         print("bm param tfm_dir %s" % tfm_dir)
         print("bm %s %s %s" % (work_dir, cfg_dict, self._tbm_work_dir))
         # Internal flag to tag simple (non combination formatted configs)
@@ -67,6 +122,10 @@ class TFM_Build_Manager(structuredTask):
         self._tbm_cfg = self.load_config(cfg_dict, self._tbm_work_dir)
         self._tbm_build_cfg, \
             self.tbm_common_cfg = self.parse_config(self._tbm_cfg)
+        # Recently rendered build configs by config, codebase dir, jobs and
+        # build dir, least recently used first
+        self._tbm_rendered_cfg = OrderedDict()
+        self._tbm_rendered_cfg_size = 64
         self._tfb_code_base_updated = False
         self._tfb_log_f = "CodeBasePrepare.log"
 
@@ -97,11 +156,7 @@ class TFM_Build_Manager(structuredTask):
         return compiler_name
 
     def map_params(self, params, maps):
-        build_configs = ""
-        param_list = params.split(", ")
-        for param in param_list:
-            build_configs += maps[param]
-        return build_configs
+        return map_params(params, maps)
 
     def get_config(self):
             return list(self._tbm_build_cfg.keys())
@@ -129,12 +184,14 @@ class TFM_Build_Manager(structuredTask):
         }
         return config_params
 
-    def get_build_commands(self, config, silence_stderr=False, jobs=None):
+    def get_build_commands(self, config, silence_stderr=False, jobs=None,
+                           codebase_dir=None):
         """
         Return selected type of commands to be run to build the input config.
         """
         config_details = self._tbm_build_cfg[config]
-        codebase_dir = os.path.join(os.getcwd(),"trusted-firmware-m")
+        if codebase_dir is None:
+            codebase_dir = os.path.join(os.getcwd(),"trusted-firmware-m")
         build_config = self.get_build_config(config_details, config, \
                                              silence=silence_stderr, \
                                              codebase_dir=codebase_dir, \
@@ -231,10 +288,10 @@ class TFM_Build_Manager(structuredTask):
             print("python pass after builder prepare")
             os.chdir(build_cfg["codebase_root_dir"] + "/../")
 
-    def task_exec(self):
-        """ Create a build pool and execute them in parallel """
-
-        build_pool = []
+    def make_builder(self, name, shared_spe=None):
+        """ Materialize the config and return the TFM_Builder for it. Configs
+        are only rendered when the scheduler is about to start them. If
+        shared_spe names a completed build, its spe image is reused """
 
         # When a config is flagged as a single build config.
         # Name is evaluated by config type
@@ -247,7 +304,6 @@ class TFM_Build_Manager(structuredTask):
                 build_cfg["required_artefacts"] = build_cfg["required_artefacts"]["all"]
             except KeyError:
                 build_cfg["required_artefacts"] = []
-            name = build_cfg["config_type"]
 
             # Override _tbm_xxx paths in commands
             # plafrom in not guaranteed without seeds so _tbm_target_platform
@@ -264,64 +320,123 @@ class TFM_Build_Manager(structuredTask):
             # Overrides path in expected artefacts
             print("Loading config %s" % name)
 
-            build_pool.append(TFM_Builder(
-                              name=name,
-                              work_dir=self._tbm_work_dir,
-                              cfg_dict=build_cfg,
-                              build_threads=self._tbm_build_threads,
-                              img_sizes=self._tbm_img_sizes,
-                              relative_paths=self._tbm_relative_paths))
-        # When a seed pool is provided iterate through the entries
-        # and update platform spefific parameters
+            return TFM_Builder(name=name,
+                               work_dir=self._tbm_work_dir,
+                               cfg_dict=build_cfg,
+                               build_threads=self._tbm_build_threads,
+                               img_sizes=self._tbm_img_sizes,
+                               relative_paths=self._tbm_relative_paths,
+                               log_timestamps=self._tbm_log_timestamps,
+                               compress_logs=self._tbm_compress_logs)
+
+        # When a seed pool is provided update platform spefific parameters
+        i = self._tbm_build_cfg[name]
+        # Do not modify the original config
+        build_cfg = self.get_build_config(
+            i, name, build_dir=os.path.join(self._tbm_work_dir, name),
+            keep=False)
+        self.pre_build(build_cfg)
+        # Overrides path in expected artefacts
+        print("Loading config %s" % name)
+
+        return TFM_Builder(name=name,
+                           work_dir=self._tbm_work_dir,
+                           cfg_dict=build_cfg,
+                           build_threads=self._tbm_build_threads,
+                           img_sizes=self._tbm_img_sizes,
+                           relative_paths=self._tbm_relative_paths,
+                           build_cache=self._tbm_build_cache,
+                           build_cache_size=self._tbm_build_cache_size,
+                           shared_spe_dir=os.path.join(self._tbm_work_dir,
+                                                       shared_spe,
+                                                       "spe")
+                           if shared_spe else None,
+                           incremental=self._tbm_incremental,
+                           log_timestamps=self._tbm_log_timestamps,
+                           compress_logs=self._tbm_compress_logs,
+                           # Only fail fast runs stop running builds
+                           cancellable=bool(self._tbm_fail_fast or
+                                            self._tbm_canaries))
+
+    def plan_spe_sharing(self, build_names):
+        """ Group the configs which render identical spe commands. Returns a
+        dictionary mapping every config which can reuse the spe image of
+        another one to that config, which is the first of the group in
+        build_names. Platforms with post build steps are left out, as those
+        steps modify the spe tree """
+
+        # Render every config against the same build root to compare them
+        plan_dir = os.path.join(self._tbm_work_dir, "_spe_plan_")
+        spe_builds = {}
+        spe_owners = {}
+        for name in build_names:
+            build_cfg = self.get_build_config(self._tbm_build_cfg[name],
+                                              name,
+                                              build_dir=plan_dir,
+                                              keep=False)
+            if build_cfg["post_build"]:
+                continue
+            spe_key = (build_cfg["set_compiler_path"],
+                       build_cfg["spe_config_template"],
+                       build_cfg["spe_cmake_build"])
+            if spe_key in spe_builds:
+                spe_owners[name] = spe_builds[spe_key]
+            else:
+                spe_builds[spe_key] = name
+        print("Build: %d spe images for %d configs" %
+              (len(build_names) - len(spe_owners), len(build_names)))
+        return spe_owners
+
+    def task_exec(self):
+        """ Create a build pool and execute them in parallel """
+
+        spe_owners = {}
+        smoke = None
+        if self.simple_config:
+            build_names = [self.tbm_common_cfg["config_type"]]
         elif len(self._tbm_build_cfg):
             print("\r\n_tbm_build_cfg %s\r\n tbm_common_cfg %s\r\n" \
              % (self._tbm_build_cfg, self.tbm_common_cfg))
-            for name, i in self._tbm_build_cfg.items():
-                # Do not modify the original config
-                build_cfg = self.get_build_config(i, name)
-                self.pre_build(build_cfg)
-                # Overrides path in expected artefacts
-                print("Loading config %s" % name)
-
-                build_pool.append(TFM_Builder(
-                                  name=name,
-                                  work_dir=self._tbm_work_dir,
-                                  cfg_dict=build_cfg,
-                                  build_threads=self._tbm_build_threads,
-                                  img_sizes=self._tbm_img_sizes,
-                                  relative_paths=self._tbm_relative_paths))
+            build_names = self.order_build_configs()
+            # Canaries run first to fail as early as possible
+            canaries = [n for n in self._tbm_canaries if n in build_names]
+            build_names = canaries + [n for n in build_names
+                                      if n not in canaries]
         else:
             print("Could not find any configuration. Check the rejection list")
+            build_names = []
+
+        # With smoke first, the rest of the configs only run once a diverse
+        # subset of them passed
+        stages = [build_names]
+        if self._tbm_smoke_first and not self.simple_config and build_names:
+            smoke = {"configs": self.select_smoke_configs(build_names),
+                     "passed": False,
+                     "not_started": []}
+            stages = [smoke["configs"],
+                      [n for n in build_names if n not in smoke["configs"]]]
 
         status_rep = {}
         build_rep = {}
-        completed_build_count = 0
-        print("Build: Running %d parallel build jobs" % self._tbm_conc_builds)
-        for build_pool_slice in list_chunks(build_pool, self._tbm_conc_builds):
-
-            # Start the builds
-            for build in build_pool_slice:
-                # Only produce output for the first build
-                if build_pool_slice.index(build) != 0:
-                    build.mute()
-                print("Build: Starting %s" % build.get_name())
-                build.start()
-
-            # Wait for the builds to complete
-            for build in build_pool_slice:
-                # Wait for build to finish
-                build.join()
-                # Similarly print the logs of the other builds as they complete
-                if build_pool_slice.index(build) != 0:
-                    build.log()
-                completed_build_count += 1
-                print("Build: Finished %s" % build.get_name())
-                print("Build Progress:")
-                show_progress(completed_build_count, len(build_pool))
-
-                # Store status in report
-                status_rep[build.get_name()] = build.get_status()
-                build_rep[build.get_name()] = build.report()
+        slot_idle = []
+        for stage_names in stages:
+            if build_rep and (self._tbm_abort or
+                              not self.smoke_passed(smoke, build_rep)):
+                print("Build: Smoke configs failed, skipping %d builds" %
+                      len(stage_names))
+                smoke["not_started"] = stage_names
+                break
+            if self._tbm_share_spe and not self.simple_config:
+                spe_owners.update(self.plan_spe_sharing(stage_names))
+            stage_status, stage_rep, stage_idle = \
+                self.schedule_builds(stage_names, spe_owners)
+            status_rep.update(stage_status)
+            build_rep.update(stage_rep)
+            slot_idle = [round(a + b, 3) for a, b in
+                         zip_longest(slot_idle, stage_idle, fillvalue=0)]
+        if smoke:
+            smoke["passed"] = self.smoke_passed(smoke, build_rep)
+        self.save_duration_history(build_rep)
 
         # Include the original input configuration in the report
 
@@ -329,7 +444,21 @@ class TFM_Build_Manager(structuredTask):
                     "build_dir": self._tbm_work_dir
                     if not self._tbm_relative_paths
                     else resolve_rel_path(self._tbm_work_dir),
-                    "time": time()}
+                    "time": time(),
+                    "slot_idle_time": slot_idle,
+                    "parallelism": self._tbm_parallelism}
+        if self._tbm_build_cache:
+            metadata["build_cache"] = self.build_cache_stats(build_rep)
+        if self._tbm_share_spe:
+            metadata["shared_spe"] = spe_owners
+        if self._tbm_incremental:
+            metadata["build_mode"] = self.build_mode_stats(build_rep)
+        if self._tbm_compiler_cache:
+            metadata["compiler_cache"] = self.compiler_cache_stats(build_rep)
+        if self._tbm_abort:
+            metadata["fail_fast"] = self._tbm_abort
+        if smoke:
+            metadata["smoke_first"] = smoke
 
         full_rep = {"report": build_rep,
                     "_metadata_": metadata}
@@ -342,8 +471,379 @@ class TFM_Build_Manager(structuredTask):
             print("Exported build report to file:", self._tbm_report)
             save_json(self._tbm_report, full_rep)
 
-    def get_build_config(self, i, name, silence=False, codebase_dir=None, jobs=None):
-        build_cfg = deepcopy(self.tbm_common_cfg)
+    def schedule_builds(self, build_names, depends_on=None):
+        """ Run the builds through a bounded set of worker slots. A queued
+        build is started as soon as any slot frees up, instead of waiting for
+        a whole slice of builds to complete, and its builder is only created
+        then. Builds listed in depends_on wait for the build they reuse the
+        spe image of, and build their own if that one fails. Returns the
+        status and build reports, along with the time in seconds each slot
+        spent idle """
+
+        depends_on = depends_on or {}
+        status_rep = {}
+        build_rep = {}
+        pending = list(build_names)
+        total_builds = len(pending)
+        completed_build_count = 0
+
+        conc_builds = self._tbm_conc_builds
+        if self._tbm_adaptive:
+            # Planned once per run, the load average of later stages still
+            # counts the builds of the previous ones
+            if self._tbm_parallelism["mode"] != "adaptive":
+                self.plan_parallelism()
+            conc_builds = self._tbm_parallelism["parallel_builds"]
+        slots = [None] * max(1, min(conc_builds, total_builds))
+        slot_idle = [0.0] * len(slots)
+        idle_since = [time()] * len(slots)
+        started_at = [0.0] * len(slots)
+
+        print("Build: Running %d parallel build jobs" % len(slots))
+        while pending or any(slots):
+            for n, build in enumerate(slots):
+                if build is not None:
+                    if build.is_alive():
+                        continue
+                    build.join()
+                    duration = time() - started_at[n]
+                    # Store status in report
+                    status_rep[build.get_name()] = build.get_status()
+                    build_rep[build.get_name()] = build.report() or {}
+                    build_rep[build.get_name()]["duration"] = round(duration, 3)
+                    rep = build_rep[build.get_name()]
+                    # Only the first slot produces live output, print the
+                    # logs of the other slots when they fail
+                    if n != 0 and rep.get("status") != "Success":
+                        build.log(self._tbm_log_tail)
+                    completed_build_count += 1
+                    print("Build: Finished %s" % build.get_name())
+                    print("Build Progress:")
+                    show_progress(completed_build_count, total_builds)
+                    slots[n] = None
+                    idle_since[n] = time()
+
+                    # Builds which completed before they could be stopped
+                    # keep their own status
+                    if self._tbm_abort and rep.get("status") == "Cancelled":
+                        self._tbm_abort["cancelled"].append(build.get_name())
+                    if not self._tbm_abort and self.should_abort(
+                            build.get_name(), status_rep, build_rep):
+                        self.abort_builds(slots, pending)
+                        pending = []
+
+                # First pending build whose dependency has completed
+                name = next((b for b in pending
+                             if depends_on.get(b) in status_rep or
+                             b not in depends_on), None)
+                if name is not None:
+                    running_count = sum(1 for b in slots if b is not None)
+                    if self._tbm_adaptive and running_count and \
+                            not self.has_memory_for_build():
+                        continue
+                    pending.remove(name)
+                    shared_spe = depends_on.get(name)
+                    if shared_spe and status_rep[shared_spe] != 0:
+                        print("Build: %s failed, %s builds its own spe" %
+                              (shared_spe, name))
+                        shared_spe = None
+                    build = self.make_builder(name, shared_spe)
+                    if self._tbm_adaptive:
+                        threads = self.adaptive_build_threads(
+                            running_count, len(pending), len(slots))
+                        build.set_build_threads(threads)
+                        self._tbm_parallelism["build_threads"][
+                            build.get_name()] = threads
+                    if n != 0:
+                        build.mute()
+                    slot_idle[n] += time() - idle_since[n]
+                    print("Build: Starting %s" % build.get_name())
+                    started_at[n] = time()
+                    build.start()
+                    slots[n] = build
+
+            # Sleep until any of the running builds reports or terminates
+            running = [h for b in slots if b is not None
+                       for h in b.wait_handles()]
+            if running:
+                wait(running)
+
+        # Slots left without work while the last builds were running
+        end_time = time()
+        slot_idle = [round(idle + end_time - idle_since[n], 3)
+                     for n, idle in enumerate(slot_idle)]
+        return status_rep, build_rep, slot_idle
+
+    def should_abort(self, name, status_rep, build_rep):
+        """ Apply the fail fast policy once a build completes. Returns True
+        if the failure of name, a canary, or the number of failed builds so
+        far should abort the run """
+
+        if status_rep[name] == 0 or build_rep[name].get("cancelled"):
+            return False
+        failed = [n for n, status in status_rep.items()
+                  if status != 0 and not build_rep[n].get("cancelled")]
+        if name in self._tbm_canaries:
+            reason = "canary %s failed" % name
+        elif self._tbm_fail_fast and len(failed) >= self._tbm_fail_fast:
+            reason = "%d builds failed" % len(failed)
+        else:
+            return False
+        self._tbm_abort = {"reason": reason,
+                           "failed": failed,
+                           "cancelled": [],
+                           "not_started": []}
+        return True
+
+    def abort_builds(self, slots, pending):
+        """ Stop the running builds and drop the pending ones. The stopped
+        builds are collected by the scheduler as they exit, and listed as
+        cancelled if their report says so """
+
+        print("Build: Fail fast, %s. Stopping %d running and %d pending "
+              "builds" % (self._tbm_abort["reason"],
+                          sum(1 for b in slots if b is not None),
+                          len(pending)))
+        for build in slots:
+            if build is not None:
+                build.stop()
+        self._tbm_abort["not_started"] = list(pending)
+
+    def plan_parallelism(self):
+        """ Size the number of concurrent builds from the cores which are not
+        already busy and the free memory of the host. Returns the number of
+        builds to run in parallel """
+
+        host = get_host_resources()
+        usable_cpus = max(1, host["cpus"] - int(host["load_avg"]))
+        conc_builds = max(1, usable_cpus // self._tbm_min_build_threads)
+        if host["mem_available_mb"] is not None:
+            conc_builds = min(conc_builds,
+                              host["mem_available_mb"] // self._tbm_build_mem_mb)
+        conc_builds = max(1, conc_builds)
+
+        self._tbm_parallelism = {"mode": "adaptive",
+                                 "host": host,
+                                 "usable_cpus": usable_cpus,
+                                 "parallel_builds": conc_builds,
+                                 "build_threads": {}}
+        print("Build: Adaptive mode, %d usable cpus, %s MB available" %
+              (usable_cpus, host["mem_available_mb"]))
+        return conc_builds
+
+    def adaptive_build_threads(self, running_count, queued_count, slot_count):
+        """ Share the usable cores between the builds that will be running
+        alongside a new one. Once the queue drains fewer builds are left,
+        so the last builds of a run get more threads """
+
+        active = min(slot_count, running_count + queued_count + 1)
+        usable_cpus = self._tbm_parallelism["usable_cpus"]
+        return max(1, usable_cpus // active)
+
+    def has_memory_for_build(self):
+        """ Return True if there is enough free memory to start another build
+        next to the running ones """
+
+        mem_available = get_host_resources()["mem_available_mb"]
+        return mem_available is None or \
+            mem_available >= self._tbm_build_mem_mb
+
+    def build_cache_stats(self, build_rep):
+        """ Aggregate the build cache hits and misses of every build """
+
+        stats = {"dir": self._tbm_build_cache, "hits": 0, "misses": 0}
+        for rep in build_rep.values():
+            for result in rep.get("build_cache", {}).values():
+                stats["hits" if result == "hit" else "misses"] += 1
+        stats["size_bytes"] = TFM_Build_Cache(self._tbm_build_cache,
+                                              self._tbm_build_cache_size).size()
+        print("Build cache: %(hits)d hits, %(misses)d misses" % stats)
+        return stats
+
+    def compiler_cache_stats(self, build_rep):
+        """ Aggregate the compiler cache hits and misses of every build """
+
+        stats = {"dir": self._tbm_compiler_cache, "hits": 0, "misses": 0}
+        for rep in build_rep.values():
+            for key in ["hits", "misses"]:
+                stats[key] += rep.get("compiler_cache", {}).get(key, 0)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / total, 3) if total else 0
+        print("Compiler cache: %(hits)d hits, %(misses)d misses" % stats)
+        return stats
+
+    def get_compiler_cache_env(self, codebase_dir, ci_build_root_dir):
+        """ Return the commands setting up ccache for a build. The cache is
+        shared by every build using the same directory, and every build logs
+        its own results to compute its hit rate """
+
+        # Paths are hashed relative to the workspace, so that the same
+        # sources built in different build directories hit the cache
+        base_dir = os.path.commonpath(
+            [os.path.dirname(os.path.abspath(codebase_dir)),
+             os.path.dirname(os.path.abspath(ci_build_root_dir))])
+        env = {"CCACHE_DIR": self._tbm_compiler_cache,
+               "CCACHE_MAXSIZE": "%dM" % self._tbm_compiler_cache_size,
+               "CCACHE_BASEDIR": base_dir,
+               # Debug builds would otherwise hash their build directory
+               "CCACHE_NOHASHDIR": "1",
+               "CCACHE_STATSLOG": os.path.join(ci_build_root_dir,
+                                               "ccache_stats.log")}
+        return " ;\n".join("export %s=%s" % (k, env[k]) for k in sorted(env))
+
+    def build_mode_stats(self, build_rep):
+        """ List the builds which reused the tree of a previous run and the
+        ones which were configured from scratch """
+
+        stats = {"incremental": [], "cold": []}
+        for name, rep in build_rep.items():
+            stats[rep.get("build_mode", "cold")].append(name)
+        print("Build: %d incremental, %d cold" % (len(stats["incremental"]),
+                                                 len(stats["cold"])))
+        return stats
+
+    def load_duration_history(self):
+        """ Load the per config build durations recorded by previous runs """
+
+        try:
+            return load_json(self._tbm_duration_history_f)
+        except Exception:
+            return {}
+
+    def save_duration_history(self, build_rep):
+        """ Append the durations of this run to the duration history, keeping
+        only the most recent samples of each config. Failed, cancelled and
+        cached builds end early, their durations are not recorded """
+
+        history = self.load_duration_history()
+        for name, rep in build_rep.items():
+            if "duration" not in rep or rep.get("status") != "Success":
+                continue
+            if "hit" in rep.get("build_cache", {}).values():
+                continue
+            samples = history.get(name, []) + [rep["duration"]]
+            history[name] = samples[-self._tbm_duration_samples:]
+        try:
+            save_json(self._tbm_duration_history_f, history)
+        except OSError as E:
+            print("Could not save build duration history:", E)
+
+    @staticmethod
+    def estimate_build_weight(config):
+        """ Relative build cost of a config when it has no recorded history.
+        ARMCLANG, Debug builds and PSA API test suites are the heavy ones """
+
+        weight = 1.0
+        if "ARMCLANG" in config.compiler:
+            weight *= 1.3
+        if config.cmake_build_type == "Debug":
+            weight *= 1.2
+        if config.test_psa_api != "OFF":
+            weight *= 1.5
+        if config.test_regression != "OFF":
+            weight *= 1.2
+        # Isolation level 3 builds are verbose
+        if config.isolation_level == "3":
+            weight *= 1.1
+        return weight
+
+    def order_build_configs(self):
+        """ Return the config names ordered by expected build time, longest
+        first (LPT), so that long builds do not stretch the tail of the run.
+        Configs without history are estimated from their parameters, scaled
+        to seconds using the configs which do have history """
+
+        expected = self.expected_build_times()
+        return sorted(self._tbm_build_cfg, key=lambda n: -expected[n])
+
+    def expected_build_times(self):
+        """ Return the expected build time of every config, from the history
+        of previous runs or estimated from its parameters """
+
+        history = self.load_duration_history()
+        weights = {name: self.estimate_build_weight(config)
+                   for name, config in self._tbm_build_cfg.items()}
+        expected = {}
+        scales = []
+        for name, weight in weights.items():
+            if history.get(name):
+                expected[name] = sum(history[name]) / len(history[name])
+                scales.append(expected[name] / weight)
+        scales.sort()
+        scale = scales[len(scales) // 2] if scales else 1.0
+
+        for name, weight in weights.items():
+            expected.setdefault(name, weight * scale)
+        return expected
+
+    def select_smoke_configs(self, build_names):
+        """ Pick a small subset of the configs which covers every platform,
+        compiler and isolation level of the seed parameters at least once.
+        Configs covering most of the values not yet covered are picked
+        first, the fastest ones on a tie. Canaries are always included.
+        Returns the subset in the order of build_names """
+
+        fields = [n for n in ["tfm_platform", "compiler", "isolation_level"]
+                  if n in self.tbm_common_cfg["sort_order"]]
+
+        def values(name):
+            config = self._tbm_build_cfg[name]
+            return set((n, getattr(config, n)) for n in fields
+                       if n in config._fields)
+
+        smoke = [n for n in self._tbm_canaries if n in build_names]
+        uncovered = set().union(*[values(n) for n in build_names])
+        for name in smoke:
+            uncovered -= values(name)
+        expected = self.expected_build_times()
+        while uncovered:
+            name = max((n for n in build_names if n not in smoke),
+                       key=lambda n: (len(values(n) & uncovered),
+                                      -expected[n]))
+            smoke.append(name)
+            uncovered -= values(name)
+        print("Build: %d smoke configs out of %d" % (len(smoke),
+                                                     len(build_names)))
+        return [n for n in build_names if n in smoke]
+
+    @staticmethod
+    def smoke_passed(smoke, build_rep):
+        """ Return True if every smoke config was reported as Success. A
+        build whose commands succeeded can still fail its artefact checks,
+        which is only recorded in its report """
+
+        return all(build_rep.get(n, {}).get("status") == "Success"
+                   for n in smoke["configs"])
+
+    def get_build_config(self, i, name, silence=False, codebase_dir=None,
+                         jobs=None, build_dir=None, keep=True):
+        """ Return the build config of a config tuple, which must not be
+        modified. The most recently used configs are memoized per codebase
+        dir, jobs and build dir, unless keep is False for configs which are
+        only needed once """
+
+        if jobs is None:
+            jobs = default_build_jobs()
+        key = (i, name, codebase_dir, jobs, build_dir)
+        build_cfg = self._tbm_rendered_cfg.pop(key, None)
+        if build_cfg is None:
+            build_cfg = self.render_build_config(i, codebase_dir, jobs,
+                                                 build_dir)
+            # Most commands render alike across configs, keep one copy
+            for k, v in build_cfg.items():
+                if type(v) is str:
+                    build_cfg[k] = sys.intern(v)
+        if keep:
+            self._tbm_rendered_cfg[key] = build_cfg
+            if len(self._tbm_rendered_cfg) > self._tbm_rendered_cfg_size:
+                self._tbm_rendered_cfg.popitem(last=False)
+        return build_cfg
+
+    def render_build_config(self, i, codebase_dir, jobs, build_dir):
+        """ Render the build config of a config tuple. The common config is
+        shared, only the entries which differ per config are allocated """
+
+        build_cfg = dict(self.tbm_common_cfg)
         if not codebase_dir:
             codebase_dir = build_cfg["codebase_root_dir"]
         else:
@@ -352,30 +852,20 @@ class TFM_Build_Manager(structuredTask):
             build_cfg["codebase_root_dir"] = codebase_dir
         # Extract the common for all elements of config
         try:
-            build_cfg["required_artefacts"] = deepcopy(self.tbm_common_cfg["required_artefacts"]["all"])
+            required_artefacts = self.tbm_common_cfg["required_artefacts"]["all"]
         except KeyError as E:
-            build_cfg["required_artefacts"] = []
-        build_cfg["post_build"] = ""
+            required_artefacts = []
+        platform_cfg = {"post_build": "", "required_artefacts": []}
         # Extract the platform specific elements of config
-        for key in ["post_build", "required_artefacts"]:
+        for key in platform_cfg:
             try:
                 if i.tfm_platform in self.tbm_common_cfg[key].keys():
-                    build_cfg[key] += deepcopy(self.tbm_common_cfg[key]
-                                               [i.tfm_platform])
+                    platform_cfg[key] = self.tbm_common_cfg[key][i.tfm_platform]
             except Exception as E:
                 pass
 
-        if jobs is None:
-            if os.cpu_count() >= 8:
-                #run in a serviver with scripts, parallel build will use CPU numbers
-                jobs = 2
-            else:
-                #run in a docker, usually docker with CPUs less than 8
-                jobs = os.cpu_count()
-
         thread_no = " -j {} ".format(jobs)
-        build_cfg["spe_cmake_build"] += thread_no
-        build_cfg["nspe_cmake_build"] += thread_no
+        test_regression, extra_params = i._cmake_fragments()
 
         # Overwrite command lines to set compiler
         build_cfg["set_compiler_path"] %= {"compiler": i.compiler}
@@ -385,19 +875,19 @@ class TFM_Build_Manager(structuredTask):
         overwrite_params = {"codebase_root_dir":   build_cfg["codebase_root_dir"],
                             "spe_root_dir":  build_cfg["codebase_root_dir"] + "/../tf-m-tests/tests_reg/spe",
                             "nspe_root_dir":  build_cfg["codebase_root_dir"] + "/../tf-m-tests/tests_reg",
-                            "ci_build_root_dir":  build_cfg["codebase_root_dir"] + "/../ci_build",
+                            "ci_build_root_dir":  build_dir if build_dir else build_cfg["codebase_root_dir"] + "/../ci_build",
                             "tfm_platform": i.tfm_platform,
                             "s_compiler": self.choose_toolchain(i.compiler, s_build = True),
                             "ns_compiler": self.choose_toolchain(i.compiler, s_build = False),
                             "isolation_level": i.isolation_level,
-                            "test_regression": self.map_params(i.test_regression, mapRegTest),
+                            "test_regression": test_regression,
                             "test_psa_api": i.test_psa_api,
                             "cmake_build_type": i.cmake_build_type,
                             "with_bl2": i.with_bl2,
                             "profile": "" if i.profile=="N.A" else i.profile}
         # The extra params can also contain paths with "codebase_root_dir" and
         # these also need to be substituted
-        overwrite_params["extra_params"] = self.map_params(i.extra_params, mapExtraParams) % overwrite_params
+        overwrite_params["extra_params"] = extra_params % overwrite_params
 
         # Print more cmake command details to debug issue in Isolation Level 3
         if i.isolation_level == "3":
@@ -421,9 +911,36 @@ class TFM_Build_Manager(structuredTask):
         # Overwrite commands for building TF-M image
         build_cfg["spe_config_template"] %= overwrite_params
         build_cfg["nspe_config_template"] %= overwrite_params
-        build_cfg["spe_cmake_build"] %= overwrite_params
-        build_cfg["nspe_cmake_build"] %= overwrite_params
-        build_cfg["post_build"] %= overwrite_params
+        build_cfg["spe_cmake_build"] = \
+            (build_cfg["spe_cmake_build"] + thread_no) % overwrite_params
+        build_cfg["nspe_cmake_build"] = \
+            (build_cfg["nspe_cmake_build"] + thread_no) % overwrite_params
+        build_cfg["post_build"] = platform_cfg["post_build"] % overwrite_params
+        build_cfg["required_artefacts"] = \
+            [n % overwrite_params for n in
+             required_artefacts + platform_cfg["required_artefacts"]]
+        # Artefacts listed upfront are captured without scanning the build
+        if "artefact_manifest" in self.tbm_common_cfg:
+            manifest = self.tbm_common_cfg["artefact_manifest"]
+            build_cfg["artefact_manifest"] = \
+                [n % overwrite_params for n in
+                 manifest.get("all", []) + manifest.get(i.tfm_platform, [])]
+        build_cfg["artifact_capture_rex"] %= dict(overwrite_params,
+            ci_build_root_dir=re.escape(overwrite_params["ci_build_root_dir"]))
+        build_cfg["ci_build_root_dir"] = overwrite_params["ci_build_root_dir"]
+
+        # Compile through ccache, the launcher is honoured by the GNUARM and
+        # ARMCLANG toolchain files alike
+        if self._tbm_compiler_cache:
+            build_cfg["set_compiler_path"] += " ;\n" + \
+                self.get_compiler_cache_env(build_cfg["codebase_root_dir"],
+                                            build_cfg["ci_build_root_dir"])
+            launcher = "-DCMAKE_C_COMPILER_LAUNCHER=ccache " + \
+                       "-DCMAKE_CXX_COMPILER_LAUNCHER=ccache "
+            build_cfg["spe_config_template"] += launcher
+            build_cfg["nspe_config_template"] += launcher
+            build_cfg["compiler_cache_log"] = os.path.join(
+                build_cfg["ci_build_root_dir"], "ccache_stats.log")
 
         # Disable NSPE CMake commands when NS is OFF
         if "NSOFF" in i.extra_params:
@@ -507,9 +1024,17 @@ class TFM_Build_Manager(structuredTask):
         # seed_params is an optional field. Do not proccess if it is missing
         if "seed_params" in cfg:
             comb_cfg = cfg["seed_params"]
+            tags = [n for n in static_cfg["sort_order"] if n in comb_cfg]
+            # invalid is an optional field. Rejected configs are matched
+            # against it instead of being generated
+            rejection = TFM_Config_Constraints(tags,
+                                               comb_cfg,
+                                               cfg.get("invalid", []))
+
             # Generate a list of all possible confugration combinations
             ret_cfg = TFM_Build_Manager.generate_config_list(comb_cfg,
-                                                             static_cfg)
+                                                             static_cfg,
+                                                             rejection)
 
             # valid is an optional field. Do not proccess if it is missing
             if "valid" in cfg:
@@ -519,21 +1044,8 @@ class TFM_Build_Manager(structuredTask):
                 ret_cfg.update(TFM_Build_Manager.generate_optional_list(
                     comb_cfg,
                     static_cfg,
-                    valid_cfg))
-
-            # invalid is an optional field. Do not proccess if it is missing
-            if "invalid" in cfg:
-                # Invalid configurations(Do not build)
-                invalid_cfg = cfg["invalid"]
-                # Remove the rejected entries from the test list
-                rejection_cfg = TFM_Build_Manager.generate_optional_list(
-                    comb_cfg,
-                    static_cfg,
-                    invalid_cfg)
-
-                # Subtract the two configurations
-                ret_cfg = {k: v for k, v in ret_cfg.items()
-                           if k not in rejection_cfg}
+                    valid_cfg,
+                    rejection))
             self.simple_config = False
         else:
             self.simple_config = True
@@ -548,6 +1060,8 @@ class TFM_Build_Manager(structuredTask):
             full_rep = self.unstash("Build Report")["report"]
             fl = ([k for k, v in full_rep.items() if v['status'] == 'Failed'])
             ps = ([k for k, v in full_rep.items() if v['status'] == 'Success'])
+            cl = ([k for k, v in full_rep.items()
+                   if v['status'] == 'Cancelled'])
         except Exception as E:
             print("No report generated", E)
             return
@@ -555,15 +1069,47 @@ class TFM_Build_Manager(structuredTask):
             print_test(t_list=fl, status="failed", tname="Builds")
         if ps:
             print_test(t_list=ps, status="passed", tname="Builds")
+        if cl:
+            print_test(t_list=cl, status="cancelled", tname="Builds")
+        self.print_phase_summary(full_rep)
+
+    @staticmethod
+    def print_phase_summary(full_rep):
+        """ Print the time and peak memory spent in every build phase,
+        aggregated over the builds """
+
+        phases = {}
+        for rep in full_rep.values():
+            for phase, usage in rep.get("phases", {}).items():
+                total = phases.setdefault(phase, {"builds": 0,
+                                                  "wall": 0.0,
+                                                  "cpu": 0.0,
+                                                  "max_wall": 0.0,
+                                                  "peak_rss_mb": 0.0})
+                total["builds"] += 1
+                total["wall"] += usage["wall"]
+                total["cpu"] += usage["cpu_user"] + usage["cpu_sys"]
+                total["max_wall"] = max(total["max_wall"], usage["wall"])
+                total["peak_rss_mb"] = max(total["peak_rss_mb"],
+                                           usage["peak_rss_mb"])
+        if not phases:
+            return
+        print("%-16s %7s %10s %10s %10s %10s" % ("Phase", "Builds",
+                                                 "Wall(s)", "Max(s)",
+                                                 "CPU(s)", "RSS(MB)"))
+        for phase, total in phases.items():
+            print("%-16s %7d %10.1f %10.1f %10.1f %10.1f" %
+                  (phase, total["builds"], total["wall"], total["max_wall"],
+                   total["cpu"], total["peak_rss_mb"]))
 
     @staticmethod
-    def generate_config_list(seed_config, static_config):
+    def generate_config_list(seed_config, static_config, rejection=None):
         """ Generate all possible configuration combinations from a group of
-        lists of compiler options"""
+        lists of compiler options. Combinations matching the rejection
+        constraints are left out """
         config_list = []
 
         if static_config["config_type"] == "tf-m":
-            cfg_name = "TFM_Build_CFG"
             # Ensure the fieds are sorted in the desired order
             # seed_config can be a subset of sort order for configurations with
             # optional parameters.
@@ -573,41 +1119,36 @@ class TFM_Build_Manager(structuredTask):
 
             data = []
             for key in tags:
-                data.append(seed_config[key])
-            config_list = gen_cfg_combinations(cfg_name,
-                                               " ".join(tags),
-                                               *data)
+                data.append([intern_value(v) for v in seed_config[key]])
+            make_build_config = build_config_type(tags)._make
+            combinations = rejection.product(data) if rejection \
+                else itertools.product(*data)
+            config_list = [make_build_config(x) for x in combinations]
         else:
             print("Not information for project type: %s."
                   " Please check config" % static_config["config_type"])
 
         ret_cfg = {}
-        # Notify the user for the rejected configuations
         for i in config_list:
-            # Convert named tuples to string in a brief format
-            config_param = []
-            config_param.append(mapPlatform[list(i)[0]])
-            config_param.append(list(i)[1].split("_")[0])
-            config_param.append(list(i)[2]) # ISOLATION_LEVEL
-            if list(i)[3] != "OFF":  # TEST_REGRESSION
-                config_param.append(list(i)[3].replace(", ", "_"))
-            if list(i)[4] != "OFF":    #TEST_PSA_API
-                config_param.append(mapTestPsaApi[list(i)[4]])
-            config_param.append(list(i)[5]) # BUILD_TYPE
-            if list(i)[6]:  # BL2
-                config_param.append("BL2")
-            if list(i)[7]: # PROFILE
-                config_param.append(mapProfile[list(i)[7]])
-            if list(i)[8]: # EXTRA_PARAMS
-                config_param.append(list(i)[8].replace(", ", "_"))
-            i_str = "_".join(config_param)
-            ret_cfg[i_str] = i
+            ret_cfg[TFM_Build_Manager.generate_config_name(i)] = i
         return ret_cfg
 
+    @staticmethod
+    def generate_config_name(i):
+        """ Convert a config named tuple to string in a brief format """
+
+        if isinstance(i, TFM_Build_CFG):
+            return i._brief_name()
+        return brief_config_name(i)
+
     @staticmethod
     def generate_optional_list(seed_config,
                                static_config,
-                               optional_list):
+                               optional_list,
+                               rejection=None):
+        """ Generate the configs of a list of patterns, whose wildcards ("*")
+        and omitted trailing values stand for every seed value. Configs
+        matching the rejection constraints are left out """
         optional_cfg = {}
 
         if static_config["config_type"] == "tf-m":
@@ -620,18 +1161,18 @@ class TFM_Build_Manager(structuredTask):
                     if n in seed_config.keys()]
             sorted_default_lst = [seed_config[k] for k in tags]
 
-            # If tags are not alligned with optional list entries quit
-            if len(tags) != len(optional_list[0]):
-                print(len(tags), len(optional_list[0]))
-                print("Error, tags should be assigned to each "
-                      "of the optional inputs")
-                return []
-
             # Replace wildcard ( "*") entries with every
             # inluded in cfg variant
             for k in optional_list:
+                # If tags are not alligned with optional list entries quit
+                if len(k) > len(tags):
+                    print(len(tags), len(k))
+                    print("Error, tags should be assigned to each "
+                          "of the optional inputs")
+                    return {}
+
                 # Pad the omitted values with wildcard char *
-                res_list = list(k) + ["*"] * (5 - len(k))
+                res_list = pad_pattern(k, len(tags))
                 print("Working on optional input: %s" % (res_list))
 
                 for n in range(len(res_list)):
@@ -642,10 +1183,11 @@ class TFM_Build_Manager(structuredTask):
                 # Generate a configuration and a name for the completed array
                 op_cfg = TFM_Build_Manager.generate_config_list(
                     dict(zip(tags, res_list)),
-                    static_config)
+                    static_config,
+                    rejection)
 
                 # Append the configuration to the existing ones
-                optional_cfg = dict(optional_cfg, **op_cfg)
+                optional_cfg.update(op_cfg)
 
             # Notify the user for the optional configuations
             for i in optional_cfg.keys():
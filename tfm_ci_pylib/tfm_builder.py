@@ -23,8 +23,12 @@ import os
 import re
 import time
 import shutil
+import resource
 from .utils import *
 from .structured_task import structuredTask
+from .build_cache import TFM_Build_Cache, source_tree_state, \
+    toolchain_version, compiler_cache_stats
+from .image_sizes import TFM_Image_Sizes
 
 
 class TFM_Builder(structuredTask):
@@ -41,14 +45,35 @@ class TFM_Builder(structuredTask):
                  build_threads=4,   # Number of CPU thrads used in build
                  silent=False,      # Silence stdout ouptut
                  img_sizes=False,   # Use arm-none-eabi-size for size info
-                 relative_paths=False):  # Store relative paths in report
+                 relative_paths=False,  # Store relative paths in report
+                 build_cache=None,      # Directory of the build output cache
+                 build_cache_size=10240,    # Cache size limit in MB
+                 shared_spe_dir=None,   # Built spe tree to reuse
+                 incremental=False,     # Reuse the build tree of last run
+                 log_timestamps=False,  # Prefix log lines with the time
+                 compress_logs=False,   # Write gzip compressed logs
+                 cancellable=False):    # May be stopped while it runs
 
         self._tfb_cfg = cfg_dict
         self._tfb_build_threads = build_threads
+        self._tfb_force_threads = False
         self._tfb_silent = silent
         self._tfb_img_sizes = img_sizes
         self._tfb_relative_paths = relative_paths
         self._tfb_binaries = []
+        self._tfb_build_cache = build_cache
+        self._tfb_build_cache_size = build_cache_size
+        # Entries of the spe and nspe build trees stored in the build cache.
+        # The state of the build system refers to the build root the tree
+        # was built in, restored trees are configured from scratch
+        self._tfb_cache_outputs = ["bin", "api_ns",
+                                   "*.axf", "*.bin", "*.hex", "*.elf",
+                                   "*.map"]
+        self._tfb_shared_spe_dir = shared_spe_dir
+        self._tfb_incremental = incremental
+        self._tfb_log_timestamps = log_timestamps
+        self._tfb_compress_logs = compress_logs
+        self._tfb_cancellable = cancellable
 
         # Required by other methods, always set working directory first
         self._tfb_work_dir = os.path.abspath(os.path.expanduser(work_dir))
@@ -65,21 +90,39 @@ class TFM_Builder(structuredTask):
     def mute(self):
         self._tfb_silent = True
 
-    def log(self):
-        """ Print and return the contents of log file """
+    def set_build_threads(self, threads):
+        """ Run the build commands with exactly this number of threads, even
+        if the commands request fewer. Used by adaptive scheduling """
+        self._tfb_build_threads = threads
+        self._tfb_force_threads = True
+
+    def log(self, tail=None):
+        """ Print the contents of log file, or only its last tail lines. The
+        log is streamed rather than read in memory """
         try:
-            with open(self._tfb_log_f, "r") as F:
-                log = F.read()
-            print(log)
-            return log
+            if tail:
+                print("Last %d lines of %s:" % (tail, self._tfb_log_f))
+                sys.stdout.write("".join(tail_log(self._tfb_log_f, tail)))
+            else:
+                with open_log(self._tfb_log_f) as F:
+                    shutil.copyfileobj(F, sys.stdout)
+            sys.stdout.flush()
         except FileNotFoundError:
             print("Log %s not found" % self._tfb_log_f)
-            return ""
 
     def report(self):
         """Return the report on the job """
         return self.unstash("Build Report")
 
+    def lost_results(self):
+        """ Report a builder killed before reporting as failed """
+
+        super(TFM_Builder, self).lost_results()
+        rep = self._stash.get("Build Report") or {}
+        rep["status"] = "Failed"
+        rep["exitcode"] = self.exitcode
+        self._stash["Build Report"] = rep
+
     def pre_eval(self):
         """ Tests that need to be run in set-up state """
 
@@ -90,20 +133,54 @@ class TFM_Builder(structuredTask):
         return True
 
     def pre_exec(self, eval_ret):
-        """ Create all required directories, files if they do not exist """
+        """ Set the build directory and log paths. The directories are only
+        created once the build is started """
 
         self._tfb_build_dir = os.path.join(self._tfb_work_dir,
                                            self.get_name())
-        # Ensure we have a clean build directory
-        shutil.rmtree(self._tfb_build_dir, ignore_errors=True)
 
         # Log will be placed in work directory, named as the build dir
-        self._tfb_log_f = "%s.log" % self._tfb_build_dir
+        self._tfb_log_f = "%s.log%s" % (self._tfb_build_dir,
+                                        ".gz" if self._tfb_compress_logs
+                                        else "")
+
+    def prepare_build_dir(self):
+        """ Create all required directories, files if they do not exist.
+        Returns True if the build tree of a previous run is reused """
+
+        stamp_f = os.path.join(self._tfb_build_dir, ".configure_stamp")
+        incremental = False
+        if self._tfb_incremental and "build_cmds" not in self._tfb_cfg:
+            try:
+                with open(stamp_f, "r") as F:
+                    incremental = F.read() == self.get_configure_stamp()
+            except OSError:
+                pass
+
+        if incremental:
+            # Written back once the build succeeds, so that an interrupted
+            # or failed build is configured from scratch next time
+            os.remove(stamp_f)
+        else:
+            # Ensure we have a clean build directory
+            shutil.rmtree(self._tfb_build_dir, ignore_errors=True)
 
         # Confirm that the work/build directory exists
         for p in [self._tfb_work_dir, self._tfb_build_dir]:
             if not os.path.exists(p):
                 os.makedirs(p)
+        return incremental
+
+    def get_configure_stamp(self):
+        """ Return a hash of the inputs of the configure steps. A build tree
+        is only reused if it was configured from the same inputs """
+
+        return TFM_Build_Cache.key(self.get_name(),
+                                   self._tfb_cfg["set_compiler_path"],
+                                   self._tfb_cfg["spe_config_template"],
+                                   self._tfb_cfg.get("nspe_config_template",
+                                                     ""),
+                                   self._tfb_shared_spe_dir or "")
 
     def pre_build(self):
         print("builder start %s \r\nself._tfb_cfg %s\r\n" %
@@ -128,7 +205,8 @@ class TFM_Builder(structuredTask):
                                       self._tfb_log_f,
                                       append=True,
                                       prefix=_api_test_manifest,
-                                      silent=self._tfb_silent):
+                                      silent=self._tfb_silent,
+                                      timestamps=self._tfb_log_timestamps):
 
                         raise Exception("Python Failed please check log: %s" %
                                         self._tfb_log_f)
@@ -139,7 +217,8 @@ class TFM_Builder(structuredTask):
                                       self._tfb_log_f,
                                       append=True,
                                       prefix=_api_test_manifest_tfm,
-                                      silent=self._tfb_silent):
+                                      silent=self._tfb_silent,
+                                      timestamps=self._tfb_log_timestamps):
 
                         raise Exception("Python TFM Failed please check log: %s" %
                                         self._tfb_log_f)
@@ -151,7 +230,8 @@ class TFM_Builder(structuredTask):
                                       self._tfb_log_f,
                                       append=True,
                                       prefix=_api_test_manifest,
-                                      silent=self._tfb_silent):
+                                      silent=self._tfb_silent,
+                                      timestamps=self._tfb_log_timestamps):
 
                         raise Exception("Python Failed please check log: %s" %
                                         self._tfb_log_f)
@@ -162,7 +242,8 @@ class TFM_Builder(structuredTask):
                                       self._tfb_log_f,
                                       append=True,
                                       prefix=_api_test_manifest_tfm,
-                                      silent=self._tfb_silent):
+                                      silent=self._tfb_silent,
+                                      timestamps=self._tfb_log_timestamps):
 
                         raise Exception("Python TFM Failed please check log: %s" %
                                         self._tfb_log_f)
@@ -178,7 +259,8 @@ class TFM_Builder(structuredTask):
                               self._tfb_log_f,
                               append=True,
                               prefix=self._tfb_cfg["build_psa_api"],
-                              silent=self._tfb_silent):
+                              silent=self._tfb_silent,
+                              timestamps=self._tfb_log_timestamps):
 
                 raise Exception("Build Failed please check log: %s" %
                                 self._tfb_log_f)
@@ -190,16 +272,21 @@ class TFM_Builder(structuredTask):
         self.set_status(-1)
         print("builder _tfb_cfg %s" % self._tfb_cfg)
 
+        # Cleaned in the build process, so that it does not hold the
+        # scheduler back
+        incremental = self.prepare_build_dir()
+
+        # Pass the report to later stages
+        rep = {"phases": {}}
+        self.stash("Build Report", rep)
+
         if "build_psa_api" in self._tfb_cfg:
             p = self._tfb_build_dir + "/BUILD"
             if not os.path.exists(p):
                 os.makedirs(p)
             os.chdir(p)
-            if subprocess_log(self._tfb_cfg["build_psa_api"],
-                              self._tfb_log_f,
-                              append=True,
-                              prefix=self._tfb_cfg["build_psa_api"],
-                              silent=self._tfb_silent):
+            if self.run_phase(rep, "build_psa_api",
+                              self._tfb_cfg["build_psa_api"]):
                 raise Exception("Build Failed please check log: %s" %
                                 self._tfb_log_f)
 
@@ -207,23 +294,73 @@ class TFM_Builder(structuredTask):
         # Go to build directory
         os.chdir(self._tfb_build_dir)
 
-        build_cmds = self._tfb_cfg["build_cmds"]
+        build_phases = self.get_build_phases()
 
         threads_no_rex = re.compile(r'.*(-j\s?(\d+))')
 
-        # Pass the report to later stages
-        rep = {"build_cmd": "%s" % ",".join(build_cmds)}
+        rep["build_cmd"] = "%s" % ",".join(n[1] for n in build_phases)
+        if self._tfb_incremental:
+            rep["build_mode"] = "incremental" if incremental else "cold"
         self.stash("Build Report", rep)
 
+        # The nspe image is built against the export of a shared spe tree
+        if self._tfb_shared_spe_dir:
+            print("Reusing spe image %s" % self._tfb_shared_spe_dir)
+            spe_link = os.path.join(self._tfb_cfg["ci_build_root_dir"], "spe")
+            if not os.path.islink(spe_link):
+                os.symlink(self._tfb_shared_spe_dir, spe_link)
+            rep["shared_spe"] = self._tfb_shared_spe_dir
+
+        cache = None
+        cache_keys = {}
+        # Reused build trees are brought up to date by the build system
+        if self._tfb_build_cache and "build_cmds" not in self._tfb_cfg \
+                and not incremental:
+            cache = TFM_Build_Cache(self._tfb_build_cache,
+                                    self._tfb_build_cache_size)
+            cache_keys = self.get_cache_keys()
+            rep["build_cache"] = {}
+
+        # Only the compilations of this run are counted
+        if "compiler_cache_log" in self._tfb_cfg and \
+                os.path.isfile(self._tfb_cfg["compiler_cache_log"]):
+            os.remove(self._tfb_cfg["compiler_cache_log"])
+
+        if incremental:
+            # The generated build files rerun cmake themselves when the
+            # CMakeLists or cache change, only the build steps are needed
+            print("Incremental build of %s" % self._tfb_build_dir)
+            build_phases = [n for n in build_phases
+                            if not n[0].endswith("_config")]
+
         # Calll cmake to configure the project
-        for build_cmd in build_cmds:
+        for phase, build_cmd in build_phases:
+            # Phases of the spe and nspe images can be restored from cache
+            image = phase.split("_")[0]
+            if image in cache_keys:
+                out_dir = os.path.join(self._tfb_cfg["ci_build_root_dir"],
+                                       image)
+                if phase.endswith("_config"):
+                    if cache.restore(cache_keys[image], out_dir,
+                                     self._tfb_cfg["ci_build_root_dir"]):
+                        print("Build cache: restored %s" % out_dir)
+                        rep["build_cache"][image] = "hit"
+                    else:
+                        rep["build_cache"][image] = "miss"
+                    self.stash("Build Report", rep)
+                if rep["build_cache"][image] == "hit":
+                    continue
+
             # if a -j parameter is passed as user argument
             user_set_threads_match = threads_no_rex.findall(build_cmd)
 
             if user_set_threads_match:
                 # Unpack the regex groups (fullmatch, decimal match)
                 user_jtxt, user_set_threads = user_set_threads_match[0]
-                if int(user_set_threads) > self._tfb_build_threads:
+                if self._tfb_force_threads:
+                    print("Using %d build threads" % self._tfb_build_threads)
+                    thread_no = self._tfb_build_threads
+                elif int(user_set_threads) > self._tfb_build_threads:
                     print("Ignoring user requested n=%s threads because it"
                           " exceeds the maximum thread set ( %d )" %
                           (user_set_threads, self._tfb_build_threads))
@@ -236,17 +373,102 @@ class TFM_Builder(structuredTask):
 
             # Build it
             print("~builder build_cmd %s\r\n" % build_cmd)
-            if subprocess_log(build_cmd,
-                              self._tfb_log_f,
-                              append=True,
-                              prefix=build_cmd,
-                              silent=self._tfb_silent):
+            if self.run_phase(rep, phase, build_cmd):
 
                 raise Exception("Build Failed please check log: %s" %
                                 self._tfb_log_f)
 
+            # Store the image before post build steps modify it
+            if image in cache_keys and phase.endswith("_build"):
+                cache.store(cache_keys[image], out_dir,
+                            self._tfb_cfg["ci_build_root_dir"],
+                            self._tfb_cache_outputs)
+
+        # Trees restored from the build cache only hold the outputs
+        if self._tfb_incremental and "build_cmds" not in self._tfb_cfg and \
+                "hit" not in rep.get("build_cache", {}).values():
+            with open(os.path.join(self._tfb_build_dir, ".configure_stamp"),
+                      "w") as F:
+                F.write(self.get_configure_stamp())
+
         self._t_stop()
 
+    def run_phase(self, rep, phase, build_cmd):
+        """ Run a build command and record its wall time, the CPU time and
+        the peak memory of its processes in the phases of the report.
+        Returns the exit code of the command """
+
+        snapshot = usage_snapshot()
+        ret = subprocess_log(build_cmd,
+                             self._tfb_log_f,
+                             append=True,
+                             prefix=build_cmd,
+                             silent=self._tfb_silent,
+                             timestamps=self._tfb_log_timestamps,
+                             # Commands only leave the process group of the
+                             # builder when they may have to be stopped
+                             stop_event=self._stopevent
+                             if self._tfb_cancellable else None)
+        rep["phases"][phase] = usage_since(snapshot)
+        # Stopped through structuredTask.stop by the build manager
+        if self._stopevent.is_set():
+            rep["cancelled"] = True
+            self.stash("Build Report", rep)
+            raise Exception("Build cancelled in phase %s" % phase)
+        self.stash("Build Report", rep)
+        return ret
+
+    def get_build_phases(self):
+        """ Return the list of (phase, command) to run. Configs rendered by
+        the build manager are split into spe/nspe configure and build steps,
+        and post build. Configs providing build_cmds run them as they are """
+
+        if "build_cmds" in self._tfb_cfg:
+            return [("build", n) for n in self._tfb_cfg["build_cmds"]]
+
+        phases = []
+        # Every command runs in its own shell, which needs the compiler path
+        set_compiler = self._tfb_cfg["set_compiler_path"]
+        for phase, key in [("spe_config", "spe_config_template"),
+                           ("spe_build", "spe_cmake_build"),
+                           ("nspe_config", "nspe_config_template"),
+                           ("nspe_build", "nspe_cmake_build"),
+                           ("post_build", "post_build")]:
+            if self._tfb_shared_spe_dir and phase.startswith("spe_"):
+                continue
+            if self._tfb_cfg.get(key):
+                phases.append((phase, "%s ;\n%s" % (set_compiler,
+                                                    self._tfb_cfg[key])))
+        return phases
+
+    def get_cache_keys(self):
+        """ Compute the build cache keys of the spe and nspe images from the
+        rendered commands, the toolchain version and the source trees. The
+        nspe key depends on the spe one since it builds against its export.
+        Neither the number of build threads nor the build root, which names
+        the config, affect the outputs. The outputs stored are part of the
+        key """
+
+        root = self._tfb_cfg["ci_build_root_dir"]
+
+        def normalize(cmd):
+            cmd = re.sub(r'-j\s?\d+', '', cmd)
+            return cmd.replace(root, TFM_Build_Cache.root_placeholder)
+
+        common = [toolchain_version(self._tfb_cfg["set_compiler_path"]),
+                  source_tree_state(self._tfb_code_dir),
+                  " ".join(self._tfb_cache_outputs)]
+        keys = {"spe": TFM_Build_Cache.key(
+            normalize(self._tfb_cfg["spe_config_template"]),
+            normalize(self._tfb_cfg["spe_cmake_build"]),
+            *common)}
+        if self._tfb_cfg.get("nspe_config_template"):
+            keys["nspe"] = TFM_Build_Cache.key(
+                normalize(self._tfb_cfg["nspe_config_template"]),
+                normalize(self._tfb_cfg["nspe_cmake_build"]),
+                keys["spe"])
+        return keys
+
     def post_eval(self):
         """ Verify that the artefacts exist """
         print("%s Post eval" % self.get_name())
@@ -254,12 +476,27 @@ class TFM_Builder(structuredTask):
         ret_eval = False
         rep = self.unstash("Build Report")
 
-        artefacts = list_filtered_tree(self._tfb_work_dir, r'%s' %
-                                       self._tfb_cfg["artifact_capture_rex"])
+        # The scan runs in this process
+        snapshot = usage_snapshot(resource.RUSAGE_SELF)
+        if "artefact_manifest" in self._tfb_cfg:
+            rex = re.compile(self._tfb_cfg["artifact_capture_rex"])
+            artefacts = [n for n in self._tfb_cfg["artefact_manifest"]
+                         if rex.search(n) and os.path.isfile(n)]
+        else:
+            # Other builds share the work directory, only this one's is read
+            artefacts = list(list_filtered_tree(
+                self._tfb_build_dir, self._tfb_cfg["artifact_capture_rex"]))
 
         # Add artefact related information to report
         rep["log"] = self._tfb_log_f
 
+        # Also counted for failed builds, the cache is filled regardless
+        if "compiler_cache_log" in self._tfb_cfg:
+            rep["compiler_cache"] = compiler_cache_stats(
+                self._tfb_cfg["compiler_cache_log"])
+            print("Compiler cache: %(hits)d hits, %(misses)d misses" %
+                  rep["compiler_cache"])
+
         if not len(artefacts):
             print("ERROR: Could not capture any binaries:")
 
@@ -272,6 +509,15 @@ class TFM_Builder(structuredTask):
 
         rep["artefacts"] = artefacts
 
+        # The images of the build are measured together, identical images
+        # of other builds in the work directory are only measured once
+        img_sizes = {}
+        if self._tfb_img_sizes:
+            img_sizes = TFM_Image_Sizes(
+                os.path.join(self._tfb_work_dir, ".image_sizes.json"),
+                jobs=self._tfb_build_threads).get_sizes(
+                    [n for n in artefacts if ".axf" in n])
+
         # Proccess the artifacts into file structures
         art_files = {}
         for art_item in artefacts:
@@ -280,14 +526,16 @@ class TFM_Builder(structuredTask):
                      else resolve_rel_path(art_item),
                      "size": {"bytes": str(os.path.getsize(art_item))}
                      }
-            if self._tfb_img_sizes and ".axf" in art_item:
-                eabi_size, _ = arm_non_eabi_size(art_item)
+            if art_item in img_sizes:
+                eabi_size = img_sizes[art_item]
                 art_f["size"]["text"] = eabi_size["text"]
                 art_f["size"]["data"] = eabi_size["data"]
                 art_f["size"]["bss"] = eabi_size["bss"]
             # filename is used as key for artfacts
             art_files[os.path.split(art_item)[-1]] = art_f
         rep["artefacts"] = art_files
+        rep.setdefault("phases", {})["artefact_scan"] = \
+            usage_since(snapshot, resource.RUSAGE_SELF)
 
         if "required_artefacts" in self._tfb_cfg.keys():
             if len(self._tfb_cfg["required_artefacts"]):
@@ -303,6 +551,9 @@ class TFM_Builder(structuredTask):
                     ret_eval = True
 
         rep["status"] = "Success" if ret_eval else "Failed"
+        if rep.get("cancelled"):
+            rep["status"] = "Cancelled"
+            ret_eval = False
         self.stash("Build Report", rep)
         return ret_eval
 
@@ -23,14 +23,24 @@ __version__ = "1.4.0"
 import os
 import re
 import sys
-import yaml
-import requests
 import argparse
 import json
+import gzip
+import time
+import codecs
+import signal
+import select
+import threading
+import contextlib
+import resource
 import itertools
 from shutil import move
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, namedtuple, deque
 from subprocess import Popen, PIPE, STDOUT, check_output
+from .lazy_import import lazy_import
+
+yaml = lazy_import("yaml")
+requests = lazy_import("requests")
 
 
 def detect_python3():
@@ -230,27 +240,121 @@ def load_yaml(f_name):
         raise Exception("Failed to load file")
 
 
-def subprocess_log(cmd, log_f, prefix=None, append=False, silent=False):
-    """ Run a command as subproccess an log the output to stdout and fileself.
-    If prefix is spefified it will be added as the first line in file """
+def open_log(log_f, mode="r"):
+    """ Open a log file as text. Logs named *.gz are gzip compressed """
+
+    if log_f.endswith(".gz"):
+        return gzip.open(log_f, mode + "t", compresslevel=6,
+                         encoding="utf-8", errors="replace")
+    return open(log_f, mode, buffering=1024 * 1024,
+                encoding="utf-8", errors="replace")
+
+
+def tail_log(log_f, lines):
+    """ Return the last lines of a log file, reading it as a stream """
+
+    with open_log(log_f) as F:
+        return list(deque(F, maxlen=lines))
+
+
+@contextlib.contextmanager
+def forward_signals(pgid, signums=(signal.SIGINT, signal.SIGTERM)):
+    """ Forward the signals received by this process to the process group
+    pgid, before handling them as before. A command running in its own
+    session does not receive the signals sent to the group of its parent.
+    Signal handlers can only be changed from the main thread """
 
-    with open(log_f, 'a' if append else "w") as F:
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    previous = {}
+
+    def forward(signum, frame):
+        try:
+            os.killpg(pgid, signum)
+        except OSError:
+            pass
+        handler = previous[signum]
+        if callable(handler):
+            handler(signum, frame)
+        elif handler == signal.SIG_DFL:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    for signum in signums:
+        previous[signum] = signal.signal(signum, forward)
+    try:
+        yield
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def subprocess_log(cmd, log_f, prefix=None, append=False, silent=False,
+                   timestamps=False, stop_event=None):
+    """ Run a command as subproccess an log the output to stdout and fileself.
+    If prefix is spefified it will be added as the first line in file.
+    Output is read in chunks as soon as it is available and written through
+    a large buffer. If timestamps is set every line is prefixed with the
+    seconds elapsed from the start of the command to the first output of the
+    line. If stop_event is set while
+    the command runs, the command and all its children are terminated """
+
+    start_t = time.monotonic()
+    with open_log(log_f, 'a' if append else "w") as F:
         if prefix:
             F.write(prefix + "\n")
         pcss = Popen(cmd,
                      stdout=PIPE,
                      stderr=STDOUT,
                      shell=True,
-                     env=os.environ)
-        for line in pcss.stdout:
-            if detect_python3():
-                line = line.decode("utf-8")
-            if not silent:
-                sys.stdout.write(line)
-            F.write(line)
-        pcss.communicate()
-        return pcss.returncode
-    return
+                     env=os.environ,
+                     # A process group can be terminated as a whole
+                     start_new_session=stop_event is not None)
+        fd = pcss.stdout.fileno()
+        # Chunks may end in the middle of a character or of a line
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Last line read so far, stamped with the time its output started
+        partial = ""
+        partial_t = 0.0
+        terminated = False
+        with forward_signals(pcss.pid) if stop_event is not None \
+                else contextlib.nullcontext():
+            while True:
+                if stop_event is not None:
+                    if not terminated and stop_event.is_set():
+                        F.write("Terminating %s\n" % cmd)
+                        try:
+                            os.killpg(pcss.pid, signal.SIGTERM)
+                        except OSError:
+                            pass
+                        terminated = True
+                    # Do not block on a silent command, to notice stop
+                    # requests
+                    if not select.select([fd], [], [], 0.5)[0]:
+                        continue
+                chunk = os.read(fd, 65536)
+                text = decoder.decode(chunk, final=not chunk)
+                if not silent:
+                    sys.stdout.write(text)
+                if timestamps:
+                    now = time.monotonic() - start_t
+                    lines = (partial + text).split("\n")
+                    stamps = [partial_t if partial else now] + \
+                        [now] * (len(lines) - 1)
+                    partial = lines.pop()
+                    partial_t = stamps.pop()
+                    if not chunk and partial:
+                        lines.append(partial)
+                        stamps.append(partial_t)
+                    text = "".join("[%10.3f] %s\n" % n
+                                   for n in zip(stamps, lines))
+                F.write(text)
+                if not chunk:
+                    break
+        pcss.stdout.close()
+        return pcss.wait()
 
 
 def run_proccess(cmd):
@@ -303,6 +407,48 @@ def list_chunks(l, n):
         yield l[i:i + n]
 
 
+def get_host_resources():
+    """ Return the number of CPUs, the 1 minute load average and the available
+    memory in MB of the host. Memory is None when it cannot be determined """
+
+    resources = {"cpus": os.cpu_count() or 1,
+                 "load_avg": 0.0,
+                 "mem_available_mb": None}
+    try:
+        resources["load_avg"] = os.getloadavg()[0]
+    except OSError:
+        pass
+    try:
+        with open("/proc/meminfo", "r") as F:
+            for line in F:
+                if line.startswith("MemAvailable:"):
+                    resources["mem_available_mb"] = int(line.split()[1]) // 1024
+                    break
+    except (IOError, ValueError):
+        pass
+    return resources
+
+
+def usage_snapshot(who=resource.RUSAGE_CHILDREN):
+    """ Return the monotonic time and the resource usage of the process or
+    of its terminated children, to measure a step with usage_since """
+
+    return time.monotonic(), resource.getrusage(who)
+
+
+def usage_since(snapshot, who=resource.RUSAGE_CHILDREN):
+    """ Return the wall and CPU seconds spent since a usage_snapshot, and the
+    peak RSS in MB. Children are only accounted once they terminate, and
+    their peak RSS is the largest of any child so far """
+
+    start_t, start_usage = snapshot
+    usage = resource.getrusage(who)
+    return {"wall": round(time.monotonic() - start_t, 3),
+            "cpu_user": round(usage.ru_utime - start_usage.ru_utime, 3),
+            "cpu_sys": round(usage.ru_stime - start_usage.ru_stime, 3),
+            "peak_rss_mb": round(usage.ru_maxrss / 1024.0, 1)}
+
+
 def export_config_map(config_m, dir=None):
     """ Will export a dictionary of configurations to a group of JSON files """
 
@@ -552,16 +698,109 @@ def convert_git_ref_path(dir_path):
     return dir_path
 
 
+def rex_path_prefix(rex_filter):
+    """ Return the literal path prefix of a regex anchored with ^, and
+    whether the paths it matches may have separators past the prefix, which
+    they cannot if the rest of the regex is anchored with $ and cannot match
+    a separator. Unanchored regexes,
+    or regexes alternating at top level, have no usable prefix and return
+    an empty one """
+
+    tokens = []
+    n = 0
+    while n < len(rex_filter):
+        c = rex_filter[n]
+        if c == "\\" and n + 1 < len(rex_filter):
+            c2 = rex_filter[n + 1]
+            tokens.append(("esc" if c2.isalnum() else "lit", c2))
+            n += 2
+        elif c == "[":
+            # A ] right after [ or [^ is part of the class
+            end = n + 2 if rex_filter[n + 1:n + 2] == "^" else n + 1
+            end = rex_filter.index("]", end + 1)
+            while rex_filter[end - 1] == "\\":
+                end = rex_filter.index("]", end + 1)
+            tokens.append(("class", rex_filter[n + 1:end]))
+            n = end + 1
+        else:
+            tokens.append(("meta" if c in ".^$*+?{}()|" else "lit", c))
+            n += 1
+
+    depth = 0
+    for kind, c in tokens:
+        if kind == "meta" and c == "(":
+            depth += 1
+        elif kind == "meta" and c == ")":
+            depth -= 1
+        elif kind == "meta" and c == "|" and not depth:
+            return "", True
+    if tokens[:1] != [("meta", "^")]:
+        return "", True
+
+    prefix = ""
+    n = 1
+    while n < len(tokens) and tokens[n][0] == "lit":
+        prefix += tokens[n][1]
+        n += 1
+    # The last literal is optional when quantified
+    if n < len(tokens) and tokens[n] in [("meta", "?"), ("meta", "*"),
+                                         ("meta", "{")]:
+        prefix = prefix[:-1]
+        n -= 1
+
+    def may_match_sep(kind, c):
+        if kind == "lit":
+            return c == os.sep
+        if kind == "meta":
+            return c == "."
+        if kind == "esc":
+            return c not in "wsdbBAZ123456789"
+        # Classes with ranges spanning the separator are not told apart
+        return c.startswith("^") or os.sep in c or "\\" in c or \
+            any(c[m - 1] <= os.sep <= c[m + 1]
+                for m in range(1, len(c) - 1) if c[m] == "-")
+
+    if tokens[-1] not in [("meta", "$"), ("esc", "Z")]:
+        return prefix, True
+    return prefix, any(may_match_sep(*t) for t in tokens[n:])
+
+
 def list_filtered_tree(directory, rex_filter=None):
-    ret = []
-    for path, subdirs, files in os.walk(directory):
-        for fname in files:
-            ret.append(os.path.join(path, fname))
-    if rex_filter:
-        rex = re.compile(rex_filter)
-        return [n for n in ret if rex.search(n)]
-    else:
-        return ret
+    """ Yield the paths of the files under the directory, in the order of
+    os.walk(), which match the regex if one is given. Directories which can
+    not hold a match of a regex anchored with ^ by its literal path prefix
+    are not scanned """
+
+    rex = re.compile(rex_filter) if rex_filter else None
+    prefix, nested = rex_path_prefix(rex_filter) if rex_filter else ("", True)
+    # Directory part of the prefix, ending with a separator
+    prefix_dir = prefix[:prefix.rfind(os.sep) + 1]
+
+    def scan_dir(path):
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                if not rex or rex.search(entry.path):
+                    yield entry.path
+            elif not entry.is_symlink():
+                subdir = entry.path + os.sep
+                if subdir.startswith(prefix_dir):
+                    if nested or len(subdir) == len(prefix_dir):
+                        subdirs.append(entry.path)
+                elif prefix_dir.startswith(subdir):
+                    subdirs.append(entry.path)
+        for subdir in subdirs:
+            yield from scan_dir(subdir)
+
+    return scan_dir(directory)
 
 
 def gerrit_patch_from_changeid(remote, change_id):